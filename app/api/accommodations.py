@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.core.security import get_current_user
+from app.core.principals import Principal
+from app.core.security import get_principal
 from app.db.session import get_db
 from app.models.accommodation import Accommodation
 
@@ -9,10 +10,8 @@ router = APIRouter()
 @router.get("")
 def list_accommodations(
     db: Session = Depends(get_db),
-    authorization: str = Header(...) # no ": User"
+    current_user: Principal = Depends(get_principal)
 ):
-    current_user = get_current_user(authorization, db)
-    print(f"Current user: {current_user.name} ({current_user.role})")
     return [
         {"id": str(a.id), "name": a.name}
         for a in db.query(Accommodation)
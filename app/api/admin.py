@@ -1,17 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from uuid import UUID, uuid4
 
+from app.db.pagination import PageParams, paginate
 from app.db.session import get_db
-from app.core.security import get_current_user, get_password_hash
+from app.core.principals import principal_cache, revoke_tokens
+from app.core.security import get_password_hash
 from app.models.user import User, UserRole
 from app.models.university import University
 
-def require_main_admin(user: User = Depends(get_current_user)):
-    if user.role != UserRole.admin:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    return user
-
 router = APIRouter()
 
 
@@ -50,8 +47,9 @@ def delete_university(university_id: UUID, db: Session = Depends(get_db)):
 
 # 📋 List universities
 @router.get("/universities")
-def list_universities(db: Session = Depends(get_db)):
-    return [{"id": str(u.id), "name": u.name} for u in db.query(University).all()]
+def list_universities(response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    query = db.query(University.id, University.name)
+    return [{"id": str(u.id), "name": u.name} for u in paginate(query, [University.name, University.id], page, response)]
 
 
 # 🏫 Get a specific university
@@ -65,7 +63,13 @@ def get_university(university_id: UUID, db: Session = Depends(get_db)):
 
 # 👥 List students for a university
 @router.get("/universities/{university_id}/students")
-def list_university_students(university_id: UUID, db: Session = Depends(get_db)):
+def list_university_students(
+    university_id: UUID, response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)
+):
+    query = db.query(User.id, User.name, User.phone_number, User.role).filter(
+        User.university_id == university_id,
+        User.role == UserRole.student
+    )
     return [
         {
             "id": str(u.id),
@@ -73,16 +77,17 @@ def list_university_students(university_id: UUID, db: Session = Depends(get_db))
             "phone_number": u.phone_number,
             "role": u.role.value,
         }
-        for u in db.query(User).filter(
-            User.university_id == university_id,
-            User.role == UserRole.student
-        ).all()
+        for u in paginate(query, [User.name, User.id], page, response)
     ]
 
 
 # 👤 List staff members for a university
 @router.get("/universities/{university_id}/staff")
-def list_staff(university_id: UUID, db: Session = Depends(get_db)):
+def list_staff(university_id: UUID, response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    query = db.query(User.id, User.name, User.phone_number, User.role).filter(
+        User.university_id == university_id,
+        User.role.in_([UserRole.staff, UserRole.university_admin])
+    )
     return [
         {
             "id": str(u.id),
@@ -90,10 +95,7 @@ def list_staff(university_id: UUID, db: Session = Depends(get_db)):
             "phone_number": u.phone_number,
             "role": u.role.value,
         }
-        for u in db.query(User).filter(
-            User.university_id == university_id,
-            User.role.in_([UserRole.staff, UserRole.university_admin])
-        ).all()
+        for u in paginate(query, [User.name, User.id], page, response)
     ]
 
 
@@ -147,11 +149,16 @@ def update_staff(university_id: UUID, staff_id: UUID, payload: dict, db: Session
     ).first()
     if not staff:
         raise HTTPException(status_code=404, detail="Staff member not found")
+    role = UserRole(payload["role"])
+    if payload.get("hashed_password") or role != staff.role:
+        revoke_tokens(db, staff.id)
     staff.name = payload["name"]
     staff.phone_number = payload["phone_number"]
-    staff.hashed_password = payload["hashed_password"]
-    staff.role = UserRole(payload["role"])
+    if payload.get("hashed_password"):
+        staff.hashed_password = get_password_hash(payload["hashed_password"])
+    staff.role = role
     db.commit()
+    principal_cache.invalidate(staff.id)
     db.refresh(staff)
     return {
         "id": str(staff.id),
@@ -173,6 +180,7 @@ def delete_staff(university_id: UUID, staff_id: UUID, db: Session = Depends(get_
         raise HTTPException(status_code=404, detail="Staff member not found")
     db.delete(staff)
     db.commit()
+    principal_cache.invalidate(staff_id)
     return
 
 
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from app.db.session import get_db
 from app.models.user import User
 from app.schemas.auth import UserCreate, Token
-from app.core.security import get_password_hash, verify_password, create_access_token, decode_access_token
-from uuid import UUID, uuid4
+from app.core import passwords
+from app.core.principals import Principal, Profile
+from app.core.security import get_password_hash, create_access_token, get_profile
+from uuid import uuid4
 
 router = APIRouter()
 
@@ -27,41 +30,42 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(new_user)
 
-    token = create_access_token({"sub": str(new_user.id), "role": new_user.role})
+    principal = Principal(new_user.id, new_user.role, new_user.university_id, new_user.token_version)
+    token = create_access_token(principal.claims())
     return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/token", response_model=Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.phone_number == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    account = (
+        db.query(User.id, User.role, User.university_id, User.token_version, User.hashed_password)
+        .filter(User.phone_number == form_data.username)
+        .first()
+    )
+    # Return the connection to the pool while bcrypt runs.
+    db.rollback()
+    # Unknown and passwordless accounts still pay for one check, see core/passwords.py.
+    hashed = account.hashed_password if account else None
+    if not passwords.verify_password(form_data.password, hashed):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect phone number or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if passwords.needs_rehash(hashed):
+        rehashed = passwords.hash_password(form_data.password)
+        db.execute(
+            update(User)
+            .where(User.id == account.id, User.hashed_password == hashed)
+            .values(hashed_password=rehashed)
+        )
+        db.commit()
 
-    token = create_access_token({"sub": str(user.id), "role": user.role})
+    principal = Principal(account.id, account.role, account.university_id, account.token_version)
+    token = create_access_token(principal.claims())
     return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/me")
-def get_me(authorization: str = Header(...), db: Session = Depends(get_db)):
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid token format")
-    
-    token = authorization.split(" ")[1]
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    try:
-        user_id = UUID(payload["sub"])  # ✅ Convert str → UUID
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid user ID format")
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+def get_me(user: Profile = Depends(get_profile)):
     return {
         "id": str(user.id),
         "name": user.name,
@@ -1,4 +1,102 @@
-from fastapi import APIRouter
+from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.principals import Principal
+from app.core.security import require_gate_staff
+from app.db.session import get_db
+from app.services import outbox
+from app.services.gate_index import ExitState, gate_index, stage_change
+from app.services.gate_scans import TRANSITIONS, apply_scans, record_transition
+from app.services.pass_tokens import InvalidPassToken, verify
+from app.services.relationships import relationships
+from app.services.seats import release_seat
 
 
-router = APIRouter()
\ No newline at end of file
+router = APIRouter()
+
+class PassScan(BaseModel):
+    token: str
+    action: Literal["checkout", "checkin"]
+
+class ScanEventIn(BaseModel):
+    key: str  # idempotency key, unique per scan on the device
+    action: Literal["checkout", "checkin"]
+    token: Optional[str] = None
+    student_id: Optional[UUID] = None
+    scanned_at: Optional[datetime] = None
+
+class ScanBatch(BaseModel):
+    events: list[ScanEventIn]
+
+
+@router.post("/scan")
+def scan_pass(scan: PassScan, db: Session = Depends(get_db), user: Principal = Depends(require_gate_staff)):
+    """Check a signed pass out or in, as gate staff of the student's university.
+
+    The signature and expiry are verified without the database; the
+    student's university comes from the gate index. The only queries are
+    the transition itself, a seat release for bus exits and the parent
+    notification. The action is always explicit, so a double scan at
+    checkout is refused rather than checking the student back in.
+    """
+    try:
+        claims = verify(scan.token)
+    except InvalidPassToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    student = gate_index.get(db, claims.student_id)
+    if not student or student.university_id != user.university_id:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    action = scan.action
+    row = record_transition(db, claims.student_id, claims.exit_request_id, action)
+    if not row:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Pass is not valid for this action")
+
+    if action == "checkout" and row.bus_id:
+        release_seat(db, row.bus_id)
+    new_status = TRANSITIONS[action][1]
+    stage_change(db, claims.student_id, ExitState(claims.exit_request_id, new_status, row.bus_id))
+
+    parents = relationships.parents_of(db, claims.student_id)
+    if parents:
+        outbox.enqueue(
+            db, "whatsapp.check", parents[0].phone_number,
+            student_name=student.name, check_type="out" if action == "checkout" else "in",
+        )
+    db.commit()
+    outbox.notify()
+
+    return {
+        "status": "success",
+        "action": action,
+        "student_id": str(claims.student_id),
+        "exit_request_id": str(claims.exit_request_id),
+        "scanned_at": datetime.utcnow().isoformat(),
+    }
+
+
+@router.post("/scans/batch")
+def sync_scan_batch(batch: ScanBatch, db: Session = Depends(get_db), user: Principal = Depends(require_gate_staff)):
+    """Apply an ordered batch of offline scans in one transaction, as gate staff.
+
+    Returns one result per event, in order. Resending a batch is safe: keys
+    this user already recorded return their original result.
+    """
+    if len(batch.events) > settings.SCAN_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.SCAN_BATCH_MAX_EVENTS} events per batch")
+
+    results = apply_scans(db, user, batch.events)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another upload recorded some of these keys first; a retry gets their results.
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Batch overlaps a concurrent upload, retry")
+    outbox.notify()
+    return {"results": results}
@@ -1,19 +1,32 @@
-from datetime import datetime
+import asyncio
+import json
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from uuid import UUID, uuid4
+from app.db.pagination import PageParams, paginate
 from app.db.session import get_db
 from app.models.accommodation import Accommodation
-from app.models.exit_request import ExitRequest
+from app.core.config import settings
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.import_job import ImportJob
 from app.models.user import ParentStudentLink, User
-from app.core.security import get_current_user, get_password_hash
+from app.core.principals import Principal
+from app.core.security import get_principal, require_gate_staff
 from app.schemas.exit_request import ExitRequestOut
+from app.schemas.student_import import ImportOut
 from app.schemas.student import ActivityEntry, ParentInfo, RegisterWithParentInput, StudentCreate, StudentDetailsResponse
-from app.services.qr import generate_qr_image
-from app.services.whatsapp import send_check_notification, send_whatsapp_template_with_qr_link, upload_qr_to_whatsapp, send_whatsapp_template_with_qr
+from app.services.qr import render_whatsapp_qr
+from app.services.seats import release_seat
+from app.services.relationships import relationships
+from app.services.student_search import student_search
+from app.services.gate_index import ExitState, gate_index, stage_change
+from app.services.gate_scans import TRANSITIONS, record_transition
+from app.services.pass_tokens import InvalidPassToken, verify
+from app.services import outbox, student_import
+from app.services.whatsapp import send_whatsapp_template_with_qr_link, upload_qr_to_whatsapp, send_whatsapp_template_with_qr
 
 router = APIRouter()
 
@@ -21,9 +34,8 @@ router = APIRouter()
 async def register_student_with_parent(
     payload: RegisterWithParentInput,
     db: Session = Depends(get_db),
-    authorization: str = Header(...)
+    user: Principal = Depends(get_principal)
 ):
-    user = get_current_user(authorization, db)
     if user.role != "university_admin":  # type: ignore
         raise HTTPException(status_code=403, detail="Unauthorized")
 
@@ -60,7 +72,7 @@ async def register_student_with_parent(
         name=payload.student_name,
         phone_number=payload.student_phone,
         role="student",
-        hashed_password=get_password_hash("1234"),
+        hashed_password=None,  # students use WhatsApp, not the dashboard
         accommodation_id=accommodation.id if accommodation else None,
         university_id=user.university_id
     )
@@ -76,9 +88,11 @@ async def register_student_with_parent(
     )
     db.add(link)
     db.commit()
+    relationships.invalidate(student.id, parent.id)
+    student_search.refresh(db, student.university_id, student.id)
 
     # ✅ Generate QR and get public URL
-    qr_url = generate_qr_image(str(student.id))
+    qr_url = await render_whatsapp_qr(str(student.id))
 
     # ✅ Send QR message using public URL
     print(await send_whatsapp_template_with_qr_link(
@@ -89,97 +103,144 @@ async def register_student_with_parent(
 
     return {"message": "Student and parent registered successfully"}
 
+def _import_out(job: ImportJob) -> ImportOut:
+    return ImportOut(
+        id=job.id,
+        status=job.status.value,
+        rows=job.rows,
+        created=job.created,
+        skipped=job.skipped,
+        errors=json.loads(job.errors or "[]"),
+        total=job.total,
+        sent=job.sent,
+        failed=job.failed,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+def _run_import(db: Session, user: Principal, rows: list[dict]):
+    try:
+        job, welcomes, linked_parents = student_import.import_students(db, user.university_id, user.id, rows)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A phone number in the file was registered meanwhile; retry")
+    db.refresh(job)
+    relationships.invalidate(*linked_parents)
+    student_search.refresh(db, user.university_id, *(welcome.student_id for welcome in welcomes))
+    return job, welcomes
+
+@router.post("/import", response_model=ImportOut, status_code=202)
+async def import_students(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_principal)
+):
+    """Register many students and parents from a CSV (``text/csv``) or JSON body.
+
+    Columns: student_name, student_phone, parent_name, parent_phone and an
+    optional accommodation name. Welcome QR messages go out in the background;
+    poll ``/students/imports/{id}`` for progress.
+    """
+    if user.role != "university_admin":  # type: ignore
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    try:
+        rows = student_import.parse_rows(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Send a CSV (text/csv) or JSON list of students")
+    if len(rows) > settings.IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.IMPORT_MAX_ROWS} rows per import")
+
+    job, welcomes = await asyncio.to_thread(_run_import, db, user, rows)
+    if welcomes:
+        student_import.start_import(job.id, welcomes)
+    return _import_out(job)
+
+@router.get("/imports/{job_id}", response_model=ImportOut)
+def get_import(job_id: UUID, db: Session = Depends(get_db), user: Principal = Depends(get_principal)):
+    if user.role != "university_admin":  # type: ignore
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.university_id == user.university_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return _import_out(job)
+
+def scanned_student_id(student_id: str) -> UUID:
+    """The student in a scanned QR: a bare student ID (registration QR) or a signed pass."""
+    try:
+        return UUID(student_id)
+    except ValueError:
+        pass
+    try:
+        return verify(student_id).student_id
+    except InvalidPassToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
 @router.get("/verify/{student_id}")
-def verify_scanned_student(student_id: UUID, db: Session = Depends(get_db)):
-    student = db.query(User).filter(User.id == student_id, User.role == "student").first()
+def verify_scanned_student(student_id: UUID = Depends(scanned_student_id), db: Session = Depends(get_db)):
+    student = gate_index.get(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    accommodation = db.query(Accommodation).filter(Accommodation.id == student.accommodation_id).first()
-
-    exit_request = db.query(ExitRequest).filter(
-        ExitRequest.student_id == student.id,
-        ExitRequest.status == "approved"
-    ).order_by(ExitRequest.approved_at.desc()).first()
-
+    approved = student.exit is not None and student.exit.status == ExitStatus.approved
     return {
         "name": student.name,
-        "accommodation": accommodation.name if accommodation else None,
-        "status": "approved" if exit_request else "not approved"
+        "accommodation": student.accommodation,
+        "status": "approved" if approved else "not approved"
     }
 
 @router.get("/search")
 def search_students(
     query: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
-    authorization: str = Header(...)
+    user: Principal = Depends(get_principal)
 ):
-    user = get_current_user(authorization, db)
     if user.role != "university_admin": # type: ignore
         raise HTTPException(status_code=403, detail="Unauthorized")
 
-    query_lower = f"%{query.lower()}%"
-
-    parent_links = (
-        db.query(ParentStudentLink.student_id, User.name.label("parent_name"))
-        .join(User, ParentStudentLink.parent_id == User.id)
-        .subquery()
-    )
-
-    students = (
-        db.query(User, parent_links.c.parent_name)
-        .outerjoin(parent_links, User.id == parent_links.c.student_id)
-        .filter(
-            User.university_id == user.university_id,
-            User.role == "student",
-            or_(
-                func.lower(User.name).like(query_lower),
-                func.lower(User.phone_number).like(query_lower),
-                func.lower(parent_links.c.parent_name).like(query_lower)
-            )
-        )
-        .all()
-    )
-    print(students)
-
     return [
         {
-            "id": str(student.id),
-            "name": student.name,
-            "phone_number": student.phone_number,
-            "parent_name": parent_name,
+            "id": str(hit.id),
+            "name": hit.name,
+            "phone_number": hit.phone_number,
+            "parent_name": hit.parent_name,
         }
-        for student, parent_name in students
+        for hit in student_search.search(db, user.university_id, query, limit)
     ]
 
 @router.get("/university")
 def list_students_for_university_admin(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
-    authorization: str = Header(...)
+    user: Principal = Depends(get_principal)
 ):
-    user = get_current_user(authorization, db)  # utility that uses decode_access_token()
 
     if user.role != "university_admin": # type: ignore
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    students = db.query(User).filter(
-        User.role == "student",
-        User.university_id == user.university_id
-    ).all()
-
-    results = []
-    for student in students:
-        results.append({
-            "id": str(student.id),
-            "name": student.name,
-            "phone_number": student.phone_number,
-            "accommodation_name": student.accommodation.name if student.accommodation else None
-        })
-
-    return results
+    query = (
+        db.query(User.id, User.name, User.phone_number, Accommodation.name.label("accommodation_name"))
+        .outerjoin(Accommodation, Accommodation.id == User.accommodation_id)
+        .filter(User.role == "student", User.university_id == user.university_id)
+    )
+    return [
+        {
+            "id": str(row.id),
+            "name": row.name,
+            "phone_number": row.phone_number,
+            "accommodation_name": row.accommodation_name,
+        }
+        for row in paginate(query, [User.name, User.id], page, response)
+    ]
 
 @router.get("/{student_id}/latest-request", response_model=Optional[ExitRequestOut])
-def get_latest_exit_request(student_id: UUID, db: Session = Depends(get_db)):
+def get_latest_exit_request(student_id: UUID = Depends(scanned_student_id), db: Session = Depends(get_db)):
     request = (
         db.query(ExitRequest)
         .filter(ExitRequest.student_id == student_id)
@@ -190,18 +251,20 @@ def get_latest_exit_request(student_id: UUID, db: Session = Depends(get_db)):
     return request  # Returns None if no request found
 
 @router.get("/{student_id}/activity-log", response_model=list[ExitRequestOut])
-def get_activity_log(student_id: UUID, db: Session = Depends(get_db)):
-    logs = (
-        db.query(ExitRequest)
+def get_activity_log(
+    response: Response,
+    student_id: UUID = Depends(scanned_student_id),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+):
+    query = (
+        db.query(
+            ExitRequest.id, ExitRequest.exit_method, ExitRequest.status,
+            ExitRequest.requested_at, ExitRequest.approved_at,
+        )
         .filter(ExitRequest.student_id == student_id)
-        .order_by(ExitRequest.requested_at.desc())
-        .all()
     )
-    
-    if not logs:
-        return [] 
-
-    return logs
+    return paginate(query, [ExitRequest.requested_at, ExitRequest.id], page, response, descending=True)
 
     
 @router.get("/{student_id}/details", response_model=StudentDetailsResponse)
@@ -210,8 +273,8 @@ def get_student_details(student_id: UUID, db: Session = Depends(get_db)):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    parent_link = db.query(ParentStudentLink).filter(ParentStudentLink.student_id == student.id).first()
-    parent = db.query(User).filter(User.id == parent_link.parent_id).first() if parent_link else None
+    parents = relationships.parents_of(db, student.id)
+    parent = parents[0] if parents else None
 
     latest_request = db.query(ExitRequest)\
         .filter(ExitRequest.student_id == student.id)\
@@ -256,8 +319,12 @@ def delete_student(id: UUID, db: Session = Depends(get_db)):
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
+    university_id = student.university_id
     db.delete(student)
+    stage_change(db, student.id)
     db.commit()
+    relationships.invalidate(student.id)
+    student_search.refresh(db, university_id, id)
     return {"message": "Student deleted"}
 
 class UpdateStudentInput(BaseModel):
@@ -272,112 +339,120 @@ class UpdateStudentInput(BaseModel):
 def update_student(
     student_id: UUID,
     payload: UpdateStudentInput,
-    authorization: str = Header(...)
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_principal)
 ):
-    current_user = get_current_user(authorization)
 
     if current_user.role != "university_admin":  # type: ignore
-        raise HTTPException(status_code=403, detail="Access denied")    
-    
-    # 2. DB session
-    with get_db() as db:
+        raise HTTPException(status_code=403, detail="Access denied")
 
-        student = db.query(User).filter(User.id == student_id, User.role == "student").first()
-        if not student:
-            raise HTTPException(status_code=404, detail="Student not found")
+    student = db.query(User).filter(
+        User.id == student_id,
+        User.role == "student",
+        User.university_id == current_user.university_id
+    ).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
 
-        # Update student basic info
-        student.name = payload.name
-        student.phone_number = payload.phone_number
-        student.accommodation_id = payload.accommodation_id
-
-        # Handle parent
-        existing_parent = db.query(User).filter(
-            User.phone_number == payload.parent_phone,
-            User.role == "parent"
-        ).first()
-
-        if existing_parent:
-            student.parent_id = existing_parent.id
-        else:
-            # Update or create parent
-            if student.parent_id:
-                parent = db.query(User).filter(User.id == student.parent_id).first()
-                if parent:
-                    parent.name = payload.parent_name
-                    parent.phone_number = payload.parent_phone
-                else:
-                    new_parent = User(
-                        name=payload.parent_name,
-                        phone_number=payload.parent_phone,
-                        role="parent"
-                    )
-                    db.add(new_parent)
-                    db.flush()
-                    student.parent_id = new_parent.id
-            else:
-                new_parent = User(
-                    name=payload.parent_name,
-                    phone_number=payload.parent_phone,
-                    role="parent"
-                )
-                db.add(new_parent)
-                db.flush()
-                student.parent_id = new_parent.id
+    # Update student basic info
+    student.name = payload.name
+    student.phone_number = payload.phone_number
+    student.accommodation_id = payload.accommodation_id
+
+    # Handle parent
+    link = db.query(ParentStudentLink).filter(ParentStudentLink.student_id == student.id).first()
+    previous_parent_id = link.parent_id if link else None
+    parent = db.query(User).filter(
+        User.phone_number == payload.parent_phone,
+        User.role == "parent"
+    ).first()
+
+    if not parent and link:
+        # Update the currently linked parent
+        parent = db.query(User).filter(User.id == link.parent_id).first()
+        if parent:
+            parent.name = payload.parent_name
+            parent.phone_number = payload.parent_phone
+
+    if not parent:
+        parent = User(
+            id=uuid4(),
+            name=payload.parent_name,
+            phone_number=payload.parent_phone,
+            role="parent"
+        )
+        db.add(parent)
+        db.flush()
+
+    if link:
+        link.parent_id = parent.id
+    else:
+        db.add(ParentStudentLink(id=uuid4(), student_id=student.id, parent_id=parent.id))
+
+    stage_change(db, student.id)
+    db.commit()
+    relationships.invalidate(*filter(None, (student.id, parent.id, previous_parent_id)))
+    # A renamed parent changes how their other children are found too.
+    siblings = [contact.id for contact in relationships.students_of(db, parent.id)]
+    student_search.refresh(db, current_user.university_id, student.id, *siblings)
+    return {"message": "✅ Student updated successfully"}
+
+def _advance_exit(db: Session, user: Principal, student_id: UUID, action: str):
+    """Apply the gate ``action`` to the student's exit, located via the gate index.
+
+    Returns the student's gate entry, or raises 404 if the student is not in
+    the user's university. A stale index entry is reloaded once before
+    giving up.
+    """
+    current, new = TRANSITIONS[action]
+    for attempt in range(2):
+        student = gate_index.get(db, student_id)
+        if not student or student.university_id != user.university_id:
+            raise HTTPException(status_code=404, detail="Student not found")
+        if student.exit is None or student.exit.status != current:
+            break
+        if record_transition(db, student_id, student.exit.exit_request_id, action):
+            stage_change(db, student_id, ExitState(student.exit.exit_request_id, new, student.exit.bus_id))
+            return student
+        gate_index.evict(student_id)
+    return None
 
-        db.commit()
-        return {"message": "✅ Student updated successfully"}
 
 @router.post("/{student_id}/check-out")
-async def check_out_student(student_id: UUID, db: Session = Depends(get_db)):
-    student = db.query(User).filter(User.id == student_id, User.role == "student").first()
+async def check_out_student(
+    student_id: UUID = Depends(scanned_student_id),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_gate_staff)
+):
+    student = _advance_exit(db, user, student_id, "checkout")
     if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-
-    request = (
-        db.query(ExitRequest)
-        .filter(ExitRequest.student_id == student_id, ExitRequest.status == "approved")
-        .order_by(ExitRequest.requested_at.desc())
-        .first()
-    )
-    if not request:
         raise HTTPException(status_code=404, detail="No approved exit request")
 
-    request.status = "completed"
+    if student.exit.bus_id:
+        release_seat(db, student.exit.bus_id)
+    parents = relationships.parents_of(db, student_id)
+    if parents:
+        outbox.enqueue(db, "whatsapp.check", parents[0].phone_number, student_name=student.name, check_type="out")
     db.commit()
-
-    parent_link = db.query(ParentStudentLink).filter(ParentStudentLink.student_id == student.id).first()
-    if parent_link:
-        parent = db.query(User).filter(User.id == parent_link.parent_id).first()
-        if parent:
-            await send_check_notification(parent.phone_number, student.name, "out")
+    outbox.notify()
 
     return {"message": "Student checked out and parent notified"}
 
 
 @router.post("/{student_id}/check-in")
-async def check_in_student(student_id: UUID, db: Session = Depends(get_db)):
-    student = db.query(User).filter(User.id == student_id, User.role == "student").first()
+async def check_in_student(
+    student_id: UUID = Depends(scanned_student_id),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(require_gate_staff)
+):
+    student = _advance_exit(db, user, student_id, "checkin")
     if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-
-    request = (
-        db.query(ExitRequest)
-        .filter(ExitRequest.student_id == student_id, ExitRequest.status == "completed")
-        .order_by(ExitRequest.requested_at.desc())
-        .first()
-    )
-    if not request:
         raise HTTPException(status_code=404, detail="No completed exit request to check in")
 
-    request.status = "returned"
-    request.approved_at = datetime.utcnow()
+    parents = relationships.parents_of(db, student_id)
+    if parents:
+        outbox.enqueue(db, "whatsapp.check", parents[0].phone_number, student_name=student.name, check_type="in")
     db.commit()
-
-    parent_link = db.query(ParentStudentLink).filter(ParentStudentLink.student_id == student.id).first()
-    if parent_link:
-        parent = db.query(User).filter(User.id == parent_link.parent_id).first()
-        if parent:
-            await send_check_notification(parent.phone_number, student.name, "in")
+    outbox.notify()
 
     return {"message": "Student checked in and parent notified"}
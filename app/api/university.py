@@ -1,11 +1,23 @@
 
-from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Header
+import asyncio
+from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from requests import Session
 
-from app.core.security import get_current_user
+from app.core.principals import Principal
+from app.core.security import get_principal
+from app.db.pagination import PageParams, paginate
 from app.db.session import get_db
+from app.models.accommodation import Accommodation
+from app.models.broadcast_job import BroadcastJob
 from app.models.bus import Bus
+from app.models.exit_request import ExitStatus
+from app.schemas.broadcast import BroadcastCreate, BroadcastOut
+from app.services import broadcast
+from app.services.exit_export import FORMATS, ExportFilters, stream_export
 
 
 router = APIRouter()
@@ -13,9 +25,8 @@ router = APIRouter()
 @router.get("/buses")
 def list_buses_for_university_admin(
     db: Session = Depends(get_db),
-    authorization: str = Header(...)
+    user: Principal = Depends(get_principal)
 ):
-    user = get_current_user(authorization, db)
     if user.role != "university_admin":
         raise HTTPException(status_code=403, detail="Unauthorized")
 
@@ -36,9 +47,8 @@ def list_buses_for_university_admin(
 def create_bus_for_university_admin(
     data: dict,
     db: Session = Depends(get_db),
-    authorization: str = Header(...)
+    user: Principal = Depends(get_principal)
 ):
-    user = get_current_user(authorization, db)
     if user.role != "university_admin":
         raise HTTPException(status_code=403, detail="Unauthorized")
 
@@ -53,8 +63,7 @@ def create_bus_for_university_admin(
     return {"message": "Bus created"}
 
 @router.delete("/university/buses/{bus_id}")
-def delete_bus(bus_id: UUID, db: Session = Depends(get_db), authorization: str = Header(...)):
-    user = get_current_user(authorization, db)
+def delete_bus(bus_id: UUID, db: Session = Depends(get_db), user: Principal = Depends(get_principal)):
     if user.role != "university_admin":
         raise HTTPException(status_code=403, detail="Unauthorized")
 
@@ -66,3 +75,99 @@ def delete_bus(bus_id: UUID, db: Session = Depends(get_db), authorization: str =
     db.commit()
     return {"message": "Bus deleted"}
 
+
+
+def _broadcast_out(job: BroadcastJob) -> BroadcastOut:
+    return BroadcastOut(
+        id=job.id,
+        channel=job.channel,
+        audience=job.audience,
+        accommodation_id=job.accommodation_id,
+        bus_id=job.bus_id,
+        status=job.status.value,
+        total=job.total,
+        sent=job.sent,
+        failed=job.failed,
+        messages_per_second=broadcast.messages_per_second(job),
+        last_error=job.last_error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+@router.get("/exit-requests/export")
+def export_exit_requests(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[ExitStatus] = None,
+    method: Optional[Literal["relative", "bus", "self"]] = None,
+    university_id: Optional[UUID] = None,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_principal)
+):
+    """Gate log as CSV or NDJSON. University admins always get their own university."""
+    if user.role == "university_admin":
+        university_id = user.university_id
+    elif user.role != "admin":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    filters = ExportFilters(university_id, start, end, status, method)
+    filename = f"exit-requests-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return StreamingResponse(
+        stream_export(filters, fmt),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def _create_broadcast(db: Session, user: Principal, data: BroadcastCreate) -> BroadcastJob:
+    if data.accommodation_id and not db.query(Accommodation.id).filter(
+        Accommodation.id == data.accommodation_id, Accommodation.university_id == user.university_id
+    ).first():
+        raise HTTPException(status_code=404, detail="Accommodation not found")
+    if data.bus_id and not db.query(Bus.id).filter(
+        Bus.id == data.bus_id, Bus.university_id == user.university_id
+    ).first():
+        raise HTTPException(status_code=404, detail="Bus not found")
+
+    job = BroadcastJob(id=uuid4(), university_id=user.university_id, created_by=user.id, **data.model_dump())
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+@router.post("/broadcasts", response_model=BroadcastOut, status_code=202)
+async def create_broadcast(data: BroadcastCreate, db: Session = Depends(get_db), user: Principal = Depends(get_principal)):
+    if user.role != "university_admin":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    job = await asyncio.to_thread(_create_broadcast, db, user, data)
+    # The sending task belongs on the event loop, hence the async route.
+    broadcast.start_broadcast(job.id)
+    return _broadcast_out(job)
+
+@router.get("/broadcasts", response_model=list[BroadcastOut])
+def list_broadcasts(
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_principal)
+):
+    if user.role != "university_admin":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    query = db.query(BroadcastJob).filter(BroadcastJob.university_id == user.university_id)
+    jobs = paginate(query, [BroadcastJob.created_at, BroadcastJob.id], page, response, descending=True)
+    return [_broadcast_out(job) for job in jobs]
+
+@router.get("/broadcasts/{job_id}", response_model=BroadcastOut)
+def get_broadcast(job_id: UUID, db: Session = Depends(get_db), user: Principal = Depends(get_principal)):
+    if user.role != "university_admin":
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    job = db.query(BroadcastJob).filter(
+        BroadcastJob.id == job_id, BroadcastJob.university_id == user.university_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return _broadcast_out(job)
@@ -1,34 +1,40 @@
-from fastapi import APIRouter, Request, Depends, BackgroundTasks, Query
+from fastapi import APIRouter, Request, Depends, Query
 from sqlalchemy.orm import Session
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta
 from app.db.session import get_db
-from app.models.user import User, ParentStudentLink
-from app.models.exit_request import ExitRequest
-from app.models.conversation_state import ConversationState
+from app.models.user import User
+from app.models.exit_request import ExitRequest, ExitStatus
 from app.models.bus import Bus
 from app.models.otp import OTP
-from app.models.processed_webhook import ProcessedWebhook
-from app.services.message_classifier import is_exit_request
+from app.services.message_classifier import classifier
+from app.services import webhook_inbox
+from app.services import webhook_dedupe
+from app.services.conversation_cache import ConversationSnapshot, conversation_cache
+from app.services.seats import available_buses, reserve_seat
+from app.services.exit_approvals import approve_pending_for_parent, consume_otp
+from app.services.pass_tokens import issue_pass
+from app.services.gate_index import ExitState, stage_change
+from app.services.relationships import relationships
 from app.services.qr import generate_qr_image
-from app.services.whatsapp import send_whatsapp_message, send_approve_request
-from app.services.sms_service import send_sms
+from app.services import outbox
 from app.core.security import generate_random_otp
 from app.core.config import settings
 from app.models.conversation_state import ConversationStateEnum
 from app.models.conversation_state import ConversationStateEnum
 from sqlalchemy import and_
 
-from app.utils.language import detect_language, translate
+from app.utils.language import detect_language, normalize_text, translate
 
 
 router = APIRouter()
 
-def set_conversation_state(db: Session, state: ConversationState, new_state: ConversationStateEnum):
-    state.state = new_state
-    state.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(state)
+def set_conversation_state(state: ConversationSnapshot, new_state: ConversationStateEnum):
+    state.transition(new_state)
+
+def reply(db: Session, phone: str, text: str):
+    """Queue a text reply; it is sent once the caller commits."""
+    outbox.enqueue(db, "whatsapp.text", phone, text=text)
 
 def match_student_bus_reply(reply_text: str, bus_list: list) -> Bus | None:
     cleaned_reply = reply_text.strip().lower()
@@ -56,20 +62,27 @@ def verify_webhook(
     return {"message": "Invalid verification token"}
 
 @router.post("/webhook")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def whatsapp_webhook(request: Request, db: Session = Depends(get_db)):
     data = await request.json()
-    try:
-        msg = data['entry'][0]['changes'][0]['value']['messages'][0]
-        message_id = msg['id']
-        if db.query(ProcessedWebhook).filter_by(id=message_id).first():
-            return {"status": "Duplicate webhook"}
-        db.add(ProcessedWebhook(id=message_id))
-        db.commit()
-        background_tasks.add_task(process_webhook, msg, db)
-        return {"status": "received"}
-    except (KeyError, IndexError):
+    messages = webhook_dedupe.extract_messages(data)
+    if not messages:
         return {"status": "invalid"}
 
+    message_ids = [msg["id"] for msg in messages]
+    new_ids = webhook_dedupe.claim_new_ids(db, message_ids)
+    if not new_ids:
+        db.rollback()
+        return {"status": "Duplicate webhook"}
+
+    for msg in messages:
+        if msg["id"] in new_ids:
+            webhook_inbox.enqueue(db, msg)
+            new_ids.discard(msg["id"])
+    db.commit()
+    webhook_dedupe.remember(message_ids)
+    webhook_inbox.notify()
+    return {"status": "received"}
+
 async def process_webhook(msg: dict, db: Session):
     phone = msg["from"]
     text = msg["text"]["body"].strip()
@@ -78,133 +91,124 @@ async def process_webhook(msg: dict, db: Session):
         return
 
     if user.role == "student":
-        state = db.query(ConversationState).filter_by(student_id=user.id).first()
-        if not state:
-            lang = detect_language(text)
-            state = ConversationState(student_id=user.id, state=ConversationStateEnum.idle, language=lang)
-            db.add(state)
+        state = conversation_cache.load(db, user.id, language=detect_language(text))
+        try:
+            handle_student_turn(db, user, phone, text, state)
+            # The request, the new state and the replies commit together, so a
+            # retried message never repeats a turn that already took effect.
+            conversation_cache.flush(db, state)
             db.commit()
-            
-        if state.state == ConversationStateEnum.idle:
-            lang = detect_language(text)
-            if lang != state.language:
-                state.language = lang
-                db.commit()
+            outbox.notify()
+        except Exception:
+            conversation_cache.evict(user.id)
+            raise
+
+    elif user.role == "parent":
+        lang = "ar" if any("\u0600" <= ch <= "\u06FF" for ch in text) else "en"
+        otp_input = classifier.strip(text, "approve")
+
+        if consume_otp(db, user.id, otp_input):
+            approved = approve_pending_for_parent(db, user.id)
+            approved_by_student = {row.student_id: row for row in approved}
+            for student in relationships.students_of(db, user.id):
+                row = approved_by_student.get(student.id)
+                if row:
+                    token = issue_pass(db, student.id, row.id)
+                    stage_change(db, student.id, ExitState(row.id, ExitStatus.approved, row.bus_id))
+                    outbox.enqueue(db, "whatsapp.text", student.phone_number, text=translate("student_notified", lang))
+                    outbox.enqueue(db, "whatsapp.pass", student.phone_number, token=token, student_name=student.name)
+            reply(db, phone, translate("parent_approved" if approved else "otp_no_requests", lang))
         else:
-            lang = state.language
+            students = relationships.students_of(db, user.id)
+            if not students:
+                reply(db, phone, translate("not_linked", lang))
+            else:
+                names = "\n".join([f"• {s.name}" for s in students])
+                reply(db, phone, translate("intro_list", lang, students=names))
+        db.commit()
+        outbox.notify()
 
-        if text.lower() == "cancel":
-            state.state = ConversationStateEnum.idle
-            db.commit()
-            send_whatsapp_message(phone, translate("cancel_success", lang))
-            return
-
-        match state.state:
-            case ConversationStateEnum.idle:
-                if is_exit_request(text):
-                    state.state = ConversationStateEnum.awaiting_exit_method
-                    db.commit()
-                    send_whatsapp_message(phone, translate("choose_exit_method", lang))
-                else:
-                    send_whatsapp_message(phone, translate("start_request", lang))
+def handle_student_turn(db: Session, user: User, phone: str, text: str, state: ConversationSnapshot):
+    if state.state == ConversationStateEnum.idle:
+        lang = detect_language(text)
+        if lang != state.language:
+            state.language = lang
+    else:
+        lang = state.language
 
-            case ConversationStateEnum.awaiting_exit_method:
-                method_map = {"1": "relative", "2": "bus", "3": "self"}
-                exit_method = method_map.get(text)
-                if not exit_method:
-                    send_whatsapp_message(phone, translate("invalid_exit_method", lang))
-                    return
+    intent = classifier.classify(text)
+    if intent == "cancel":
+        set_conversation_state(state, ConversationStateEnum.idle)
+        reply(db, phone, translate("cancel_success", lang))
+        return
 
-                if exit_method == "bus":
-                    buses = db.query(Bus).filter_by(university_id=user.university_id).all()
-                    valid_buses = [
-                        bus for bus in buses if db.query(ExitRequest)
-                        .filter_by(bus_id=bus.id, status="approved")
-                        .count() < bus.capacity
-                    ]
-                    if not valid_buses:
-                        send_whatsapp_message(phone, translate("no_buses", lang))
-                        return
-                    state.state = ConversationStateEnum.awaiting_bus
-                    db.commit()
-                    bus_list = "\n".join([f"{i+1}. {b.name} - {b.destination_district}" for i, b in enumerate(valid_buses)])
-                    send_whatsapp_message(phone, translate("select_bus", lang) + "\n" + bus_list)
-                    state.temp_data = ",".join([str(b.id) for b in valid_buses])
-                    db.commit()
-                elif exit_method == "relative":
-                    state.state = ConversationStateEnum.awaiting_relative_name
-                    db.commit()
-                    send_whatsapp_message(phone, translate("ask_relative_name", lang))
+    match state.state:
+        case ConversationStateEnum.idle:
+            if intent == "exit":
+                set_conversation_state(state, ConversationStateEnum.awaiting_exit_method)
+                reply(db, phone, translate("choose_exit_method", lang))
+            elif intent == "status":
+                latest = (
+                    db.query(ExitRequest.exit_method, ExitRequest.status)
+                    .filter(ExitRequest.student_id == user.id)
+                    .order_by(ExitRequest.requested_at.desc())
+                    .first()
+                )
+                if latest:
+                    reply(db, phone, translate(
+                        "status_current", lang, method=latest.exit_method, status=latest.status.value
+                    ))
                 else:
-                    await create_exit_request(db, user, phone, "self")
-                    state.state = ConversationStateEnum.idle
-                    db.commit()
-                    send_whatsapp_message(phone, translate("request_sent", lang))
-
-            case ConversationStateEnum.awaiting_relative_name:
-                relative_name = text.strip()
-                await create_exit_request(db, user, phone, "relative", relative_name=relative_name)
-                state.state = ConversationStateEnum.idle
-                db.commit()
-                send_whatsapp_message(phone, translate("request_sent_relative", lang, name=relative_name))
-
-            case ConversationStateEnum.awaiting_bus:
-                selected_index = int(text) - 1 if text.isdigit() else None
-                bus_ids = state.temp_data.split(",") if state.temp_data else []
-                if selected_index is not None and 0 <= selected_index < len(bus_ids):
-                    bus_id = UUID(bus_ids[selected_index])
-                    await create_exit_request(db, user, phone, "bus", bus_id=bus_id, auto_approve=True)
-                    state.state = ConversationStateEnum.idle
-                    db.commit()
-                    send_whatsapp_message(phone, translate("bus_confirmed", lang))
-                else:
-                    send_whatsapp_message(phone, translate("invalid_bus", lang))
+                    reply(db, phone, translate("status_none", lang))
+            else:
+                reply(db, phone, translate("start_request", lang))
 
+        case ConversationStateEnum.awaiting_exit_method:
+            method_map = {"1": "relative", "2": "bus", "3": "self"}
+            exit_method = method_map.get(normalize_text(text))
+            if not exit_method:
+                reply(db, phone, translate("invalid_exit_method", lang))
+                return
 
-    elif user.role == "parent":
-        lang = "ar" if any("\u0600" <= ch <= "\u06FF" for ch in text) else "en"
-        otp_input = text.replace("approve", "").strip()
-
-        otp = db.query(OTP).filter(
-            OTP.user_id == user.id,
-            OTP.otp_code == otp_input,
-            OTP.is_verified == False,
-            OTP.expires_at > datetime.utcnow()
-        ).first()
-
-        if otp:
-            links = db.query(ParentStudentLink).filter_by(parent_id=user.id).all()
-            approved_any = False
-            otp.is_verified = True
-            for link in links:
-                request = db.query(ExitRequest).filter_by(student_id=link.student_id, status="pending").order_by(ExitRequest.requested_at.desc()).first()
-                if request:
-                    print(f"ExitRequest id={request.id}, student_id={request.student_id}, status={request.status}")
-                    request.parent_id = user.id
-                    request.status = "approved"
-                    request.approved_at = datetime.utcnow()
-                    db.commit()
-                    student = db.query(User).get(request.student_id)
-                    if student:
-                        print(f"User id={student.id}, name={student.name}, phone={student.phone_number}")
-                        send_whatsapp_message(student.phone_number, translate("student_notified", lang))
-                    approved_any = True
-
-            if approved_any:
-                send_whatsapp_message(phone, translate("parent_approved", lang))
+            if exit_method == "bus":
+                valid_buses = available_buses(db, user.university_id)
+                if not valid_buses:
+                    reply(db, phone, translate("no_buses", lang))
+                    return
+                set_conversation_state(state, ConversationStateEnum.awaiting_bus)
+                bus_list = "\n".join([f"{i+1}. {b.name} - {b.destination_district}" for i, b in enumerate(valid_buses)])
+                reply(db, phone, translate("select_bus", lang) + "\n" + bus_list)
+                state.temp_data = ",".join([str(b.id) for b in valid_buses])
+            elif exit_method == "relative":
+                set_conversation_state(state, ConversationStateEnum.awaiting_relative_name)
+                reply(db, phone, translate("ask_relative_name", lang))
             else:
-                send_whatsapp_message(phone, translate("otp_no_requests", lang))
-            db.commit()
-        else:
-            links = db.query(ParentStudentLink).filter_by(parent_id=user.id).all()
-            if not links:
-                send_whatsapp_message(phone, translate("not_linked", lang))
-                return
-            students = db.query(User).filter(User.id.in_([l.student_id for l in links])).all()
-            names = "\n".join([f"• {s.name}" for s in students])
-            send_whatsapp_message(phone, translate("intro_list", lang, students=names))
+                create_exit_request(db, user, phone, "self")
+                set_conversation_state(state, ConversationStateEnum.idle)
+                reply(db, phone, translate("request_sent", lang))
+
+        case ConversationStateEnum.awaiting_relative_name:
+            relative_name = text.strip()
+            create_exit_request(db, user, phone, "relative", relative_name=relative_name)
+            set_conversation_state(state, ConversationStateEnum.idle)
+            reply(db, phone, translate("request_sent_relative", lang, name=relative_name))
+
+        case ConversationStateEnum.awaiting_bus:
+            choice = normalize_text(text)
+            selected_index = int(choice) - 1 if choice.isdigit() else None
+            bus_ids = state.temp_data.split(",") if state.temp_data else []
+            if selected_index is not None and 0 <= selected_index < len(bus_ids):
+                bus_id = UUID(bus_ids[selected_index])
+                if not reserve_seat(db, bus_id):
+                    reply(db, phone, translate("bus_full", lang))
+                    return
+                create_exit_request(db, user, phone, "bus", bus_id=bus_id, auto_approve=True)
+                set_conversation_state(state, ConversationStateEnum.idle)
+                reply(db, phone, translate("bus_confirmed", lang))
+            else:
+                reply(db, phone, translate("invalid_bus", lang))
 
-async def create_exit_request(db: Session, user: User, phone: str, method: str, bus_id=None, relative_name=None, auto_approve=False):
+def create_exit_request(db: Session, user: User, phone: str, method: str, bus_id=None, relative_name=None, auto_approve=False):
     req = ExitRequest(
         id=uuid4(),
         student_id=user.id,
@@ -217,17 +221,19 @@ async def create_exit_request(db: Session, user: User, phone: str, method: str,
         requested_at=datetime.utcnow()
     )
     db.add(req)
-    db.commit()
 
     if auto_approve:
+        token = issue_pass(db, user.id, req.id)
+        stage_change(db, user.id, ExitState(req.id, ExitStatus.approved, bus_id))
+        outbox.enqueue(db, "whatsapp.pass", phone, token=token, student_name=user.name)
         return
 
-    link = db.query(ParentStudentLink).filter_by(student_id=user.id).first()
-    if not link:
-        send_whatsapp_message(phone, translate("no_parent", "en"))
+    parents = relationships.parents_of(db, user.id)
+    if not parents:
+        reply(db, phone, translate("no_parent", "en"))
         return
 
-    parent = db.query(User).get(link.parent_id)
+    parent = parents[0]
     code = generate_random_otp()
     otp = OTP(
         id=uuid4(),
@@ -237,16 +243,15 @@ async def create_exit_request(db: Session, user: User, phone: str, method: str,
         is_verified=False
     )
     db.add(otp)
-    db.commit()
-    
+
     relative_info = f" مع {relative_name}" if relative_name else ""
     BOT_PHONE = "96878788804"  # Replace with your WhatsApp Business number (no '+' or leading zeros)
 
-    await send_sms(
-        parent.phone_number,
-        f"طلب خروج من {user.name}{relative_info}، رمز الموافقة: {code}\n\n"
-        f"اضغط هنا لفتح المحادثة في واتساب: https://wa.me/{BOT_PHONE}?text={code}"
+    # The request, its OTP and the notifications commit with the caller's turn.
+    outbox.enqueue(
+        db, "sms", parent.phone_number,
+        message=f"طلب خروج من {user.name}{relative_info}، رمز الموافقة: {code}\n\n"
+        f"اضغط هنا لفتح المحادثة في واتساب: https://wa.me/{BOT_PHONE}?text={code}",
     )
-    
-    send_whatsapp_message(phone, translate("otp_sent", "en"))
-    await send_approve_request(parent.phone_number, user.name)
\ No newline at end of file
+    outbox.enqueue(db, "whatsapp.text", phone, text=translate("otp_sent", "en"))
+    outbox.enqueue(db, "whatsapp.approve_request", parent.phone_number, student_name=user.name)
\ No newline at end of file
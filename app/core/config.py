@@ -8,10 +8,72 @@ class Settings(BaseSettings):
     WHATSAPP_API_URL: str
     WHATSAPP_PHONE_NUMBER_ID: str
     WHATSAPP_TOKEN: str
+    WHATSAPP_HTTP2: bool = True
+    WHATSAPP_MAX_CONNECTIONS: int = 20
+    WHATSAPP_MAX_KEEPALIVE: int = 10
+    WHATSAPP_MAX_CONCURRENCY: int = 20
+    WHATSAPP_TIMEOUT: float = 10.0
+    WHATSAPP_CONNECT_TIMEOUT: float = 5.0
     OMANTEL_CLIENT_ID:str
     OMANTEL_CLIENT_SECRET:str
     OMANTEL_SENDER:str
+    OMANTEL_MAX_CONNECTIONS: int = 10
+    OMANTEL_MAX_CONCURRENCY: int = 10
+    OMANTEL_TIMEOUT: float = 10.0
+    OMANTEL_CONNECT_TIMEOUT: float = 5.0
+    OMANTEL_TOKEN_SKEW: int = 60  # refresh this many seconds before expiry
     BASE_URL: str
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_WORKER_QUEUE_SIZE: int = 100
+    WEBHOOK_SHARDS: int = 64
+    WEBHOOK_CONSUMER_INDEX: int = 0
+    WEBHOOK_CONSUMER_COUNT: int = 1
+    WEBHOOK_BATCH_SIZE: int = 20
+    WEBHOOK_POLL_INTERVAL: float = 1.0
+    WEBHOOK_CLAIM_TIMEOUT: int = 300
+    WEBHOOK_MAX_ATTEMPTS: int = 3
+    WEBHOOK_DEDUPE_CACHE_SIZE: int = 50000
+    WEBHOOK_DEDUPE_CACHE_TTL: int = 3600
+    WEBHOOK_DEDUPE_RETENTION_HOURS: int = 168  # Meta retries deliveries for up to 7 days
+    WEBHOOK_FAILED_RETENTION_HOURS: int = 720
+    WEBHOOK_PRUNE_INTERVAL: int = 3600
+    WEBHOOK_PRUNE_BATCH_SIZE: int = 1000
+    CONVERSATION_CACHE_SIZE: int = 10000
+    CONVERSATION_CACHE_IDLE_SECONDS: int = 1800
+    RELATIONSHIP_CACHE_TTL: int = 300
+    INTENT_PHRASES_PATH: str | None = None
+    OUTBOX_DISPATCHER: bool = True
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_CLAIM_TIMEOUT: int = 300
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_BACKOFF_BASE: float = 2.0
+    OUTBOX_BACKOFF_MAX: float = 900.0
+    OUTBOX_MAX_THROTTLE_WAIT: float = 5.0
+    WHATSAPP_MESSAGES_PER_SECOND: float = 80.0
+    WHATSAPP_DAILY_LIMIT: int = 0  # messages per rolling day; 0 for unlimited
+    SMS_MESSAGES_PER_SECOND: float = 10.0
+    BULK_RESERVED_SHARE: float = 0.25  # of each bucket, kept for the outbox
+    BROADCAST_CHUNK_SIZE: int = 500
+    BROADCAST_CONCURRENCY: int = 50
+    WHATSAPP_BROADCAST_TEMPLATE: str = "university_announcement"  # one body parameter: the message
+    WHATSAPP_BROADCAST_LANGUAGE: str = "ar"
+    QR_FORMAT: str = "png1"  # "png", "png1" (1-bit) or "svg"
+    QR_RENDER_WORKERS: int = 2
+    QR_RENDER_PROCESSES: bool = False
+    PASS_TOKEN_SECRET: str | None = None  # defaults to a key derived from JWT_SECRET
+    PASS_TOKEN_TTL_HOURS: int = 24
+    SCAN_BATCH_MAX_EVENTS: int = 1000
+    GATE_INDEX_TTL: int = 300
+    SEARCH_INDEX_TTL: int = 600
+    EXPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_ROWS: int = 20000
+    IMPORT_LOOKUP_BATCH: int = 1000
+    IMPORT_CONCURRENCY: int = 20
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: int = 60
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,39 @@
+import threading
+from collections import defaultdict
+from typing import Callable
+
+
+class Metrics:
+    """Process-local counters and gauges, served as JSON from /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(int)
+        self._gauges: dict[str, float] = {}
+        self._computed: dict[str, Callable[[], float]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, fn: Callable[[], float]):
+        """Register a gauge that is computed when the metrics are read."""
+        self._computed[name] = fn
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name, 0))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {**self._counters, **self._gauges}
+        for name, fn in self._computed.items():
+            data[name] = fn()
+        return dict(sorted(data.items()))
+
+
+metrics = Metrics()
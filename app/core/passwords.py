@@ -0,0 +1,64 @@
+"""Password hashing on a dedicated, bounded executor.
+
+bcrypt is deliberately slow (about 0.25 s at cost 12), and ``bcrypt``
+releases the GIL while it works. Hashing therefore runs on its own pool of
+``PASSWORD_HASH_WORKERS`` threads, which bounds how much CPU a burst of
+logins can take. Callers are sync routes and scripts: ``hash_password``
+and ``verify_password`` wait for the pool on the calling thread, never on
+the event loop.
+
+New hashes use ``BCRYPT_ROUNDS``. ``needs_rehash`` reports hashes made
+with another cost, so login can upgrade them while it has the plain
+password. Accounts without a password (students and parents, who use
+WhatsApp) store NULL and never verify. Hashes written by passlib's bcrypt
+handler verify unchanged.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from app.core.config import settings
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_dummy_hash: bytes | None = None
+
+
+def _secret(password: str) -> bytes:
+    # bcrypt only reads the first 72 bytes; newer releases raise instead of truncating.
+    return password.encode()[:72]
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password: str, hashed: str | None) -> bool:
+    global _dummy_hash
+    if not hashed:
+        # Spend the same time as a real check so unknown and passwordless
+        # accounts cannot be told apart by latency.
+        if _dummy_hash is None:
+            _dummy_hash = bcrypt.hashpw(b"", bcrypt.gensalt(settings.BCRYPT_ROUNDS))
+        bcrypt.checkpw(b"", _dummy_hash)
+        return False
+    try:
+        return bcrypt.checkpw(_secret(password), hashed.encode())
+    except ValueError:  # not a bcrypt hash
+        return False
+
+
+def hash_rounds(hashed: str) -> int | None:
+    """Cost factor of a ``$2b$12$...`` hash."""
+    parts = hashed.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+def needs_rehash(hashed: str | None) -> bool:
+    return bool(hashed) and hash_rounds(hashed) != settings.BCRYPT_ROUNDS
+
+
+def hash_password(password: str) -> str:
+    return _executor.submit(_hash, password, settings.BCRYPT_ROUNDS).result()
+
+
+def verify_password(password: str, hashed: str | None) -> bool:
+    return _executor.submit(_verify, password, hashed).result()
+
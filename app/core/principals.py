@@ -0,0 +1,132 @@
+"""Who a request acts as, without a user query per request.
+
+Access tokens carry the user's role, university and token version as
+claims (``Principal.claims``), so authorization reads them straight from
+the token. The token version is the revocation check. Each user's current
+record is held in a bounded cache for ``PRINCIPAL_CACHE_TTL`` seconds, and
+a token whose version does not match the cached one is rejected. Steady
+dashboard traffic therefore costs one user query per user per TTL, not one
+per request. The cached ``Profile`` also answers ``/auth/me``.
+
+``revoke_tokens`` bumps ``User.token_version``. Call it whenever a change
+should end existing sessions: password, role or university. Code that
+changes a user calls ``principal_cache.invalidate`` after committing, so
+tokens issued before a bump stop working at once in that worker. Other
+workers catch up when their cache entry expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.user import User, UserRole
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: UUID
+    role: UserRole
+    university_id: UUID | None
+    token_version: int
+
+    def claims(self) -> dict:
+        return {
+            "sub": str(self.id),
+            "role": self.role.value,
+            "university_id": str(self.university_id) if self.university_id else None,
+            "ver": self.token_version,
+        }
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal | None":
+        """None for tokens issued before the claims existed, or malformed ones."""
+        try:
+            university_id = payload["university_id"]
+            return cls(
+                id=UUID(payload["sub"]),
+                role=UserRole(payload["role"]),
+                university_id=UUID(university_id) if university_id else None,
+                token_version=int(payload["ver"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+@dataclass(frozen=True)
+class Profile:
+    id: UUID
+    name: str
+    phone_number: str
+    role: UserRole
+    accommodation_id: UUID | None
+    university_id: UUID | None
+    token_version: int
+
+    @property
+    def principal(self) -> Principal:
+        return Principal(self.id, self.role, self.university_id, self.token_version)
+
+
+class PrincipalCache:
+    """Bounded LRU of user profiles with a per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[UUID, tuple[float, Profile | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, db: Session, user_id: UUID) -> Profile | None:
+        row = (
+            db.query(
+                User.id, User.name, User.phone_number, User.role,
+                User.accommodation_id, User.university_id, User.token_version,
+            )
+            .filter(User.id == user_id)
+            .first()
+        )
+        return Profile(*row) if row else None
+
+    def get(self, db: Session, user_id: UUID) -> Profile | None:
+        """The user's profile, or None if the user does not exist."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                metrics.incr("principal_cache.hits")
+                return entry[1]
+        metrics.incr("principal_cache.misses")
+        profile = self._load(db, user_id)
+        with self._lock:
+            # Deleted users are cached too, so a stale token cannot force a query per request.
+            self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, *user_ids: UUID):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+
+metrics.register_gauge("principal_cache.size", lambda: len(principal_cache))
+
+
+def revoke_tokens(db: Session, user_id: UUID):
+    """Invalidate every token issued to the user so far; the caller commits."""
+    db.execute(update(User).where(User.id == user_id).values(token_version=User.token_version + 1))
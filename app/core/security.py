@@ -1,20 +1,20 @@
 from datetime import datetime, timedelta
 import random
 from uuid import UUID
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from app.core import passwords
 from app.core.config import settings
-from app.models.user import User, UserRole
+from app.core.principals import Principal, Profile, principal_cache
+from app.db.session import get_db
+from app.models.user import UserRole
 from sqlalchemy.orm import Session
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return passwords.hash_password(password)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.verify_password(plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -30,7 +30,7 @@ def decode_access_token(token: str):
     except JWTError:
         return None
     
-def get_current_user(authorization: str, db: Session) -> User:
+def _authenticate(authorization: str, db: Session) -> tuple[dict, Profile]:
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid token format")
 
@@ -45,16 +45,32 @@ def get_current_user(authorization: str, db: Session) -> User:
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid user ID in token")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    profile = principal_cache.get(db, user_id)
+    if not profile:
+        raise HTTPException(status_code=401, detail="User not found")
+    # Tokens issued before the version claim existed count as version 0.
+    if payload.get("ver", 0) != profile.token_version:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload, profile
+
+def get_principal(authorization: str = Header(...), db: Session = Depends(get_db)) -> Principal:
+    """Authorize from the token's claims; the user row is only read on a cache miss."""
+    payload, profile = _authenticate(authorization, db)
+    return Principal.from_claims(payload) or profile.principal
 
-    return user
+def get_profile(authorization: str = Header(...), db: Session = Depends(get_db)) -> Profile:
+    return _authenticate(authorization, db)[1]
+
+def require_main_admin(principal: Principal = Depends(get_principal)):
+    if principal.role != UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return principal
 
-def require_main_admin(user: User = Depends(get_current_user)):
-    if user.role != UserRole.admin:
+def require_gate_staff(principal: Principal = Depends(get_principal)):
+    """Staff or university admins, who may record gate scans for their university."""
+    if principal.role not in (UserRole.staff, UserRole.university_admin):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-    return user
+    return principal
 
 def generate_random_otp(length: int = 4) -> str:
     """Generate a numeric OTP of specified length (default 6 digits)."""
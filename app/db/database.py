@@ -9,9 +9,14 @@ from app.models import (
     otp,
     exit_request,
     conversation_state,
-    processed_webhook
+    processed_webhook,
+    webhook_inbox,
+    notification_outbox,
+    broadcast_job,
+    scan_event
 )
 from app.core.config import settings
+from app.db.migrations import run_migrations
 
 # SQLite needs a special setting
 connect_args = {}
@@ -28,6 +33,7 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
         print("✅ DB schema initialized.")
     except Exception as e:
         print("❌ DB init failed:", e)
\ No newline at end of file
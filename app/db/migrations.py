@@ -0,0 +1,157 @@
+"""Versioned schema migrations.
+
+``create_all`` only creates missing tables, so columns and indexes added to
+existing tables never reach a database created earlier. Each migration here
+has a version number; ``run_migrations`` records applied versions in
+``schema_version`` and applies the rest in order, each in its own
+transaction. Steps are idempotent (columns are added only when missing,
+indexes with ``checkfirst``), so a fresh database built by ``create_all``
+just records the versions.
+
+Indexes are declared on the models, which keeps ``create_all`` and the
+migrations in agreement; a migration names the ones it adds.
+
+    python -m app.db.migrations           # apply pending migrations
+    python -m app.db.migrations --status  # list versions
+"""
+import argparse
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from app.models.base import Base
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent workers migrate once.
+_LOCK_KEY = 7_041_922
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    """``ALTER TABLE ... ADD COLUMN`` unless the column already exists."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def create_indexes(conn: Connection, *names: str):
+    """Create model-declared indexes by name, skipping ones that exist."""
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def drop_index(conn: Connection, name: str):
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _columns_added_after_baseline(conn: Connection):
+    add_column(conn, "bus", "seats_taken", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "webhook_inbox", "shard", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _indexes_declared_on_existing_tables(conn: Connection):
+    create_indexes(
+        conn,
+        "ix_otp_user_id_otp_code",
+        "ix_processed_webhook_processed_at",
+    )
+
+
+def _hot_path_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "ix_exit_request_student_id_requested_at",
+        "ix_exit_request_student_id_status",
+        "ix_exit_request_bus_id_status",
+        "ix_user_university_id_role",
+        "ix_parent_student_link_student_id",
+        "ix_parent_student_link_parent_id",
+        "ix_conversation_state_student_id",
+        "ix_bus_university_id",
+        "ix_accommodation_university_id",
+        "ix_webhook_inbox_claimable",
+        "ix_webhook_inbox_status_processed_at",
+        "ix_notification_outbox_due",
+    )
+    # Superseded by the partial claim indexes above.
+    drop_index(conn, "ix_webhook_inbox_status_received_at")
+    drop_index(conn, "ix_notification_outbox_status_next_attempt_at")
+
+
+def _keyset_list_indexes(conn: Connection):
+    # Same name, now also covering the (name, id) list order.
+    drop_index(conn, "ix_user_university_id_role")
+    create_indexes(conn, "ix_user_university_id_role")
+
+
+def _export_indexes(conn: Connection):
+    create_indexes(conn, "ix_exit_request_requested_at")
+
+
+def _token_version(conn: Connection):
+    add_column(conn, "user", "token_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _failed_inbox_index(conn: Connection):
+    create_indexes(conn, "ix_webhook_inbox_failed")
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "columns added after the baseline schema", _columns_added_after_baseline),
+    (2, "indexes declared on tables that already existed", _indexes_declared_on_existing_tables),
+    (3, "composite indexes for the hot access paths", _hot_path_indexes),
+    (4, "user index ordered for keyset pagination", _keyset_list_indexes),
+    (5, "exit request date index for exports", _export_indexes),
+    (6, "user token version for revoking access tokens", _token_version),
+    (7, "partial index for pruning failed inbox rows", _failed_inbox_index),
+]
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Apply pending migrations and return their versions."""
+    _meta.create_all(engine)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+            if version in applied_versions(conn):
+                continue
+            migrate(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow(),
+            ))
+            applied.append(version)
+            print(f"✅ Migration {version}: {description}")
+    return applied
+
+
+def main():
+    from app.db.database import engine
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        _meta.create_all(engine)
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending'}  {version}  {description}")
+        return
+    run_migrations(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Keyset pagination for list endpoints.
+
+A page is the next ``limit`` rows after the last row of the previous page
+in a fixed ordering, found with ``WHERE (k1, k2) > (:v1, :v2)`` rather than
+``OFFSET``. With an index on the ordering columns, every page costs the
+same no matter how deep the client reads. The ordering must be unique, so
+the last key is normally the primary key.
+
+List endpoints keep returning a JSON array. When more rows remain, the
+``X-Next-Cursor`` response header holds an opaque cursor, and the client
+passes it back as ``?cursor=``.
+"""
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query as OrmQuery
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """``limit`` and ``cursor`` query parameters, for use with ``Depends()``."""
+
+    def __init__(
+        self,
+        limit: int = Query(100, ge=1, le=500),
+        cursor: str | None = Query(None),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+def _encode(values) -> str:
+    plain = [value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, UUID) else value
+             for value in values]
+    return base64.urlsafe_b64encode(json.dumps(plain, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str, keys) -> list:
+    try:
+        plain = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(plain, list) or len(plain) != len(keys):
+            raise ValueError(cursor)
+        values = []
+        for key, value in zip(keys, plain):
+            python_type = key.type.python_type
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is UUID:
+                value = UUID(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query: OrmQuery, keys: list, page: PageParams, response: Response,
+             descending: bool = False) -> list:
+    """One page of ``query`` ordered by ``keys``, which must be selected columns or entity attributes.
+
+    Sets ``X-Next-Cursor`` on ``response`` when another page follows.
+    """
+    if page.cursor:
+        after = tuple_(*_decode(page.cursor, keys))
+        query = query.filter(tuple_(*keys) < after if descending else tuple_(*keys) > after)
+    order = [key.desc() for key in keys] if descending else keys
+    rows = query.order_by(*order).limit(page.limit + 1).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = _encode([getattr(rows[-1], key.key) for key in keys])
+    return rows
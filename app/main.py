@@ -1,11 +1,43 @@
-from fastapi import FastAPI
-from app.db.database import init_db
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from app.db.database import SessionLocal, init_db
+from app.db.pagination import NEXT_CURSOR_HEADER
+from app.services import whatsapp as whatsapp_service
+from app.services import sms_service
+from app.services import broadcast, gate_index, outbox, qr, student_import, webhook_inbox, webhook_dedupe, seats
+from app.services.relationships import relationships
+from app.core.metrics import metrics
+from app.core.principals import Principal
+from app.core.security import require_main_admin
 from app.api import admin, whatsapp, security, auth, university, students, accommodations  # import your routers
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with SessionLocal() as db:
+        seats.recount_seats(db)
+        db.commit()
+        relationships.warm(db)
+        gate_index.gate_index.warm(db)
+    gate_index.start_listener()
+    webhook_inbox.start_workers(whatsapp.process_webhook)
+    webhook_dedupe.start_pruner()
+    outbox.start_dispatcher()
+    yield
+    await gate_index.stop_listener()
+    await broadcast.stop_broadcasts()
+    await student_import.stop_imports()
+    await outbox.stop_dispatcher()
+    await webhook_dedupe.stop_pruner()
+    await webhook_inbox.stop_workers()
+    await whatsapp_service.close_client()
+    await sms_service.close_client()
+    qr.shutdown_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Serve static files
@@ -20,6 +52,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Register routers
@@ -32,4 +65,8 @@ app.include_router(accommodations.router, prefix="/accommodations", tags=["Accom
 app.include_router(admin.router, prefix="/admin") 
 @app.get("/")
 def root():
-    return {"message": "GatePass API is running!"}
\ No newline at end of file
+    return {"message": "GatePass API is running!"}
+
+@app.get("/metrics")
+def get_metrics(_: Principal = Depends(require_main_admin)):
+    return metrics.snapshot()
\ No newline at end of file
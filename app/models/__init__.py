@@ -8,3 +8,8 @@ from .bus import *
 from .conversation_state import *
 from .processed_webhook import *
 from .qr_code import *
+from .webhook_inbox import *
+from .notification_outbox import *
+from .broadcast_job import *
+from .scan_event import *
+from .import_job import *
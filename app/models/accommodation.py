@@ -7,7 +7,7 @@ class Accommodation(Base):
     __tablename__ = "accommodation"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    university_id = Column(UUID(as_uuid=True), ForeignKey('university.id'))
+    university_id = Column(UUID(as_uuid=True), ForeignKey('university.id'), index=True)
     name = Column(String, nullable=False)
 
     residents = relationship("User", back_populates="accommodation")
\ No newline at end of file
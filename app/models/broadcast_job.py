@@ -0,0 +1,31 @@
+import enum
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, UUID, Enum as SqlEnum
+from app.models.base import Base
+from uuid import uuid4
+from datetime import datetime
+
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_job"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    university_id = Column(UUID(as_uuid=True), ForeignKey("university.id"), nullable=False, index=True)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True)
+    channel = Column(String, nullable=False)  # "whatsapp" or "sms"
+    audience = Column(String, nullable=False)  # "students", "parents" or "all"
+    accommodation_id = Column(UUID(as_uuid=True), ForeignKey("accommodation.id"), nullable=True)
+    bus_id = Column(UUID(as_uuid=True), ForeignKey("bus.id"), nullable=True)
+    message = Column(Text, nullable=False)
+    status = Column(SqlEnum(JobStatus, name="job_status_enum"), nullable=False, default=JobStatus.queued)
+    total = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -7,7 +7,8 @@ class Bus(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     accommodation_id = Column(UUID(as_uuid=True), ForeignKey('accommodation.id'), nullable=False)
-    university_id = Column(UUID(as_uuid=True), ForeignKey('university.id'), nullable=False)
+    university_id = Column(UUID(as_uuid=True), ForeignKey('university.id'), nullable=False, index=True)
     name = Column(String, nullable=False)
     destination_district = Column(String, nullable=False)
-    capacity = Column(Integer, nullable=True)  # optional if you want capacity limits
\ No newline at end of file
+    capacity = Column(Integer, nullable=True)  # optional if you want capacity limits
+    seats_taken = Column(Integer, nullable=False, default=0, server_default="0")  # approved bookings, see services/seats.py
@@ -17,7 +17,7 @@ class ConversationState(Base):
     __tablename__ = "conversation_state"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    student_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=False)
+    student_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), nullable=False, index=True)
     state = Column(SqlEnum(ConversationStateEnum, name="conversation_state_enum"), default=ConversationStateEnum.idle)
     selected_bus_id = Column(UUID(as_uuid=True), nullable=True)
     language = Column(String, default="en")
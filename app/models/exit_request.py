@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, UUID, ForeignKey, Enum, DateTime, String
+from sqlalchemy import Column, UUID, ForeignKey, Enum, DateTime, String, Index
 from app.models.base import Base
 from uuid import uuid4
 from datetime import datetime
@@ -22,4 +22,11 @@ class ExitRequest(Base):
     status = Column(Enum(ExitStatus, name="exitstatus"), nullable=False, default=ExitStatus.pending)
     requested_at = Column(DateTime, default=datetime.utcnow)
     relative_name = Column(String, nullable=True)  # Name of the relative picking up the student
-    approved_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    approved_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_exit_request_student_id_requested_at", "student_id", "requested_at"),
+        Index("ix_exit_request_student_id_status", "student_id", "status"),
+        Index("ix_exit_request_bus_id_status", "bus_id", "status"),
+        Index("ix_exit_request_requested_at", "requested_at"),  # date-range exports
+    )
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey, UUID, Enum as SqlEnum
+from app.models.base import Base
+from app.models.broadcast_job import JobStatus
+from uuid import uuid4
+from datetime import datetime
+
+class ImportJob(Base):
+    __tablename__ = "import_job"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    university_id = Column(UUID(as_uuid=True), ForeignKey("university.id"), nullable=False, index=True)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True)
+    status = Column(SqlEnum(JobStatus, name="job_status_enum"), nullable=False, default=JobStatus.queued)
+    rows = Column(Integer, nullable=False, default=0)  # rows received
+    created = Column(Integer, nullable=False, default=0)  # students inserted
+    skipped = Column(Integer, nullable=False, default=0)  # rows rejected, see errors
+    errors = Column(Text, nullable=True)  # JSON list of {"row", "error"}
+    total = Column(Integer, nullable=False, default=0)  # welcome messages queued
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,33 @@
+import enum
+from sqlalchemy import Column, String, Integer, DateTime, Text, Index, UUID, Enum as SqlEnum, text
+from app.models.base import Base
+from uuid import uuid4
+from datetime import datetime
+
+class OutboxStatus(str, enum.Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    dead = "dead"
+
+# Rows the dispatcher may pick up; see webhook_inbox.CLAIMABLE.
+CLAIMABLE = text("status IN ('pending', 'sending')")
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    kind = Column(String, nullable=False)  # sender key, e.g. "whatsapp.text" or "sms"
+    recipient = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # sender arguments as JSON
+    status = Column(SqlEnum(OutboxStatus, name="outbox_status_enum"), nullable=False, default=OutboxStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_due", "next_attempt_at", postgresql_where=CLAIMABLE, sqlite_where=CLAIMABLE),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, UUID, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, String, UUID, ForeignKey, DateTime, Boolean, Index
 from app.models.base import Base
 from uuid import uuid4
 from datetime import datetime
@@ -11,4 +11,8 @@ class OTP(Base):
     otp_code = Column(String, nullable=False)
     expires_at = Column(DateTime, nullable=False)
     is_verified = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_otp_user_id_otp_code", "user_id", "otp_code", "expires_at"),
+    )
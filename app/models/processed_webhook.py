@@ -6,4 +6,4 @@ class ProcessedWebhook(Base):
     __tablename__ = "processed_webhook"
 
     id = Column(String, primary_key=True)  # WhatsApp message ID
-    processed_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    processed_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, UUID
+from app.models.base import Base
+from datetime import datetime
+
+class ScanEvent(Base):
+    __tablename__ = "scan_event"
+
+    id = Column(String, primary_key=True)  # idempotency key chosen by the gate device
+    student_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=True)
+    exit_request_id = Column(UUID(as_uuid=True), ForeignKey("exit_request.id"), nullable=True)
+    action = Column(String, nullable=False)  # "checkout" or "checkin"
+    result = Column(String, nullable=False)  # "applied", "rejected" or "invalid"
+    detail = Column(Text, nullable=True)
+    scanned_at = Column(DateTime, nullable=True)  # device clock
+    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Enum as SqlEnum, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, String, Enum as SqlEnum, ForeignKey, DateTime, Boolean, Index, Integer
 from app.models.base import Base
 from uuid import uuid4
 from datetime import datetime
@@ -27,14 +27,20 @@ class User(Base):
     accommodation_id = Column(UUID(as_uuid=True), ForeignKey('accommodation.id'), nullable=True)
     university_id = Column(UUID(as_uuid=True), ForeignKey('university.id'), nullable=True)
     is_active = Column(Boolean, default=True)
+    token_version = Column(Integer, nullable=False, default=0)  # bumped to revoke issued tokens
     created_at = Column(DateTime, default=datetime.utcnow)
 
     accommodation = relationship("Accommodation", back_populates="residents")
     university = relationship("University", back_populates="users")
 
+    __table_args__ = (
+        # Also the keyset order of the paginated student and staff lists.
+        Index("ix_user_university_id_role", "university_id", "role", "name", "id"),
+    )
+
 class ParentStudentLink(Base):
     __tablename__ = "parent_student_link"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    parent_id = Column(UUID(as_uuid=True), ForeignKey('user.id'))
-    student_id = Column(UUID(as_uuid=True), ForeignKey('user.id'))
+    parent_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), index=True)
+    student_id = Column(UUID(as_uuid=True), ForeignKey('user.id'), index=True)
@@ -0,0 +1,39 @@
+import enum
+from sqlalchemy import Column, String, Integer, DateTime, Text, Index, UUID, Enum as SqlEnum, text
+from app.models.base import Base
+from uuid import uuid4
+from datetime import datetime
+
+class InboxStatus(str, enum.Enum):
+    pending = "pending"
+    processing = "processing"
+    done = "done"
+    failed = "failed"
+
+# Rows a claimer may pick up. Also the predicate of the partial index below;
+# it is SQL text so the query repeats it verbatim and the planner can match
+# the two (bound parameters would hide the implication from SQLite).
+CLAIMABLE = text("status IN ('pending', 'processing')")
+# Rows kept for inspection until pruned by received_at; same reasoning.
+FAILED = text("status = 'failed'")
+
+class WebhookInbox(Base):
+    __tablename__ = "webhook_inbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    message_id = Column(String, unique=True, nullable=False)  # WhatsApp message ID
+    sender = Column(String, nullable=False)
+    shard = Column(Integer, nullable=False, default=0)  # partition derived from sender
+    payload = Column(Text, nullable=False)  # raw inbound message as JSON
+    status = Column(SqlEnum(InboxStatus, name="inbox_status_enum"), nullable=False, default=InboxStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_webhook_inbox_claimable", "received_at", postgresql_where=CLAIMABLE, sqlite_where=CLAIMABLE),
+        Index("ix_webhook_inbox_status_processed_at", "status", "processed_at"),
+        Index("ix_webhook_inbox_failed", "received_at", postgresql_where=FAILED, sqlite_where=FAILED),
+    )
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+class BroadcastCreate(BaseModel):
+    message: str
+    channel: Literal["whatsapp", "sms"] = "whatsapp"
+    audience: Literal["students", "parents", "all"] = "parents"
+    accommodation_id: Optional[UUID] = None
+    bus_id: Optional[UUID] = None
+
+class BroadcastOut(BaseModel):
+    id: UUID
+    channel: str
+    audience: str
+    accommodation_id: Optional[UUID] = None
+    bus_id: Optional[UUID] = None
+    status: str
+    total: int
+    sent: int
+    failed: int
+    messages_per_second: float
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,40 @@
+from pydantic import BaseModel, field_validator
+from typing import Optional
+from datetime import datetime
+from uuid import UUID
+
+class ImportRow(BaseModel):
+    student_name: str
+    student_phone: str
+    parent_name: str
+    parent_phone: str
+    accommodation: Optional[str] = None  # accommodation name within the university
+
+    @field_validator("student_phone", "parent_phone", mode="before")
+    @classmethod
+    def phone_as_text(cls, value):
+        # Spreadsheet exports often turn phone columns into numbers.
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value)
+        return value
+
+class RowError(BaseModel):
+    row: int
+    error: str
+
+class ImportOut(BaseModel):
+    id: UUID
+    status: str
+    rows: int
+    created: int
+    skipped: int
+    errors: list[RowError]
+    total: int
+    sent: int
+    failed: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
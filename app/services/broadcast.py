@@ -0,0 +1,134 @@
+"""University-wide announcements over WhatsApp or SMS.
+
+A broadcast is a ``BroadcastJob`` row naming a university, an audience
+(students, parents or both) and optional accommodation or bus filters; the
+bus filter selects students holding an approved exit on that bus. Recipients
+are read in keyset-paginated chunks of ``BROADCAST_CHUNK_SIZE`` phone
+numbers and sent through ``pipeline.run_pipeline`` with
+``BROADCAST_CONCURRENCY`` workers and the provider's bulk rate limiter.
+Counters are written back to the job row after every chunk.
+"""
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator
+from uuid import UUID
+from sqlalchemy import select, union, update
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.broadcast_job import BroadcastJob, JobStatus
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.user import ParentStudentLink, User, UserRole
+from app.services import sms_service, whatsapp
+from app.services.pipeline import Progress, run_pipeline
+from app.services.rate_limit import limiters
+
+CHANNELS = {
+    # Free-form text is rejected outside the 24-hour window; announcements use a template.
+    "whatsapp": whatsapp.send_broadcast_template,
+    "sms": sms_service.send_sms,
+}
+
+_running: dict[UUID, asyncio.Task] = {}
+
+metrics.register_gauge("broadcast.running", lambda: len(_running))
+
+
+def audience_ids(job: BroadcastJob):
+    """Select of the user IDs a job addresses."""
+    students = select(User.id).where(User.role == UserRole.student, User.university_id == job.university_id)
+    if job.accommodation_id:
+        students = students.where(User.accommodation_id == job.accommodation_id)
+    if job.bus_id:
+        students = students.where(User.id.in_(
+            select(ExitRequest.student_id)
+            .where(ExitRequest.bus_id == job.bus_id, ExitRequest.status == ExitStatus.approved)
+        ))
+    parents = select(ParentStudentLink.parent_id).where(ParentStudentLink.student_id.in_(students))
+    if job.audience == "students":
+        return students
+    if job.audience == "parents":
+        return parents
+    return union(students, parents)
+
+
+def fetch_chunk(job: BroadcastJob, after: str, limit: int) -> list[str]:
+    with SessionLocal() as db:
+        return list(db.scalars(
+            select(User.phone_number)
+            .where(User.id.in_(audience_ids(job)), User.phone_number > after)
+            .order_by(User.phone_number)
+            .limit(limit)
+        ))
+
+
+async def recipient_chunks(job: BroadcastJob, chunk_size: int) -> AsyncIterator[list[str]]:
+    after = ""
+    while chunk := await asyncio.to_thread(fetch_chunk, job, after, chunk_size):
+        yield chunk
+        after = chunk[-1]
+
+
+def _save(job_id: UUID, **values):
+    with SessionLocal() as db:
+        db.execute(update(BroadcastJob).where(BroadcastJob.id == job_id).values(**values))
+        db.commit()
+
+
+async def run_broadcast(job_id: UUID) -> Progress:
+    with SessionLocal() as db:
+        job = db.get(BroadcastJob, job_id)
+        db.expunge(job)
+
+    send = CHANNELS[job.channel]
+    progress = Progress()
+    _save(job_id, status=JobStatus.running, started_at=datetime.utcnow())
+
+    async def deliver(phone: str):
+        ok = await send(phone, job.message) is not False
+        metrics.incr("broadcast.sent" if ok else "broadcast.failed")
+        return ok
+
+    async def save_progress(p: Progress):
+        await asyncio.to_thread(
+            _save, job_id, total=p.total, sent=p.succeeded, failed=p.failed, last_error=p.last_error
+        )
+
+    try:
+        await run_pipeline(
+            recipient_chunks(job, settings.BROADCAST_CHUNK_SIZE),
+            deliver,
+            concurrency=settings.BROADCAST_CONCURRENCY,
+            progress=progress,
+            limiter=limiters.get(f"{job.channel}.bulk"),
+            on_chunk=save_progress,
+        )
+    except asyncio.CancelledError:
+        _save(job_id, status=JobStatus.failed, last_error="interrupted", finished_at=datetime.utcnow())
+        raise
+    except Exception as e:
+        _save(job_id, status=JobStatus.failed, last_error=repr(e), finished_at=datetime.utcnow())
+        return progress
+    _save(job_id, status=JobStatus.completed, finished_at=datetime.utcnow())
+    return progress
+
+
+def start_broadcast(job_id: UUID) -> asyncio.Task:
+    task = asyncio.create_task(run_broadcast(job_id))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+    return task
+
+
+async def stop_broadcasts():
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def messages_per_second(job: BroadcastJob) -> float:
+    if not job.started_at:
+        return 0.0
+    elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+    return round((job.sent + job.failed) / elapsed, 2) if elapsed > 0 else 0.0
@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from uuid import UUID, uuid4
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.conversation_state import ConversationState, ConversationStateEnum
+
+
+@dataclass
+class ConversationSnapshot:
+    student_id: UUID
+    state: ConversationStateEnum = ConversationStateEnum.idle
+    language: str = "en"
+    temp_data: str | None = None
+    selected_bus_id: UUID | None = None
+    updated_at: datetime | None = None
+    id: UUID | None = None  # None until the row is first written
+
+    _persisted: tuple | None = field(default=None, repr=False, compare=False)
+    _last_used: float = field(default_factory=time.monotonic, repr=False, compare=False)
+
+    def _values(self) -> tuple:
+        return (self.state, self.language, self.temp_data, self.selected_bus_id, self.updated_at)
+
+    @property
+    def dirty(self) -> bool:
+        return self._values() != self._persisted
+
+    def mark_persisted(self):
+        self._persisted = self._values()
+
+    def transition(self, new_state: ConversationStateEnum):
+        self.state = new_state
+        self.updated_at = datetime.utcnow()
+
+    @classmethod
+    def from_row(cls, row: ConversationState) -> "ConversationSnapshot":
+        snapshot = cls(
+            student_id=row.student_id,
+            state=row.state,
+            language=row.language,
+            temp_data=row.temp_data,
+            selected_bus_id=row.selected_bus_id,
+            updated_at=row.updated_at,
+            id=row.id,
+        )
+        snapshot.mark_persisted()
+        return snapshot
+
+
+_COLUMNS = [f.name for f in fields(ConversationSnapshot) if not f.name.startswith("_") and f.name != "id"]
+
+
+class ConversationCache:
+    """Per-student conversation state with unit-of-work semantics.
+
+    A chatbot turn loads the snapshot once (from memory when the student was
+    active recently), mutates it in memory and flushes it with a single
+    INSERT or UPDATE at the end. Entries idle for longer than ``idle_ttl``
+    seconds, or beyond ``max_size``, are evicted.
+
+    The cache is only coherent because a student's messages are processed by
+    a single inbox worker (see ``webhook_inbox``); anything else that writes
+    conversation_state must call ``evict``.
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries: OrderedDict[UUID, ConversationSnapshot] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._entries:
+            student_id, snapshot = next(iter(self._entries.items()))
+            if snapshot._last_used >= cutoff and len(self._entries) <= self.max_size:
+                break
+            del self._entries[student_id]
+
+    def load(self, db: Session, student_id: UUID, language: str = "en") -> ConversationSnapshot:
+        self._evict_idle()
+        snapshot = self._entries.get(student_id)
+        if snapshot is None:
+            row = db.query(ConversationState).filter_by(student_id=student_id).first()
+            if row:
+                snapshot = ConversationSnapshot.from_row(row)
+            else:
+                snapshot = ConversationSnapshot(
+                    student_id=student_id, language=language, updated_at=datetime.utcnow()
+                )
+            self._entries[student_id] = snapshot
+        self._entries.move_to_end(student_id)
+        snapshot._last_used = time.monotonic()
+        return snapshot
+
+    def flush(self, db: Session, snapshot: ConversationSnapshot):
+        """Write the snapshot if it changed. The caller commits."""
+        if not snapshot.dirty:
+            return
+        values = {name: getattr(snapshot, name) for name in _COLUMNS}
+        if snapshot.id is None:
+            snapshot.id = uuid4()
+            db.add(ConversationState(id=snapshot.id, **values))
+        else:
+            db.execute(update(ConversationState).where(ConversationState.id == snapshot.id).values(**values))
+        snapshot.mark_persisted()
+
+    def evict(self, student_id: UUID):
+        self._entries.pop(student_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+conversation_cache = ConversationCache(
+    settings.CONVERSATION_CACHE_SIZE,
+    settings.CONVERSATION_CACHE_IDLE_SECONDS,
+)
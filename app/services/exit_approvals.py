@@ -0,0 +1,54 @@
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.otp import OTP
+from app.models.user import ParentStudentLink
+
+
+def consume_otp(db: Session, parent_id: UUID, code: str) -> bool:
+    """Mark a live OTP as verified in one statement; False if none matched."""
+    result = db.execute(
+        update(OTP)
+        .where(
+            OTP.user_id == parent_id,
+            OTP.otp_code == code,
+            OTP.is_verified == False,
+            OTP.expires_at > datetime.utcnow(),
+        )
+        .values(is_verified=True)
+        .returning(OTP.id)
+    )
+    return result.first() is not None
+
+
+def approve_pending_for_parent(db: Session, parent_id: UUID) -> list:
+    """Approve the latest pending request of each of the parent's students.
+
+    Resolves and approves everything in a single UPDATE ... RETURNING and
+    returns ``(id, student_id, bus_id)`` rows for the approved requests. The
+    caller commits.
+    """
+    students = select(ParentStudentLink.student_id).where(ParentStudentLink.parent_id == parent_id)
+    latest = (
+        select(ExitRequest.student_id, func.max(ExitRequest.requested_at).label("requested_at"))
+        .where(ExitRequest.status == ExitStatus.pending, ExitRequest.student_id.in_(students))
+        .group_by(ExitRequest.student_id)
+        .subquery()
+    )
+    to_approve = (
+        select(ExitRequest.id)
+        .join(latest, and_(
+            ExitRequest.student_id == latest.c.student_id,
+            ExitRequest.requested_at == latest.c.requested_at,
+        ))
+        .where(ExitRequest.status == ExitStatus.pending)
+    )
+    return db.execute(
+        update(ExitRequest)
+        .where(ExitRequest.id.in_(to_approve))
+        .values(status=ExitStatus.approved, parent_id=parent_id, approved_at=datetime.utcnow())
+        .returning(ExitRequest.id, ExitRequest.student_id, ExitRequest.bus_id)
+        .execution_options(synchronize_session=False)
+    ).all()
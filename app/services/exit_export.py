@@ -0,0 +1,124 @@
+"""Streaming export of exit requests for gate logs.
+
+``stream_export`` yields the export as text chunks for a
+``StreamingResponse``. Each exit request is joined with its student,
+accommodation, bus and approving parent in a single query. The query runs
+on its own session, because the request's session is closed before the
+body is sent, and it reads through a server-side cursor
+(``stream_results``) in batches of ``EXPORT_BATCH_SIZE`` rows. Each batch
+becomes one chunk, so memory stays flat however many rows match. The CSV
+header is sent before the query runs, so the first byte goes out at once.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.accommodation import Accommodation
+from app.models.bus import Bus
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.user import User
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Names and phones come from WhatsApp users; a leading one of these makes Excel run the cell.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+FIELDS = [
+    "request_id", "requested_at", "approved_at", "status", "exit_method", "relative_name",
+    "student_id", "student_name", "student_phone", "accommodation", "bus", "destination_district",
+    "parent_name", "parent_phone",
+]
+
+
+@dataclass(frozen=True)
+class ExportFilters:
+    university_id: UUID | None = None
+    start: datetime | None = None
+    end: datetime | None = None
+    status: ExitStatus | None = None
+    exit_method: str | None = None
+
+
+def export_query(filters: ExportFilters):
+    student, parent = aliased(User), aliased(User)
+    query = (
+        select(
+            ExitRequest.id, ExitRequest.requested_at, ExitRequest.approved_at, ExitRequest.status,
+            ExitRequest.exit_method, ExitRequest.relative_name,
+            student.id, student.name, student.phone_number, Accommodation.name,
+            Bus.name, Bus.destination_district, parent.name, parent.phone_number,
+        )
+        .join(student, student.id == ExitRequest.student_id)
+        .outerjoin(Accommodation, Accommodation.id == student.accommodation_id)
+        .outerjoin(Bus, Bus.id == ExitRequest.bus_id)
+        .outerjoin(parent, parent.id == ExitRequest.parent_id)
+        .order_by(ExitRequest.requested_at, ExitRequest.id)
+    )
+    if filters.university_id is not None:
+        query = query.where(student.university_id == filters.university_id)
+    if filters.start is not None:
+        query = query.where(ExitRequest.requested_at >= filters.start)
+    if filters.end is not None:
+        query = query.where(ExitRequest.requested_at < filters.end)
+    if filters.status is not None:
+        query = query.where(ExitRequest.status == filters.status)
+    if filters.exit_method is not None:
+        query = query.where(ExitRequest.exit_method == filters.exit_method)
+    return query
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ExitStatus):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _cell(value):
+    """A CSV cell that spreadsheets will not evaluate as a formula."""
+    value = _plain(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[_cell(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(FIELDS, map(_plain, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def stream_export(filters: ExportFilters, fmt: str = "csv") -> Iterator[str]:
+    """Yield the matching exit requests as CSV or NDJSON text, one batch per chunk."""
+    if fmt == "csv":
+        # Byte order mark so Excel opens Arabic names as UTF-8.
+        yield "﻿" + _csv_chunk([FIELDS])
+    encode = _csv_chunk if fmt == "csv" else _ndjson_chunk
+    with SessionLocal() as db:
+        result = db.execute(
+            export_query(filters),
+            execution_options={"stream_results": True, "yield_per": settings.EXPORT_BATCH_SIZE},
+        )
+        for rows in result.partitions():
+            yield encode(rows)
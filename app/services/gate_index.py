@@ -0,0 +1,239 @@
+"""In-memory index of who may pass the gate.
+
+For every student the index keeps the name, university, accommodation and
+the exit currently in effect: an ``approved`` request (may leave) or a
+``completed`` one (is out). Scan checks become one dictionary lookup; a
+student missing from the index is loaded with a single joined query.
+
+Code that moves an exit request calls ``stage_change`` on the session doing the
+change. The new state is applied locally when that session commits and
+dropped if it rolls back. On PostgreSQL ``stage_change`` also issues a
+``pg_notify`` inside the same transaction; every worker runs a listener
+(``start_listener``) that evicts the named students, so their next lookup
+reloads them. Entries also expire after ``GATE_INDEX_TTL`` seconds as a
+backstop for deployments without LISTEN/NOTIFY.
+"""
+import asyncio
+import select
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from uuid import UUID
+from sqlalchemy import and_, event, func, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import engine
+from app.models.accommodation import Accommodation
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.user import User, UserRole
+
+CHANNEL = "gate_index"
+_ORIGIN = uuid.uuid4().hex[:8]
+_ACTIVE = (ExitStatus.approved, ExitStatus.completed)
+_EVICT = object()
+
+
+@dataclass(frozen=True)
+class ExitState:
+    exit_request_id: UUID
+    status: ExitStatus
+    bus_id: UUID | None = None
+
+
+@dataclass(frozen=True)
+class GateEntry:
+    student_id: UUID
+    name: str
+    university_id: UUID | None
+    accommodation: str | None
+    exit: ExitState | None
+    loaded_at: float
+
+
+class GateIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[UUID, GateEntry] = {}
+        self._active: dict[UUID | None, dict[UUID, ExitState]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _put(self, entry: GateEntry):
+        previous = self._entries.get(entry.student_id)
+        if previous is not None:
+            self._active.get(previous.university_id, {}).pop(entry.student_id, None)
+        self._entries[entry.student_id] = entry
+        if entry.exit is not None:
+            self._active.setdefault(entry.university_id, {})[entry.student_id] = entry.exit
+
+    def _drop(self, student_id: UUID):
+        entry = self._entries.pop(student_id, None)
+        if entry is not None:
+            self._active.get(entry.university_id, {}).pop(student_id, None)
+
+    def _query(self, db: Session, student_ids: list[UUID] | None = None) -> list[GateEntry]:
+        latest = (
+            db.query(ExitRequest.student_id, func.max(ExitRequest.requested_at).label("requested_at"))
+            .filter(ExitRequest.status.in_(_ACTIVE))
+            .group_by(ExitRequest.student_id)
+        )
+        if student_ids is not None:
+            latest = latest.filter(ExitRequest.student_id.in_(student_ids))
+        latest = latest.subquery()
+        query = (
+            db.query(
+                User.id, User.name, User.university_id, Accommodation.name,
+                ExitRequest.id, ExitRequest.status, ExitRequest.bus_id,
+            )
+            .outerjoin(Accommodation, Accommodation.id == User.accommodation_id)
+            .outerjoin(latest, latest.c.student_id == User.id)
+            .outerjoin(ExitRequest, and_(
+                ExitRequest.student_id == User.id,
+                ExitRequest.requested_at == latest.c.requested_at,
+                ExitRequest.status.in_(_ACTIVE),
+            ))
+            .filter(User.role == UserRole.student)
+        )
+        if student_ids is not None:
+            query = query.filter(User.id.in_(student_ids))
+        rows = query.all()
+        now = time.monotonic()
+        return [
+            GateEntry(
+                student_id, name, university_id, accommodation,
+                ExitState(request_id, status, bus_id) if request_id else None, now,
+            )
+            for student_id, name, university_id, accommodation, request_id, status, bus_id in rows
+        ]
+
+    def warm(self, db: Session):
+        """Load every student in one query."""
+        entries = self._query(db)
+        with self._lock:
+            self._entries.clear()
+            self._active.clear()
+            for entry in entries:
+                self._put(entry)
+
+    def get(self, db: Session, student_id: UUID) -> GateEntry | None:
+        """The student's gate entry, or None if there is no such student."""
+        with self._lock:
+            entry = self._entries.get(student_id)
+        if entry is not None and entry.loaded_at + self.ttl > time.monotonic():
+            return entry
+        loaded = self._query(db, [student_id])
+        with self._lock:
+            if loaded:
+                self._put(loaded[0])
+            else:
+                self._drop(student_id)
+        return loaded[0] if loaded else None
+
+    def active(self, university_id: UUID) -> dict[UUID, ExitState]:
+        """Students of a university who are cleared to leave or are out."""
+        with self._lock:
+            return dict(self._active.get(university_id, {}))
+
+    def apply(self, changes: dict):
+        with self._lock:
+            for student_id, state in changes.items():
+                entry = self._entries.get(student_id)
+                if state is _EVICT or entry is None:
+                    self._drop(student_id)
+                else:
+                    self._put(GateEntry(
+                        entry.student_id, entry.name, entry.university_id, entry.accommodation,
+                        state if state is not None and state.status in _ACTIVE else None,
+                        entry.loaded_at,
+                    ))
+
+    def evict(self, *student_ids: UUID):
+        self.apply({student_id: _EVICT for student_id in student_ids})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._active.clear()
+
+
+gate_index = GateIndex(settings.GATE_INDEX_TTL)
+
+
+def stage_change(db: Session, student_id: UUID, state=_EVICT):
+    """Record that ``student_id``'s gate state changes when ``db`` commits.
+
+    ``state`` is the new ``ExitState`` or None when no exit is in effect;
+    leave it out to just reload the student (e.g. after a profile edit).
+    """
+    db.info.setdefault("gate_index", {})[student_id] = state
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                   {"channel": CHANNEL, "payload": f"{_ORIGIN}:{student_id}"})
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged(session: Session):
+    changes = session.info.pop("gate_index", None)
+    if changes:
+        gate_index.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged(session: Session):
+    session.info.pop("gate_index", None)
+
+
+def _handle_notification(payload: str):
+    origin, _, student_id = payload.partition(":")
+    if origin != _ORIGIN:
+        gate_index.evict(UUID(student_id))
+
+
+def _listen(stop: threading.Event):
+    connection = engine.raw_connection()
+    try:
+        dbapi = connection.driver_connection
+        dbapi.autocommit = True
+        dbapi.cursor().execute(f"LISTEN {CHANNEL}")
+        while not stop.is_set():
+            if select.select([dbapi], [], [], 1.0)[0]:
+                dbapi.poll()
+                while dbapi.notifies:
+                    _handle_notification(dbapi.notifies.pop(0).payload)
+    finally:
+        # Autocommit and the LISTEN would outlive a return to the pool; discard the connection instead.
+        connection.invalidate()
+
+
+_listener: asyncio.Task | None = None
+_stop_listener = threading.Event()
+
+
+async def _listen_forever():
+    while not _stop_listener.is_set():
+        try:
+            await asyncio.to_thread(_listen, _stop_listener)
+        except Exception as e:
+            print(f"[GATE INDEX LISTEN ERROR] {e!r}")
+            # Notifications may have been missed while disconnected.
+            gate_index.clear()
+            await asyncio.sleep(5)
+
+
+def start_listener():
+    global _listener
+    if engine.dialect.name != "postgresql":
+        return
+    _stop_listener.clear()
+    _listener = asyncio.create_task(_listen_forever())
+
+
+async def stop_listener():
+    global _listener
+    if _listener is not None:
+        _stop_listener.set()
+        await asyncio.gather(_listener, return_exceptions=True)
+        _listener = None
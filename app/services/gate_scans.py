@@ -0,0 +1,234 @@
+"""Apply gate scans, one at a time or as an offline batch.
+
+Gate devices buffer scans while offline and send them later as an ordered
+batch, each event carrying an idempotency key. A batch is applied in a
+single transaction:
+
+1. keys already recorded in ``scan_event`` are answered from the stored
+   result, so a device can resend a batch safely. Keys are chosen by the
+   device, so they are stored under the uploading user's ID and one
+   user's keys can never answer for another's;
+2. pass tokens are verified in process, bare student IDs resolve to the
+   student's latest approved or checked-out request;
+3. the referenced requests of the user's university are loaded (and
+   locked) with one query, and the events are replayed in order against
+   that in-memory state;
+4. the resulting status changes, seat releases and scan_event rows are
+   written in bulk, parent notifications go to the outbox and the gate
+   index is updated on commit.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import and_, insert, or_, update
+from sqlalchemy.orm import Session
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.scan_event import ScanEvent
+from app.core.principals import Principal
+from app.models.user import User
+from app.services import outbox
+from app.services.gate_index import ExitState, stage_change
+from app.services.pass_tokens import InvalidPassToken, verify
+from app.services.relationships import relationships
+from app.services.seats import release_seats
+
+# Gate action -> (status the request must be in, status it moves to)
+TRANSITIONS = {
+    "checkout": (ExitStatus.approved, ExitStatus.completed),
+    "checkin": (ExitStatus.completed, ExitStatus.returned),
+}
+
+
+def transition_values(new: ExitStatus) -> dict:
+    """Columns written when a gate scan moves a request to ``new``; every scan path uses these."""
+    values = {"status": new}
+    if new == ExitStatus.returned:
+        # Check-in has always been stamped in approved_at.
+        values["approved_at"] = datetime.utcnow()
+    return values
+
+
+def record_transition(db: Session, student_id, exit_request_id, action: str):
+    """Move the request along in one conditional UPDATE; None if it was not in the expected state."""
+    current, new = TRANSITIONS[action]
+    return db.execute(
+        update(ExitRequest)
+        .where(
+            ExitRequest.id == exit_request_id,
+            ExitRequest.student_id == student_id,
+            ExitRequest.status == current,
+        )
+        .values(**transition_values(new))
+        .returning(ExitRequest.bus_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+@dataclass
+class _Request:
+    student_id: UUID
+    student_name: str
+    status: ExitStatus
+    original: ExitStatus
+    bus_id: UUID | None
+    requested_at: datetime
+
+
+def _result(event, result: str, detail: str | None = None, exit_request_id=None, duplicate=False) -> dict:
+    return {
+        "key": event.key,
+        "action": event.action,
+        "result": result,
+        "detail": detail,
+        "exit_request_id": str(exit_request_id) if exit_request_id else None,
+        "duplicate": duplicate,
+    }
+
+
+def _load_requests(db: Session, university_id: UUID | None, request_ids: set, student_ids: set) -> dict[UUID, _Request]:
+    if not request_ids and not student_ids:
+        return {}
+    rows = (
+        db.query(
+            ExitRequest.id, ExitRequest.student_id, User.name,
+            ExitRequest.status, ExitRequest.bus_id, ExitRequest.requested_at,
+        )
+        .join(User, User.id == ExitRequest.student_id)
+        .filter(User.university_id == university_id)
+        .filter(or_(
+            ExitRequest.id.in_(request_ids),
+            and_(
+                ExitRequest.student_id.in_(student_ids),
+                ExitRequest.status.in_([ExitStatus.approved, ExitStatus.completed]),
+            ),
+        ))
+        .with_for_update(of=ExitRequest)
+        .all()
+    )
+    return {
+        row.id: _Request(row.student_id, row.name, row.status, row.status, row.bus_id, row.requested_at)
+        for row in rows
+    }
+
+
+def _latest_for_student(requests: dict[UUID, _Request], student_id: UUID, status: ExitStatus) -> UUID | None:
+    candidates = [
+        (request.requested_at, request_id) for request_id, request in requests.items()
+        if request.student_id == student_id and request.status == status
+    ]
+    return max(candidates)[1] if candidates else None
+
+
+def _stored_key(principal: Principal, key: str) -> str:
+    return f"{principal.id}:{key}"
+
+
+def apply_scans(db: Session, principal: Principal, events: list) -> list[dict]:
+    """Apply scan events in order, as ``principal``, and return one result per event. The caller commits.
+
+    Each event has ``key``, ``action``, ``scanned_at`` and either ``token``
+    (a signed pass) or ``student_id``. Only requests of the principal's
+    university can be moved.
+    """
+    keys = {_stored_key(principal, event.key) for event in events}
+    recorded = {row.id: row for row in db.query(ScanEvent).filter(ScanEvent.id.in_(keys))}
+
+    resolved = []  # (event, student_id, exit_request_id, error)
+    batch_keys = set()
+    for event in events:
+        if _stored_key(principal, event.key) in recorded or event.key in batch_keys:
+            resolved.append((event, None, None, "duplicate"))
+            continue
+        batch_keys.add(event.key)
+        if event.token:
+            try:
+                claims = verify(event.token)
+            except InvalidPassToken as e:
+                resolved.append((event, None, None, str(e)))
+                continue
+            resolved.append((event, claims.student_id, claims.exit_request_id, None))
+        elif event.student_id:
+            resolved.append((event, event.student_id, None, None))
+        else:
+            resolved.append((event, None, None, "A token or student_id is required"))
+
+    requests = _load_requests(
+        db,
+        principal.university_id,
+        {request_id for _, _, request_id, error in resolved if request_id and not error},
+        {student_id for _, student_id, request_id, error in resolved if student_id and not request_id and not error},
+    )
+
+    results, rows, applied = [], [], []
+    for event, student_id, request_id, error in resolved:
+        if error == "duplicate":
+            previous = recorded.get(_stored_key(principal, event.key))
+            if previous:
+                results.append(_result(event, previous.result, previous.detail, previous.exit_request_id, duplicate=True))
+            else:
+                results.append(_result(event, "rejected", "Duplicate key in batch", duplicate=True))
+            continue
+
+        request = None
+        if error:
+            result = _result(event, "invalid", error)
+        else:
+            current, new = TRANSITIONS[event.action]
+            if request_id is None:
+                request_id = _latest_for_student(requests, student_id, current)
+            request = requests.get(request_id)
+            if request is None or request.student_id != student_id:
+                request = None
+                result = _result(event, "rejected", "No matching exit request", request_id)
+            elif request.status != current:
+                result = _result(event, "rejected", f"Exit request is {request.status.value}", request_id)
+            else:
+                request.status = new
+                applied.append((event.action, request))
+                result = _result(event, "applied", None, request_id)
+
+        results.append(result)
+        # IDs from the device are only stored once they matched a loaded request:
+        # an unknown or deleted student or request would fail the foreign keys.
+        rows.append({
+            "id": _stored_key(principal, event.key),
+            "student_id": request.student_id if request else None,
+            "exit_request_id": request_id if request else None,
+            "action": event.action,
+            "result": result["result"],
+            "detail": result["detail"],
+            "scanned_at": event.scanned_at,
+            "recorded_at": datetime.utcnow(),
+        })
+
+    changes = defaultdict(list)
+    for request_id, request in requests.items():
+        if request.status != request.original:
+            changes[(request.original, request.status)].append(request_id)
+    for (original, new), request_ids in changes.items():
+        for request_id in request_ids:
+            request = requests[request_id]
+            stage_change(db, request.student_id, ExitState(request_id, new, request.bus_id))
+        db.execute(
+            update(ExitRequest)
+            .where(ExitRequest.id.in_(request_ids), ExitRequest.status == original)
+            .values(**transition_values(new))
+            .execution_options(synchronize_session=False)
+        )
+
+    release_seats(db, Counter(
+        request.bus_id for action, request in applied if action == "checkout" and request.bus_id
+    ))
+    if rows:
+        db.execute(insert(ScanEvent), rows)
+
+    parents = relationships.parents_of_many(db, {request.student_id for _, request in applied})
+    for action, request in applied:
+        contacts = parents.get(request.student_id)
+        if contacts:
+            outbox.enqueue(
+                db, "whatsapp.check", contacts[0].phone_number,
+                student_name=request.student_name, check_type="out" if action == "checkout" else "in",
+            )
+    return results
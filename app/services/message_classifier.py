@@ -1,23 +1,122 @@
+"""Intent classification for inbound chatbot messages.
+
+Trigger phrases live in a phrase table (``intent_phrases.json`` by default,
+or the file named by ``INTENT_PHRASES_PATH``) that maps each intent to a
+match mode and its phrases. Match modes: ``contains`` fires when a phrase
+appears anywhere in the message, ``exact`` only when the whole message is
+the phrase.
+
+Phrases are compiled into trie-shaped regexes that accept the same Arabic
+spelling variants ``normalize_text`` folds (alef and hamza forms, taa
+marbuta, harakat, tatweel), so messages are matched after a plain
+``lower()`` instead of a full normalization pass. Every ``contains`` phrase
+shares one pattern. When phrases of several intents appear in a message,
+the intent listed first in the table wins, so "my request exit please" is
+an exit and not a status query.
+"""
+import json
+import os
+import re
+from app.core.config import settings
+from app.utils.language import normalize_text
+
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(__file__), "intent_phrases.json")
+
+# Letters whose variants normalize_text folds together, and the marks it drops.
+_VARIANTS = {"ا": "اأإآٱ", "ه": "هة", "ي": "يىئ", "و": "وؤ"}
+_MARKS = "[ً-ْٰـ]*"
+
+
+def load_phrase_table(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _char_pattern(ch: str) -> str:
+    if ch == " ":
+        return r"\s+"
+    pattern = f"[{_VARIANTS[ch]}]" if ch in _VARIANTS else re.escape(ch)
+    if "؀" <= ch <= "ۿ":
+        pattern += _MARKS
+    return pattern
+
+
+def phrase_pattern(phrases) -> str:
+    """Regex matching any of the normalized ``phrases``, factored as a trie."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [_char_pattern(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # A phrase ending here makes the longer continuations optional.
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _lookup(phrases: dict[str, str], matched: str) -> str:
+    # Most messages use the canonical spelling; only variants need folding.
+    intent = phrases.get(matched)
+    return intent if intent is not None else phrases[normalize_text(matched)]
+
+
+class IntentClassifier:
+    def __init__(self, table: dict):
+        self._exact: dict[str, str] = {}
+        self._contains: dict[str, str] = {}
+        self._strip: dict[str, re.Pattern] = {}
+        # contains intents in table order, for ranking multiple matches
+        self._ranked: list[tuple[str, re.Pattern]] = []
+        for intent, spec in table.items():
+            phrases = {normalize_text(phrase) for phrase in spec["phrases"]} - {""}
+            target = self._exact if spec.get("match", "contains") == "exact" else self._contains
+            for phrase in phrases:
+                target.setdefault(phrase, intent)
+            self._strip[intent] = re.compile(phrase_pattern(phrases))
+            if target is self._contains:
+                self._ranked.append((intent, self._strip[intent]))
+        self._exact_pattern = re.compile(phrase_pattern(self._exact))
+        # Generous bound: harakat and padding make a message longer than its phrase.
+        self._exact_max_len = 3 * max(map(len, self._exact), default=0) + 8
+        self._contains_pattern = re.compile(phrase_pattern(self._contains))
+
+    def classify(self, text: str) -> str | None:
+        """Return the intent of ``text``, or None."""
+        text = text.lower()
+        if len(text) <= self._exact_max_len:
+            match = self._exact_pattern.fullmatch(text.strip())
+            if match:
+                return _lookup(self._exact, match.group())
+        match = self._contains_pattern.search(text)
+        if not match:
+            return None
+        intent = _lookup(self._contains, match.group())
+        # Only a lower-ranked first match pays for the extra searches.
+        for earlier, pattern in self._ranked:
+            if earlier == intent:
+                break
+            if pattern.search(text):
+                return earlier
+        return intent
+
+    def strip(self, text: str, intent: str) -> str:
+        """Remove the intent's trigger phrases from ``text`` and normalize the rest."""
+        return normalize_text(self._strip[intent].sub(" ", text.lower()))
+
+
+classifier = IntentClassifier(load_phrase_table(settings.INTENT_PHRASES_PATH or DEFAULT_PHRASES_PATH))
+
+
+def classify(text: str) -> str | None:
+    return classifier.classify(text)
+
+
 def is_exit_request(text: str) -> bool:
-    text = text.lower().strip()
-
-    # English variants
-    english_triggers = [
-        "request exit",
-        "exit request",
-        "i want to leave",
-        "can i go out",
-        "going out",
-    ]
-
-    # Arabic variants
-    arabic_triggers = [
-        "طلب خروج",
-        "أريد الخروج",
-        "ابي اطلع",
-        "اريد الخروج",
-        "ممكن اطلع",
-        "اقدر اطلع",
-    ]
-
-    return any(phrase in text for phrase in english_triggers + arabic_triggers)
\ No newline at end of file
+    return classifier.classify(text) == "exit"
@@ -0,0 +1,232 @@
+"""Transactional outbox for parent and student notifications.
+
+Code that changes state calls ``enqueue`` on the same session, so the
+notification is committed together with the change or not at all, and the
+request returns without waiting on WhatsApp or Omantel. A dispatcher claims
+due rows in batches and hands each to the sender registered for its kind,
+spending a token from the provider's rate limiter first. Failures are
+retried with exponential backoff; after ``OUTBOX_MAX_ATTEMPTS`` the row is
+marked ``dead`` and kept with its last error for inspection.
+
+Rows for different recipients are sent concurrently, but one recipient's
+rows go out one at a time in the order they were queued, so chat replies
+arrive in order. When a row is put back for later (throttled or failed),
+the recipient's remaining rows in the batch are put back with it rather
+than overtaking it.
+
+The dispatcher starts with the API by default. Set ``OUTBOX_DISPATCHER=false``
+on the API processes and run ``python -m app.services.outbox`` to run it on
+its own; rate limits are per dispatcher process.
+"""
+import asyncio
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.notification_outbox import CLAIMABLE, NotificationOutbox, OutboxStatus
+from app.services import qr, sms_service, whatsapp
+from app.services.rate_limit import limiters
+
+Sender = Callable[..., Awaitable]
+
+# Each sender takes the recipient first and the stored payload as keywords.
+SENDERS: dict[str, Sender] = {
+    "whatsapp.text": whatsapp.send_whatsapp_message,
+    "whatsapp.approve_request": whatsapp.send_approve_request,
+    "whatsapp.check": whatsapp.send_check_notification,
+    "whatsapp.pass": qr.send_pass_qr,
+    "sms": sms_service.send_sms,
+}
+
+_wakeup: asyncio.Event | None = None
+_dispatcher: asyncio.Task | None = None
+
+
+def enqueue(db: Session, kind: str, recipient: str, **payload) -> NotificationOutbox:
+    """Queue a notification on the caller's transaction. The caller commits."""
+    if kind not in SENDERS:
+        raise ValueError(f"Unknown notification kind: {kind}")
+    row = NotificationOutbox(
+        kind=kind,
+        recipient=recipient,
+        payload=json.dumps(payload, ensure_ascii=False),
+        created_at=datetime.utcnow(),
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(row)
+    return row
+
+
+def notify():
+    """Wake the dispatcher after new rows were committed."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def claim_due(limit: int) -> list[tuple]:
+    """Claim due rows, and rows stuck in ``sending``, with one UPDATE ... RETURNING."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+    claimable = (
+        select(NotificationOutbox.id)
+        .where(CLAIMABLE, or_(
+            and_(NotificationOutbox.status == OutboxStatus.pending, NotificationOutbox.next_attempt_at <= now),
+            and_(NotificationOutbox.status == OutboxStatus.sending, NotificationOutbox.claimed_at < stale),
+        ))
+        .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(claimable.scalar_subquery()))
+        .values(status=OutboxStatus.sending, claimed_at=now)
+        .returning(
+            NotificationOutbox.id,
+            NotificationOutbox.kind,
+            NotificationOutbox.recipient,
+            NotificationOutbox.payload,
+            NotificationOutbox.attempts,
+            NotificationOutbox.created_at,
+        )
+    )
+    with SessionLocal() as db:
+        rows = db.execute(stmt).all()
+        db.commit()
+    return rows
+
+
+def _update(row_id, **values):
+    with SessionLocal() as db:
+        db.execute(update(NotificationOutbox).where(NotificationOutbox.id == row_id).values(**values))
+        db.commit()
+
+
+def backoff(attempts: int) -> float:
+    """Delay before retry number ``attempts``: doubling, capped, with jitter."""
+    delay = min(settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _mark_failed(row, error: str) -> datetime | None:
+    """Schedule a retry and return when it is due, or None if the row is now dead."""
+    attempts = row.attempts + 1
+    if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        print(f"[OUTBOX DEAD] {row.id} {row.kind}: {error}")
+        metrics.incr("outbox.dead")
+        _update(row.id, status=OutboxStatus.dead, attempts=attempts, last_error=error)
+        return None
+    metrics.incr("outbox.retried")
+    due = datetime.utcnow() + timedelta(seconds=backoff(attempts))
+    _update(row.id, status=OutboxStatus.pending, attempts=attempts, last_error=error, next_attempt_at=due)
+    return due
+
+
+async def _acquire(provider: str) -> float:
+    """Wait for a rate-limit token; return the remaining wait if it is too long."""
+    limiter = limiters.get(provider)
+    while limiter is not None:
+        wait = limiter.take()
+        if wait == 0:
+            return 0.0
+        if wait > settings.OUTBOX_MAX_THROTTLE_WAIT:
+            return wait
+        await asyncio.sleep(wait)
+    return 0.0
+
+
+async def deliver(row) -> datetime | None:
+    """Send one row. Returns when it is due again if it was put back, else None."""
+    wait = await _acquire(row.kind.split(".")[0])
+    if wait:
+        # Throttled, not failed: reschedule without spending an attempt.
+        metrics.incr("outbox.throttled")
+        due = datetime.utcnow() + timedelta(seconds=wait)
+        _update(row.id, status=OutboxStatus.pending, next_attempt_at=due)
+        return due
+
+    try:
+        result = await SENDERS[row.kind](row.recipient, **json.loads(row.payload))
+        if result is False:
+            raise RuntimeError("provider rejected the message")
+    except Exception as e:
+        return _mark_failed(row, repr(e))
+    metrics.incr("outbox.sent")
+    _update(row.id, status=OutboxStatus.sent, sent_at=datetime.utcnow())
+    return None
+
+
+async def _deliver_in_order(rows: list):
+    for i, row in enumerate(rows):
+        due = await deliver(row)
+        if due is not None:
+            # Keep the rest behind the row that was put back; created_at breaks the tie on claim.
+            for later in rows[i + 1:]:
+                _update(later.id, status=OutboxStatus.pending, next_attempt_at=due)
+            return
+
+
+async def deliver_batch(batch: list):
+    """Deliver claimed rows: recipients concurrently, each recipient's rows in queue order."""
+    by_recipient = defaultdict(list)
+    # UPDATE ... RETURNING does not keep the claim order.
+    for row in sorted(batch, key=lambda row: row.created_at):
+        by_recipient[row.recipient].append(row)
+    await asyncio.gather(*[_deliver_in_order(rows) for rows in by_recipient.values()], return_exceptions=True)
+
+
+async def _wait_for_work():
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+async def _dispatch_forever():
+    while True:
+        try:
+            batch = await asyncio.to_thread(claim_due, settings.OUTBOX_BATCH_SIZE)
+        except Exception as e:
+            print(f"[OUTBOX ERROR] {e!r}")
+            batch = []
+        if not batch:
+            await _wait_for_work()
+            continue
+        await deliver_batch(batch)
+
+
+def start_dispatcher(enabled: bool | None = None):
+    global _wakeup, _dispatcher
+    if not (settings.OUTBOX_DISPATCHER if enabled is None else enabled):
+        return
+    _wakeup = asyncio.Event()
+    _dispatcher = asyncio.create_task(_dispatch_forever())
+
+
+async def stop_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.cancel()
+        await asyncio.gather(_dispatcher, return_exceptions=True)
+        _dispatcher = None
+
+
+async def _run_forever():
+    start_dispatcher(enabled=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_dispatcher()
+        await whatsapp.close_client()
+        await sms_service.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_forever())
@@ -0,0 +1,98 @@
+"""Signed exit passes that the gate can verify without the database.
+
+A pass token is ``<payload>.<signature>`` in unpadded base64url. The payload
+packs a version byte, the student and exit request UUIDs, the request status
+and an expiry as Unix seconds (38 bytes); the signature is the first 16 bytes
+of an HMAC-SHA256 over it. The key is ``PASS_TOKEN_SECRET``, or one derived
+from ``JWT_SECRET`` when that is unset. The whole token is 74 characters,
+small enough for a low-density QR code.
+
+Verifying checks the signature and expiry in process. Whether the pass may
+still be used is left to the conditional UPDATE that records the gate
+transition, so a cancelled request is refused without a lookup.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.exit_request import ExitStatus
+from app.models.qr_code import QRCode
+
+VERSION = 1
+_LAYOUT = struct.Struct(">B16s16sBI")
+_SIGNATURE_BYTES = 16
+_STATUSES = list(ExitStatus)
+
+
+class InvalidPassToken(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PassClaims:
+    student_id: UUID
+    exit_request_id: UUID
+    status: ExitStatus
+    expires_at: datetime
+
+
+def _key() -> bytes:
+    if settings.PASS_TOKEN_SECRET:
+        return settings.PASS_TOKEN_SECRET.encode()
+    return hmac.new(settings.JWT_SECRET.encode(), b"gatepass-pass-token", hashlib.sha256).digest()
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_key(), payload, hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def mint(student_id: UUID, exit_request_id: UUID, status: ExitStatus, expires_at: datetime) -> str:
+    payload = _LAYOUT.pack(
+        VERSION,
+        student_id.bytes,
+        exit_request_id.bytes,
+        _STATUSES.index(ExitStatus(status)),
+        int((expires_at - datetime(1970, 1, 1)).total_seconds()),
+    )
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def verify(token: str, now: datetime | None = None) -> PassClaims:
+    """Return the token's claims, or raise ``InvalidPassToken``."""
+    try:
+        encoded_payload, encoded_signature = token.strip().split(".")
+        payload = _b64decode(encoded_payload)
+        signature = _b64decode(encoded_signature)
+        version, student, request, status, expires = _LAYOUT.unpack(payload)
+    except (ValueError, struct.error) as e:
+        raise InvalidPassToken("Malformed pass") from e
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidPassToken("Invalid pass signature")
+    if version != VERSION or status >= len(_STATUSES):
+        raise InvalidPassToken("Unsupported pass")
+
+    expires_at = datetime(1970, 1, 1) + timedelta(seconds=expires)
+    if expires_at < (now or datetime.utcnow()):
+        raise InvalidPassToken("Pass expired")
+    return PassClaims(UUID(bytes=student), UUID(bytes=request), _STATUSES[status], expires_at)
+
+
+def issue_pass(db: Session, student_id: UUID, exit_request_id: UUID) -> str:
+    """Mint a pass for an approved request and record it. The caller commits."""
+    expires_at = datetime.utcnow() + timedelta(hours=settings.PASS_TOKEN_TTL_HOURS)
+    token = mint(student_id, exit_request_id, ExitStatus.approved, expires_at)
+    db.add(QRCode(id=uuid4(), exit_request_id=exit_request_id, qr_token=token, expires_at=expires_at))
+    return token
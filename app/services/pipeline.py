@@ -0,0 +1,87 @@
+"""Bounded-concurrency delivery pipeline for bulk jobs.
+
+A producer pulls chunks from an async source into a bounded queue and a
+fixed pool of workers drains it, waiting on a ``RateLimiter`` before each
+item, so memory stays flat however large the audience and the provider's
+limits are never exceeded. ``Progress`` keeps the counters a job reports.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable
+from app.services.rate_limit import RateLimiter
+
+
+@dataclass
+class Progress:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    last_error: str | None = None
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def rate(self) -> float:
+        """Items processed per second so far."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+async def wait_for_token(limiter: RateLimiter | None):
+    while limiter is not None and (wait := limiter.take()):
+        await asyncio.sleep(wait)
+
+
+async def run_pipeline(
+    source: AsyncIterable[list],
+    handle: Callable[[Any], Awaitable],
+    *,
+    concurrency: int,
+    progress: Progress,
+    limiter: RateLimiter | None = None,
+    on_chunk: Callable[[Progress], Awaitable[None]] | None = None,
+) -> Progress:
+    """Run ``handle`` on every item of ``source``.
+
+    ``handle`` fails an item by raising or returning False. ``on_chunk`` is
+    awaited after each chunk is queued and once at the end, which is where
+    callers persist progress.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker():
+        while (item := await queue.get()) is not None:
+            await wait_for_token(limiter)
+            try:
+                ok = await handle(item) is not False
+            except Exception as e:
+                ok = False
+                progress.last_error = repr(e)
+            if ok:
+                progress.succeeded += 1
+            else:
+                progress.failed += 1
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chunk in source:
+            progress.total += len(chunk)
+            for item in chunk:
+                await queue.put(item)
+            if on_chunk:
+                await on_chunk(progress)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        progress.finished = time.monotonic()
+    if on_chunk:
+        await on_chunk(progress)
+    return progress
@@ -1,16 +1,103 @@
-import qrcode
+"""QR code images for student passes.
+
+Rendering is CPU-bound (the matrix is built in pure Python and PIL encodes
+the PNG), so ``render_qr`` runs it on a small executor instead of the event
+loop; set ``QR_RENDER_PROCESSES`` to use processes rather than threads.
+Files are named by a hash of the content and rendering options and are
+skipped when already present, so re-registering or resending a pass costs a
+``stat`` call.
+
+Formats: ``png`` (RGB, the original output), ``png1`` (1-bit PNG, several
+times smaller and still accepted by WhatsApp) and ``svg`` (vector, for the
+dashboard; WhatsApp template headers do not accept SVG). Images sent over
+WhatsApp go through ``render_whatsapp_qr``, which falls back to ``png1``
+when ``QR_FORMAT`` is ``svg``.
+"""
+import asyncio
+import hashlib
 import os
-from PIL import Image
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from uuid import uuid4
+import qrcode
+import qrcode.image.svg
 from app.core.config import settings
+from app.services.whatsapp import send_whatsapp_template_with_qr_link
+
+QR_DIR = "app/static/qrs"
+BOX_SIZE = 10
+BORDER = 4
+EXTENSIONS = {"png": "png", "png1": "png", "svg": "svg"}
+
+_executor: Executor | None = None
 
-def generate_qr_image(student_id: str) -> str:
-    qr = qrcode.QRCode(box_size=10, border=4)
-    qr.add_data(student_id)
+
+def qr_filename(data: str, fmt: str) -> str:
+    digest = hashlib.sha256(f"{fmt}:{BOX_SIZE}:{BORDER}:{data}".encode()).hexdigest()[:32]
+    return f"{digest}.{EXTENSIONS[fmt]}"
+
+
+def _render(data: str, fmt: str, file_path: str):
+    qr = qrcode.QRCode(box_size=BOX_SIZE, border=BORDER)
+    qr.add_data(data)
     qr.make(fit=True)
 
-    img = qr.make_image(fill_color="black", back_color="white").convert("RGB")  # ✅ Force RGB
-    filename = f"{student_id}.png"
-    file_path = os.path.join("app/static/qrs", filename)
-    img.save(file_path, format="PNG", optimize=True)
+    # Unique per call: threads of one process may render the same file at once.
+    tmp_path = f"{file_path}.{uuid4().hex}.tmp"
+    try:
+        if fmt == "svg":
+            qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(tmp_path)
+        else:
+            img = qr.make_image(fill_color="black", back_color="white")
+            img = img.convert("1" if fmt == "png1" else "RGB")
+            img.save(tmp_path, format="PNG", optimize=True)
+        # Publish atomically so a concurrent reader never sees a partial file.
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def generate_qr_image(data: str, fmt: str | None = None) -> str:
+    """Render ``data`` unless its file already exists and return the public URL."""
+    fmt = fmt or settings.QR_FORMAT
+    filename = qr_filename(data, fmt)
+    file_path = os.path.join(QR_DIR, filename)
+    if not os.path.exists(file_path):
+        _render(data, fmt, file_path)
+    return f"{settings.BASE_URL}static/qrs/{filename}"
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        pool = ProcessPoolExecutor if settings.QR_RENDER_PROCESSES else ThreadPoolExecutor
+        _executor = pool(max_workers=settings.QR_RENDER_WORKERS)
+    return _executor
+
+
+async def render_qr(data: str, fmt: str | None = None) -> str:
+    """``generate_qr_image`` off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), generate_qr_image, data, fmt)
+
+
+def whatsapp_format() -> str:
+    return settings.QR_FORMAT if settings.QR_FORMAT != "svg" else "png1"
+
+
+async def render_whatsapp_qr(data: str) -> str:
+    """``render_qr`` in a format WhatsApp accepts as an image header."""
+    return await render_qr(data, whatsapp_format())
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
 
-    return f"{settings.BASE_URL}static/qrs/{filename}"
\ No newline at end of file
+async def send_pass_qr(phone_number: str, token: str, student_name: str):
+    """Render a pass token as a PNG QR code and send it to the student."""
+    qr_url = await render_whatsapp_qr(token)
+    return await send_whatsapp_template_with_qr_link(phone_number, qr_url, student_name)
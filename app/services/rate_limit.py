@@ -0,0 +1,73 @@
+"""Token buckets for outbound provider traffic.
+
+Each provider gets a ``RateLimiter`` made of one or more buckets: WhatsApp
+has a per-second throughput bucket and, if ``WHATSAPP_DAILY_LIMIT`` is set,
+a rolling-day bucket; SMS a per-second bucket. ``take`` never blocks; it
+either spends a token from every bucket or says how long to wait, so the
+caller can sleep or reschedule the work. Limits are per process.
+
+The outbox (OTPs, passes, gate notifications) uses the provider's limiter
+directly. Bulk pipelines (broadcasts, import welcomes) use the
+``"<provider>.bulk"`` limiter, which draws from the same buckets but leaves
+``BULK_RESERVED_SHARE`` of each bucket's capacity untouched. A broadcast can
+therefore never starve transactional messages.
+"""
+import time
+from app.core.config import settings
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, reserve: float = 0.0) -> float:
+        """Seconds until a token is available above ``reserve``, 0 if one is now."""
+        self._refill()
+        needed = 1 + reserve
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, *buckets: TokenBucket, reserved_share: float = 0.0):
+        self.buckets = buckets
+        self.reserved_share = reserved_share
+
+    def take(self) -> float:
+        """Spend a token from every bucket and return 0, or return the wait."""
+        wait = max(
+            (bucket.wait_time(bucket.capacity * self.reserved_share) for bucket in self.buckets),
+            default=0.0,
+        )
+        if wait == 0:
+            for bucket in self.buckets:
+                bucket.tokens -= 1
+        return wait
+
+    def bulk(self, reserved_share: float) -> "RateLimiter":
+        """A limiter on the same buckets that leaves ``reserved_share`` of each to this one."""
+        return RateLimiter(*self.buckets, reserved_share=reserved_share)
+
+
+def _whatsapp_limiter() -> RateLimiter:
+    buckets = [TokenBucket(settings.WHATSAPP_MESSAGES_PER_SECOND, settings.WHATSAPP_MESSAGES_PER_SECOND)]
+    if settings.WHATSAPP_DAILY_LIMIT > 0:
+        buckets.append(TokenBucket(settings.WHATSAPP_DAILY_LIMIT / 86400, settings.WHATSAPP_DAILY_LIMIT))
+    return RateLimiter(*buckets)
+
+
+limiters: dict[str, RateLimiter] = {
+    "whatsapp": _whatsapp_limiter(),
+    "sms": RateLimiter(TokenBucket(settings.SMS_MESSAGES_PER_SECOND, settings.SMS_MESSAGES_PER_SECOND)),
+}
+limiters.update({
+    f"{provider}.bulk": limiter.bulk(settings.BULK_RESERVED_SHARE)
+    for provider, limiter in list(limiters.items())
+})
@@ -0,0 +1,159 @@
+"""Cached parent-student relationship graph.
+
+Maps each student to their parents' contacts and each parent to their
+students' contacts, so notification paths do not pay a link query plus a
+User query every time. Misses are loaded in bulk with one joined query,
+``warm`` loads the whole graph at startup, and entries expire after
+``RELATIONSHIP_CACHE_TTL`` seconds so other workers' edits are picked up.
+Code that changes links, names or phone numbers calls ``invalidate``.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable
+from uuid import UUID
+from sqlalchemy.orm import Session, aliased
+from app.core.config import settings
+from app.models.user import ParentStudentLink, User
+
+
+@dataclass(frozen=True)
+class Contact:
+    id: UUID
+    name: str
+    phone_number: str
+
+
+class _Entries:
+    """Cached contact lists by key, with a reverse index from contact to keys.
+
+    The index lets ``invalidate`` drop only the entries that list a user,
+    without scanning the cache. Callers hold the cache's lock.
+    """
+
+    def __init__(self):
+        self.entries: dict[UUID, tuple[float, list[Contact]]] = {}
+        self.listed_in: dict[UUID, set[UUID]] = {}
+
+    def get(self, key: UUID) -> list[Contact] | None:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: UUID, expires: float, contacts: list[Contact]):
+        self.drop(key)
+        self.entries[key] = (expires, contacts)
+        for contact in contacts:
+            self.listed_in.setdefault(contact.id, set()).add(key)
+
+    def drop(self, key: UUID):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for contact in entry[1]:
+            keys = self.listed_in.get(contact.id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.listed_in[contact.id]
+
+    def invalidate(self, user_ids: set[UUID]):
+        stale = set(user_ids)
+        for user_id in user_ids:
+            stale.update(self.listed_in.get(user_id, ()))
+        for key in stale:
+            self.drop(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.listed_in.clear()
+
+
+class RelationshipCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._parents = _Entries()
+        self._students = _Entries()
+
+    def _load(self, db: Session, key_column, contact_column, keys: list[UUID]) -> dict[UUID, list[Contact]]:
+        other = aliased(User)
+        rows = (
+            db.query(key_column, other.id, other.name, other.phone_number)
+            .join(other, other.id == contact_column)
+            .filter(key_column.in_(keys))
+            .all()
+        )
+        loaded: dict[UUID, list[Contact]] = {key: [] for key in keys}
+        for key, contact_id, name, phone_number in rows:
+            loaded[key].append(Contact(contact_id, name, phone_number))
+        return loaded
+
+    def _lookup(self, db: Session, entries: _Entries, key_column, contact_column,
+                keys: Iterable[UUID]) -> dict[UUID, list[Contact]]:
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            found = {key: entries.get(key) for key in keys}
+        misses = [key for key, contacts in found.items() if contacts is None]
+        if misses:
+            loaded = self._load(db, key_column, contact_column, misses)
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                for key, contacts in loaded.items():
+                    entries.put(key, expires, contacts)
+            found.update(loaded)
+        return found
+
+    def parents_of_many(self, db: Session, student_ids: Iterable[UUID]) -> dict[UUID, list[Contact]]:
+        return self._lookup(db, self._parents, ParentStudentLink.student_id, ParentStudentLink.parent_id, student_ids)
+
+    def students_of_many(self, db: Session, parent_ids: Iterable[UUID]) -> dict[UUID, list[Contact]]:
+        return self._lookup(db, self._students, ParentStudentLink.parent_id, ParentStudentLink.student_id, parent_ids)
+
+    def parents_of(self, db: Session, student_id: UUID) -> list[Contact]:
+        return self.parents_of_many(db, [student_id])[student_id]
+
+    def students_of(self, db: Session, parent_id: UUID) -> list[Contact]:
+        return self.students_of_many(db, [parent_id])[parent_id]
+
+    def warm(self, db: Session):
+        """Load every link in one query."""
+        parent, student = aliased(User), aliased(User)
+        rows = (
+            db.query(
+                student.id, student.name, student.phone_number,
+                parent.id, parent.name, parent.phone_number,
+            )
+            .select_from(ParentStudentLink)
+            .join(student, student.id == ParentStudentLink.student_id)
+            .join(parent, parent.id == ParentStudentLink.parent_id)
+            .all()
+        )
+        parents: dict[UUID, list[Contact]] = {}
+        students: dict[UUID, list[Contact]] = {}
+        for s_id, s_name, s_phone, p_id, p_name, p_phone in rows:
+            parents.setdefault(s_id, []).append(Contact(p_id, p_name, p_phone))
+            students.setdefault(p_id, []).append(Contact(s_id, s_name, s_phone))
+
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for entries, loaded in ((self._parents, parents), (self._students, students)):
+                entries.clear()
+                for key, contacts in loaded.items():
+                    entries.put(key, expires, contacts)
+
+    def invalidate(self, *user_ids: UUID):
+        """Drop every entry keyed by, or listing, any of the given users."""
+        ids = set(user_ids)
+        with self._lock:
+            self._parents.invalidate(ids)
+            self._students.invalidate(ids)
+
+    def clear(self):
+        with self._lock:
+            self._parents.clear()
+            self._students.clear()
+
+
+relationships = RelationshipCache(settings.RELATIONSHIP_CACHE_TTL)
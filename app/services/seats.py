@@ -0,0 +1,95 @@
+"""Bus seat availability.
+
+A seat is taken while a bus exit request is ``approved``; it is released
+when the student checks out (``completed``), which is the rule the chatbot
+has always used to decide whether a bus is full. ``Bus.seats_taken`` keeps
+that count denormalized so the bus menu is a single query. The counter is
+changed with atomic ``seats_taken = seats_taken +/- 1`` updates, where the
+increment only succeeds while the bus has room, and can be rebuilt from
+exit_request with ``recount_seats``.
+"""
+from uuid import UUID
+from sqlalchemy import bindparam, case, func, or_, update
+from sqlalchemy.orm import Session
+from app.models.bus import Bus
+from app.models.exit_request import ExitRequest, ExitStatus
+
+
+def available_buses(db: Session, university_id: UUID) -> list[Bus]:
+    """Buses with a free seat. A bus without a capacity is never full."""
+    return (
+        db.query(Bus)
+        .filter(
+            Bus.university_id == university_id,
+            or_(Bus.capacity.is_(None), Bus.seats_taken < Bus.capacity),
+        )
+        .all()
+    )
+
+
+def seat_counts(db: Session, university_id: UUID | None = None) -> dict[UUID, int]:
+    """Approved bookings per bus, computed with one grouped query."""
+    query = (
+        db.query(Bus.id, func.count(ExitRequest.id))
+        .outerjoin(
+            ExitRequest,
+            (ExitRequest.bus_id == Bus.id) & (ExitRequest.status == ExitStatus.approved),
+        )
+        .group_by(Bus.id)
+    )
+    if university_id is not None:
+        query = query.filter(Bus.university_id == university_id)
+    return dict(query.all())
+
+
+def recount_seats(db: Session, university_id: UUID | None = None):
+    """Rebuild ``seats_taken`` from exit_request. The caller commits."""
+    counts = seat_counts(db, university_id)
+    if not counts:
+        return
+    db.connection().execute(
+        update(Bus.__table__)
+        .where(Bus.__table__.c.id == bindparam("bus_id"))
+        .values(seats_taken=bindparam("taken")),
+        [{"bus_id": bus_id, "taken": taken} for bus_id, taken in counts.items()],
+    )
+
+
+def reserve_seat(db: Session, bus_id: UUID) -> bool:
+    """Claim a seat with one conditional UPDATE; False means the bus is full.
+
+    The capacity check and the increment happen in the same statement, so
+    concurrent bookings cannot overbook. Only the bus row is locked, until
+    the caller commits (or rolls back to give the seat back).
+    """
+    result = db.execute(
+        update(Bus)
+        .where(
+            Bus.id == bus_id,
+            or_(Bus.capacity.is_(None), Bus.seats_taken < Bus.capacity),
+        )
+        .values(seats_taken=Bus.seats_taken + 1)
+    )
+    return result.rowcount == 1
+
+
+def release_seat(db: Session, bus_id: UUID):
+    db.execute(
+        update(Bus)
+        .where(Bus.id == bus_id)
+        .values(seats_taken=case((Bus.seats_taken > 0, Bus.seats_taken - 1), else_=0))
+    )
+
+
+def release_seats(db: Session, released: dict[UUID, int]):
+    """Give back ``n`` seats per bus in one executemany. The caller commits."""
+    if not released:
+        return
+    table = Bus.__table__
+    n = bindparam("n")
+    db.connection().execute(
+        update(table)
+        .where(table.c.id == bindparam("bus_id"))
+        .values(seats_taken=case((table.c.seats_taken > n, table.c.seats_taken - n), else_=0)),
+        [{"bus_id": bus_id, "n": count} for bus_id, count in released.items()],
+    )
@@ -3,8 +3,9 @@ import os
 import asyncio
 import random
 import string
+import time
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from app.core.config import settings
 
 load_dotenv()
 
@@ -14,16 +15,66 @@ OMANTEL_SENDER = os.getenv("OMANTEL_SENDER", "Omantel")
 CLIENT_ID = os.getenv("OMANTEL_CLIENT_ID")
 CLIENT_SECRET = os.getenv("OMANTEL_CLIENT_SECRET")
 
-_token = None
-_token_expiry = None
+# The access token is reused until OMANTEL_TOKEN_SKEW seconds before it
+# expires, so an SMS normally costs one HTTP call on a pooled connection.
+_token: str | None = None
+_token_expiry: float = 0.0
+_token_lock: asyncio.Lock | None = None
+_client: httpx.AsyncClient | None = None
+_send_slots: asyncio.Semaphore | None = None
 
 def generate_correlator_id(length=10):
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
-async def get_access_token():
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OMANTEL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OMANTEL_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.OMANTEL_TIMEOUT, connect=settings.OMANTEL_CONNECT_TIMEOUT),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _slots() -> asyncio.Semaphore:
+    global _send_slots
+    if _send_slots is None:
+        _send_slots = asyncio.Semaphore(settings.OMANTEL_MAX_CONCURRENCY)
+    return _send_slots
+
+def _lock() -> asyncio.Lock:
+    global _token_lock
+    if _token_lock is None:
+        _token_lock = asyncio.Lock()
+    return _token_lock
+
+def _token_valid() -> bool:
+    return _token is not None and time.monotonic() < _token_expiry
+
+async def get_access_token(rejected: str | None = None) -> str:
+    """Return the cached token, refreshing it once however many callers wait.
+
+    Pass the token the API just rejected to force a refresh; callers that
+    arrive after someone else replaced it get the new one.
+    """
     global _token, _token_expiry
 
-    async with httpx.AsyncClient() as client:
+    if _token_valid() and _token != rejected:
+        return _token
+
+    async with _lock():
+        # Another caller may have refreshed while this one waited.
+        if _token_valid() and _token != rejected:
+            return _token
+
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {
             "grant_type": "client_credentials",
@@ -31,22 +82,23 @@ async def get_access_token():
             "client_secret": CLIENT_SECRET,
         }
 
-        response = await client.post(OMANTEL_TOKEN_URL, data=data, headers=headers)
+        response = await get_client().post(OMANTEL_TOKEN_URL, data=data, headers=headers)
         response.raise_for_status()
 
         token_data = response.json()
         _token = token_data["access_token"]
-        _token_expiry = datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 3600))
+        _token_expiry = time.monotonic() + token_data.get("expires_in", 3600) - settings.OMANTEL_TOKEN_SKEW
 
         return _token
 
-async def send_sms(recipient: str, message: str) -> bool:
-    token = await get_access_token()
+async def _post_sms(payload: dict, token: str) -> httpx.Response:
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {token}"
     }
+    return await get_client().post(OMANTEL_API_URL, json=payload, headers=headers)
 
+async def send_sms(recipient: str, message: str) -> bool:
     payload = {
         "sender": OMANTEL_SENDER,
         "clientCorrelatorId": generate_correlator_id(),
@@ -55,12 +107,15 @@ async def send_sms(recipient: str, message: str) -> bool:
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(OMANTEL_API_URL, json=payload, headers=headers)
-            print(payload)
-            print(f"[SMS SUCCESS] {response.json()}")
-            response.raise_for_status()
-            return True
-    except httpx.HTTPError as e:
+        async with _slots():
+            token = await get_access_token()
+            response = await _post_sms(payload, token)
+            if response.status_code == 401:
+                # Revoked or expired early: refresh once and retry.
+                response = await _post_sms(payload, await get_access_token(rejected=token))
+        print(f"[SMS SUCCESS] {response.json()}")
+        response.raise_for_status()
+        return True
+    except (httpx.HTTPError, ValueError) as e:
         print(f"[SMS ERROR] {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,258 @@
+"""Bulk onboarding of students and their parents.
+
+``import_students`` takes rows from CSV or JSON and checks them in memory.
+Phones are normalized, duplicates within the file are rejected, and
+accommodations are matched by name. Phones that already exist are resolved
+with one query per ``IMPORT_LOOKUP_BATCH`` phones: an existing parent is
+linked, and an existing student is reported as a rejected row. New users
+and links are bulk-inserted, and the ``ImportJob`` row holding the row
+report commits in the same transaction. Students and parents are
+created without passwords, so an import does no hashing.
+
+The welcome message, a QR render plus a WhatsApp template per new student,
+runs afterwards through ``pipeline.run_pipeline``. It uses
+``IMPORT_CONCURRENCY`` workers and the WhatsApp bulk rate limiter.
+Counters are written back to the job row after every chunk, so the import
+can be polled like a broadcast.
+"""
+import asyncio
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator
+from uuid import UUID, uuid4
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.accommodation import Accommodation
+from app.models.broadcast_job import JobStatus
+from app.models.import_job import ImportJob
+from app.models.user import ParentStudentLink, User, UserRole
+from app.schemas.student_import import ImportRow
+from app.services.pipeline import Progress, run_pipeline
+from app.services.qr import render_whatsapp_qr
+from app.services.rate_limit import limiters
+from app.services.whatsapp import send_whatsapp_template_with_qr_link
+from app.utils.language import normalize_text
+
+MAX_REPORTED_ERRORS = 500
+_PHONE_PUNCTUATION = str.maketrans("", "", "+-() ")
+
+_running: dict[UUID, asyncio.Task] = {}
+
+metrics.register_gauge("student_import.running", lambda: len(_running))
+
+
+@dataclass(frozen=True)
+class Welcome:
+    student_id: UUID
+    name: str
+    phone_number: str
+
+
+def parse_rows(body: bytes, content_type: str) -> list[dict]:
+    """Rows of a CSV (``text/csv``) or JSON body; raises ValueError if unreadable."""
+    text = body.decode("utf-8-sig")
+    if content_type.split(";")[0].strip() == "text/csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("students")
+    if not isinstance(data, list):
+        raise ValueError("expected a list of students or {\"students\": [...]}")
+    return data
+
+
+def normalize_phone(phone: str) -> str:
+    return normalize_text(phone).translate(_PHONE_PUNCTUATION)
+
+
+def validate_rows(rows: list[dict]) -> tuple[list[tuple[int, ImportRow]], list[dict]]:
+    """Rows that are well-formed and unique in the file, and errors for the rest.
+
+    Row numbers count from 1, excluding a CSV header.
+    """
+    valid, errors = [], []
+    students: set[str] = set()
+    parents: set[str] = set()
+    for number, raw in enumerate(rows, start=1):
+        try:
+            row = ImportRow.model_validate(raw)
+        except ValidationError as e:
+            problem = e.errors()[0]
+            errors.append({"row": number, "error": f"{'.'.join(map(str, problem['loc']))}: {problem['msg']}"})
+            continue
+        row.student_phone = normalize_phone(row.student_phone)
+        row.parent_phone = normalize_phone(row.parent_phone)
+        row.student_name = row.student_name.strip()
+        row.parent_name = row.parent_name.strip()
+        if not row.student_name or not row.parent_name:
+            error = "student_name and parent_name are required"
+        elif not (row.student_phone.isdigit() and 8 <= len(row.student_phone) <= 15):
+            error = "invalid student_phone"
+        elif not (row.parent_phone.isdigit() and 8 <= len(row.parent_phone) <= 15):
+            error = "invalid parent_phone"
+        elif row.student_phone == row.parent_phone:
+            error = "student and parent have the same phone"
+        elif row.student_phone in students:
+            error = "student_phone repeated in this file"
+        elif row.student_phone in parents or row.parent_phone in students:
+            error = "phone used as both a student and a parent in this file"
+        else:
+            error = None
+        if error:
+            errors.append({"row": number, "error": error})
+            continue
+        students.add(row.student_phone)
+        parents.add(row.parent_phone)
+        valid.append((number, row))
+    return valid, errors
+
+
+def _existing_users(db: Session, phones: set[str]) -> dict[str, tuple[UUID, UserRole]]:
+    found = {}
+    phones = sorted(phones)
+    for start in range(0, len(phones), settings.IMPORT_LOOKUP_BATCH):
+        rows = db.execute(
+            select(User.phone_number, User.id, User.role)
+            .where(User.phone_number.in_(phones[start:start + settings.IMPORT_LOOKUP_BATCH]))
+        )
+        found.update((phone, (user_id, role)) for phone, user_id, role in rows)
+    return found
+
+
+def _bulk_insert(db: Session, model, rows: list[dict]):
+    for start in range(0, len(rows), settings.IMPORT_LOOKUP_BATCH):
+        db.execute(insert(model), rows[start:start + settings.IMPORT_LOOKUP_BATCH])
+
+
+def import_students(db: Session, university_id: UUID, created_by: UUID | None,
+                    rows: list[dict]) -> tuple[ImportJob, list[Welcome], set[UUID]]:
+    """Insert the valid rows and record the job; the caller commits.
+
+    Returns the job, the new students to welcome and the existing parents
+    that gained links.
+    """
+    valid, errors = validate_rows(rows)
+    existing = _existing_users(db, {phone for _, row in valid for phone in (row.student_phone, row.parent_phone)})
+    accommodations = {
+        normalize_text(name): accommodation_id
+        for accommodation_id, name in db.execute(
+            select(Accommodation.id, Accommodation.name).where(Accommodation.university_id == university_id)
+        )
+    }
+
+    users, links, welcomes = [], [], []
+    new_parents: dict[str, UUID] = {}
+    linked_parents: set[UUID] = set()
+    for number, row in valid:
+        accommodation_id = None
+        if row.accommodation and row.accommodation.strip():
+            accommodation_id = accommodations.get(normalize_text(row.accommodation))
+            if accommodation_id is None:
+                errors.append({"row": number, "error": f"unknown accommodation {row.accommodation!r}"})
+                continue
+        if row.student_phone in existing:
+            errors.append({"row": number, "error": "student_phone is already registered"})
+            continue
+        parent = existing.get(row.parent_phone)
+        if parent is not None and parent[1] != UserRole.parent:
+            errors.append({"row": number, "error": f"parent_phone belongs to a {parent[1].value}"})
+            continue
+
+        if parent is not None:
+            parent_id = parent[0]
+            linked_parents.add(parent_id)
+        elif row.parent_phone in new_parents:
+            parent_id = new_parents[row.parent_phone]
+        else:
+            parent_id = new_parents[row.parent_phone] = uuid4()
+            users.append({
+                "id": parent_id, "name": row.parent_name, "phone_number": row.parent_phone,
+                "role": UserRole.parent, "hashed_password": None, "accommodation_id": None,
+                "university_id": None,
+            })
+        student_id = uuid4()
+        users.append({
+            "id": student_id, "name": row.student_name, "phone_number": row.student_phone,
+            "role": UserRole.student, "hashed_password": None,
+            "accommodation_id": accommodation_id, "university_id": university_id,
+        })
+        links.append({"id": uuid4(), "parent_id": parent_id, "student_id": student_id})
+        welcomes.append(Welcome(student_id, row.student_name, row.student_phone))
+
+    _bulk_insert(db, User, users)
+    _bulk_insert(db, ParentStudentLink, links)
+    errors.sort(key=lambda error: error["row"])
+    job = ImportJob(
+        id=uuid4(), university_id=university_id, created_by=created_by,
+        status=JobStatus.queued if welcomes else JobStatus.completed,
+        rows=len(rows), created=len(welcomes), skipped=len(errors),
+        errors=json.dumps(errors[:MAX_REPORTED_ERRORS], ensure_ascii=False),
+        finished_at=None if welcomes else datetime.utcnow(),
+    )
+    db.add(job)
+    return job, welcomes, linked_parents
+
+
+def _save(job_id: UUID, **values):
+    with SessionLocal() as db:
+        db.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+        db.commit()
+
+
+async def _chunks(welcomes: list[Welcome], chunk_size: int) -> AsyncIterator[list[Welcome]]:
+    for start in range(0, len(welcomes), chunk_size):
+        yield welcomes[start:start + chunk_size]
+
+
+async def send_welcome(welcome: Welcome):
+    qr_url = await render_whatsapp_qr(str(welcome.student_id))
+    await send_whatsapp_template_with_qr_link(welcome.phone_number, qr_url, welcome.name)
+
+
+async def run_import(job_id: UUID, welcomes: list[Welcome]) -> Progress:
+    progress = Progress()
+    _save(job_id, status=JobStatus.running, started_at=datetime.utcnow())
+
+    async def save_progress(p: Progress):
+        await asyncio.to_thread(
+            _save, job_id, total=p.total, sent=p.succeeded, failed=p.failed, last_error=p.last_error
+        )
+
+    try:
+        await run_pipeline(
+            _chunks(welcomes, settings.BROADCAST_CHUNK_SIZE),
+            send_welcome,
+            concurrency=settings.IMPORT_CONCURRENCY,
+            progress=progress,
+            limiter=limiters.get("whatsapp.bulk"),
+            on_chunk=save_progress,
+        )
+    except asyncio.CancelledError:
+        _save(job_id, status=JobStatus.failed, last_error="interrupted", finished_at=datetime.utcnow())
+        raise
+    except Exception as e:
+        _save(job_id, status=JobStatus.failed, last_error=repr(e), finished_at=datetime.utcnow())
+        return progress
+    _save(job_id, status=JobStatus.completed, finished_at=datetime.utcnow())
+    return progress
+
+
+def start_import(job_id: UUID, welcomes: list[Welcome]) -> asyncio.Task:
+    task = asyncio.create_task(run_import(job_id, welcomes))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+    return task
+
+
+async def stop_imports():
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,248 @@
+"""In-memory search over a university's students.
+
+The admin search box queries on every keystroke, so matching happens in
+memory instead of with ``LIKE '%q%'`` scans. Each university gets its own
+index, built with one query on its first search. Names, parent names and
+phone numbers are folded with ``normalize_text``, so alef forms, taa
+marbuta and harakat do not affect matching, and Arabic-Indic digits match
+ASCII ones.
+
+Results are ranked by where the query hits: the start of the name, the
+start of a later word of the name, the start of the phone number, the start
+of a word of a parent's name, and finally anywhere. The first four ranks
+are prefix matches over sorted lists, found with a bisect and read only
+until ``limit`` results are collected. The last rank uses a trigram
+index: the posting list of the query's rarest trigram gives the
+candidates, and each is checked with a substring test. Within a rank,
+shorter and alphabetically earlier completions come first.
+
+Registration, edits and deletes call ``refresh`` after committing. The
+index is also rebuilt in the background once it is ``SEARCH_INDEX_TTL``
+seconds old, so edits made by other workers show up.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, NamedTuple
+from uuid import UUID
+from sqlalchemy.orm import Session, aliased
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.user import ParentStudentLink, User, UserRole
+from app.utils.language import normalize_text
+
+_DIGITS = str.maketrans("", "", "+-() ")
+
+
+class StudentHit(NamedTuple):
+    id: UUID
+    name: str
+    phone_number: str
+    parent_name: str | None
+    name_key: str
+    phone_key: str
+    parent_key: str
+    text: str
+
+
+def _phone_key(phone_number: str | None) -> str:
+    return normalize_text(phone_number or "").translate(_DIGITS)
+
+
+def normalize_query(query: str) -> str:
+    """Fold a query like the indexed text; phone-like input keeps only digits."""
+    folded = normalize_text(query)
+    digits = folded.translate(_DIGITS)
+    return digits if digits.isdigit() else folded
+
+
+def make_hit(student_id: UUID, name: str, phone_number: str, parent_names: list[str]) -> StudentHit:
+    name_key = normalize_text(name or "")
+    phone_key = _phone_key(phone_number)
+    parent_key = normalize_text(" ".join(parent_names))
+    return StudentHit(
+        student_id, name, phone_number, parent_names[0] if parent_names else None,
+        name_key, phone_key, parent_key, "\n".join((name_key, phone_key, parent_key)),
+    )
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_suffixes(text: str) -> list[str]:
+    """``text`` from the start of each word after the first."""
+    return [text[i + 1:] for i, ch in enumerate(text) if ch == " "]
+
+
+class _Shard:
+    """The index of one university. Writers hold the owning index's lock."""
+
+    def __init__(self, hits: Iterable[StudentHit]):
+        self.slots: list[StudentHit | None] = []
+        self.by_id: dict[UUID, int] = {}
+        self.postings: dict[str, array] = {}
+        # Sorted (text, slot) lists, one per rank; a prefix query is a bisect.
+        self.ranks: tuple[list, ...] = ([], [], [], [])
+        for hit in sorted(hits, key=lambda hit: hit.name_key):
+            self._add(hit)
+        for entries in self.ranks:
+            entries.sort()
+        self.built_at = time.monotonic()
+
+    def _rank_keys(self, hit: StudentHit) -> tuple[list[str], ...]:
+        return (
+            [hit.name_key],
+            _word_suffixes(hit.name_key),
+            [hit.phone_key],
+            [hit.parent_key, *_word_suffixes(hit.parent_key)] if hit.parent_key else [],
+        )
+
+    def _add(self, hit: StudentHit, insert=list.append):
+        slot = len(self.slots)
+        self.slots.append(hit)
+        self.by_id[hit.id] = slot
+        for entries, keys in zip(self.ranks, self._rank_keys(hit)):
+            for key in keys:
+                insert(entries, (key, slot))
+        postings = self.postings
+        for key in _trigrams(hit.name_key) | _trigrams(hit.phone_key) | _trigrams(hit.parent_key):
+            posting = postings.get(key)
+            if posting is None:
+                postings[key] = posting = array("I")
+            posting.append(slot)
+
+    def add(self, hit: StudentHit):
+        self.remove(hit.id)
+        self._add(hit, insort)
+
+    def remove(self, student_id: UUID):
+        # Index entries keep the dead slot; lookups skip it until the next rebuild.
+        slot = self.by_id.pop(student_id, None)
+        if slot is not None:
+            self.slots[slot] = None
+
+    def _prefixed(self, entries: list, q: str):
+        slots = self.slots
+        for i in range(bisect_left(entries, (q,)), len(entries)):
+            key, slot = entries[i]
+            if not key.startswith(q):
+                return
+            yield slots[slot]
+
+    def _containing(self, q: str):
+        postings = []
+        for key in _trigrams(q):
+            posting = self.postings.get(key)
+            if posting is None:
+                return
+            postings.append(posting)
+        for hit in map(self.slots.__getitem__, min(postings, key=len)):
+            if hit is not None and q in hit.text:
+                yield hit
+
+    def search(self, q: str, limit: int) -> list[StudentHit]:
+        sources = [self._prefixed(entries, q) for entries in self.ranks]
+        if len(q) >= 3:
+            sources.append(self._containing(q))
+        results: list[StudentHit] = []
+        seen: set[UUID] = set()
+        for source in sources:
+            for hit in source:
+                if hit is None or hit.id in seen:
+                    continue
+                seen.add(hit.id)
+                results.append(hit)
+                if len(results) == limit:
+                    return results
+        return results
+
+
+class StudentSearchIndex:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._shards: dict[UUID, _Shard] = {}
+        self._builds: dict[UUID, threading.Lock] = {}
+        self._rebuilding: set[UUID] = set()
+
+    def _load(self, db: Session, university_id: UUID, student_ids: list[UUID] | None = None) -> list[StudentHit]:
+        parent = aliased(User)
+        query = (
+            db.query(User.id, User.name, User.phone_number, parent.name)
+            .outerjoin(ParentStudentLink, ParentStudentLink.student_id == User.id)
+            .outerjoin(parent, parent.id == ParentStudentLink.parent_id)
+            .filter(User.university_id == university_id, User.role == UserRole.student)
+        )
+        if student_ids is not None:
+            query = query.filter(User.id.in_(student_ids))
+        students: dict[UUID, tuple[str, str, list[str]]] = {}
+        for student_id, name, phone_number, parent_name in query.all():
+            entry = students.setdefault(student_id, (name, phone_number, []))
+            if parent_name is not None:
+                entry[2].append(parent_name)
+        return [
+            make_hit(student_id, name, phone_number, sorted(parent_names))
+            for student_id, (name, phone_number, parent_names) in students.items()
+        ]
+
+    def _build(self, db: Session, university_id: UUID) -> _Shard:
+        with self._lock:
+            build_lock = self._builds.setdefault(university_id, threading.Lock())
+        with build_lock:
+            shard = self._shards.get(university_id)
+            if shard is None:
+                shard = _Shard(self._load(db, university_id))
+                with self._lock:
+                    self._shards[university_id] = shard
+            return shard
+
+    def _rebuild(self, university_id: UUID):
+        try:
+            with SessionLocal() as db:
+                shard = _Shard(self._load(db, university_id))
+            with self._lock:
+                self._shards[university_id] = shard
+        finally:
+            with self._lock:
+                self._rebuilding.discard(university_id)
+
+    def _shard(self, db: Session, university_id: UUID) -> _Shard:
+        shard = self._shards.get(university_id)
+        if shard is None:
+            return self._build(db, university_id)
+        if shard.built_at + self.ttl < time.monotonic():
+            # Keep answering from the old index while a fresh one loads.
+            with self._lock:
+                start = university_id not in self._rebuilding
+                self._rebuilding.add(university_id)
+            if start:
+                threading.Thread(target=self._rebuild, args=(university_id,), daemon=True).start()
+        return shard
+
+    def search(self, db: Session, university_id: UUID, query: str, limit: int = 20) -> list[StudentHit]:
+        """Best ``limit`` students of the university matching ``query``."""
+        q = normalize_query(query)
+        if not q:
+            return []
+        return self._shard(db, university_id).search(q, limit)
+
+    def refresh(self, db: Session, university_id: UUID | None, *student_ids: UUID):
+        """Reload the given students after a committed change; missing ones are dropped."""
+        shard = self._shards.get(university_id)
+        if shard is None or not student_ids:
+            return
+        hits = self._load(db, university_id, list(student_ids))
+        with self._lock:
+            for student_id in student_ids:
+                shard.remove(student_id)
+            for hit in hits:
+                shard.add(hit)
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+
+
+student_search = StudentSearchIndex(settings.SEARCH_INDEX_TTL)
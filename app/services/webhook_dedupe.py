@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.models.processed_webhook import ProcessedWebhook
+from app.models.webhook_inbox import FAILED, InboxStatus, WebhookInbox
+
+
+class RecentIds:
+    """Bounded LRU of recently seen message IDs with a per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, float] = OrderedDict()
+
+    def __contains__(self, message_id: str) -> bool:
+        expires = self._entries.get(message_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._entries[message_id]
+            return False
+        self._entries.move_to_end(message_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_many(self, message_ids):
+        expires = time.monotonic() + self.ttl
+        for message_id in message_ids:
+            self._entries[message_id] = expires
+            self._entries.move_to_end(message_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+recent_ids = RecentIds(settings.WEBHOOK_DEDUPE_CACHE_SIZE, settings.WEBHOOK_DEDUPE_CACHE_TTL)
+_pruner: asyncio.Task | None = None
+
+
+def _hit_rate() -> float:
+    hits = metrics.get("webhook_dedupe.cache_hits")
+    total = hits + metrics.get("webhook_dedupe.cache_misses")
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.register_gauge("webhook_dedupe.hit_rate", _hit_rate)
+metrics.register_gauge("webhook_dedupe.cache_size", lambda: len(recent_ids))
+
+
+def extract_messages(data: dict) -> list[dict]:
+    """Every message in a webhook payload, across all entries and changes."""
+    return [
+        msg
+        for entry in data.get("entry", [])
+        for change in entry.get("changes", [])
+        for msg in change.get("value", {}).get("messages", [])
+        if "id" in msg
+    ]
+
+
+def claim_new_ids(db: Session, message_ids: list[str]) -> set[str]:
+    """Record message IDs as processed and return the ones not seen before.
+
+    IDs in the in-process cache are answered without touching the database.
+    The rest go through a single INSERT ... ON CONFLICT DO NOTHING RETURNING
+    where the dialect supports it, otherwise one IN lookup plus a bulk
+    insert. The caller commits and then calls ``remember``.
+    """
+    ids = list(dict.fromkeys(message_ids))
+    misses = [message_id for message_id in ids if message_id not in recent_ids]
+    metrics.incr("webhook_dedupe.cache_hits", len(ids) - len(misses))
+    metrics.incr("webhook_dedupe.cache_misses", len(misses))
+    if not misses:
+        return set()
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = (
+            insert(ProcessedWebhook)
+            .values([{"id": message_id} for message_id in misses])
+            .on_conflict_do_nothing(index_elements=["id"])
+            .returning(ProcessedWebhook.id)
+        )
+        return set(db.execute(stmt).scalars())
+
+    seen = {
+        row.id for row in db.query(ProcessedWebhook.id).filter(ProcessedWebhook.id.in_(misses))
+    }
+    new_ids = [message_id for message_id in misses if message_id not in seen]
+    db.add_all([ProcessedWebhook(id=message_id) for message_id in new_ids])
+    return set(new_ids)
+
+
+def remember(message_ids):
+    """Cache IDs once they are committed to processed_webhook."""
+    recent_ids.add_many(message_ids)
+
+
+def _delete_older_than(db: Session, model, timestamp, cutoff, *criteria) -> int:
+    """Delete matching rows in batches so no transaction locks a large range."""
+    total = 0
+    while True:
+        batch = (
+            select(model.id)
+            .where(timestamp < cutoff, *criteria)
+            .limit(settings.WEBHOOK_PRUNE_BATCH_SIZE)
+            .scalar_subquery()
+        )
+        deleted = db.execute(
+            delete(model).where(model.id.in_(batch)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < settings.WEBHOOK_PRUNE_BATCH_SIZE:
+            return total
+
+
+def prune_once() -> int:
+    """Delete dedupe markers and finished inbox rows past Meta's retry window.
+
+    Failed inbox rows are kept for ``WEBHOOK_FAILED_RETENTION_HOURS`` so they
+    can be inspected, counted from when they were received.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.WEBHOOK_DEDUPE_RETENTION_HOURS)
+    with SessionLocal() as db:
+        pruned = _delete_older_than(db, ProcessedWebhook, ProcessedWebhook.processed_at, cutoff)
+        _delete_older_than(
+            db, WebhookInbox, WebhookInbox.processed_at, cutoff, WebhookInbox.status == InboxStatus.done
+        )
+        _delete_older_than(
+            db, WebhookInbox, WebhookInbox.received_at,
+            now - timedelta(hours=settings.WEBHOOK_FAILED_RETENTION_HOURS),
+            FAILED,
+        )
+        metrics.set_gauge("processed_webhook.rows", db.scalar(select(func.count()).select_from(ProcessedWebhook)))
+    metrics.incr("processed_webhook.pruned", pruned)
+    return pruned
+
+
+async def _prune_forever():
+    while True:
+        try:
+            await asyncio.to_thread(prune_once)
+        except Exception as e:
+            print(f"[DEDUPE PRUNE ERROR] {e!r}")
+        await asyncio.sleep(settings.WEBHOOK_PRUNE_INTERVAL)
+
+
+def start_pruner():
+    global _pruner
+    _pruner = asyncio.create_task(_prune_forever())
+
+
+async def stop_pruner():
+    global _pruner
+    if _pruner is not None:
+        _pruner.cancel()
+        await asyncio.gather(_pruner, return_exceptions=True)
+        _pruner = None
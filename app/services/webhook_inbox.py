@@ -0,0 +1,239 @@
+"""Durable inbox for inbound WhatsApp messages.
+
+The webhook endpoint only stores the raw message and acknowledges Meta; a
+claimer loop takes pending rows in batches and routes each one to a worker
+queue by sender, so one phone's messages are always processed in order while
+different phones run in parallel. Each message is processed on its own
+session and marked done. Rows left in ``processing`` by a crashed worker are
+picked up again once ``WEBHOOK_CLAIM_TIMEOUT`` has passed. The timeout
+counts from when a worker starts the row, not from when it was queued: the
+worker renews the claim first, and skips the row if a backlog outlasted
+the timeout and the row was claimed again in the meantime.
+
+Every row is stamped with one of ``WEBHOOK_SHARDS`` partitions derived from
+the sender. Consumer processes split the partitions between them
+(``WEBHOOK_CONSUMER_INDEX`` of ``WEBHOOK_CONSUMER_COUNT``), which keeps
+per-sender ordering across processes and lets throughput scale with cores.
+
+Workers start with the API by default. Set ``WEBHOOK_WORKERS=0`` on the API
+processes and run ``python -m app.services.webhook_inbox`` to scale them
+separately.
+"""
+import asyncio
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.webhook_inbox import CLAIMABLE, InboxStatus, WebhookInbox
+
+Handler = Callable[[dict, Session], Awaitable[None]]
+
+_wakeup: asyncio.Event | None = None
+_tasks: list[asyncio.Task] = []
+
+
+def shard_for(sender: str) -> int:
+    return zlib.crc32(sender.encode()) % settings.WEBHOOK_SHARDS
+
+
+def owned_shards() -> list[int] | None:
+    """Partitions this process consumes, or None when it owns all of them."""
+    if settings.WEBHOOK_CONSUMER_COUNT <= 1:
+        return None
+    return [
+        shard for shard in range(settings.WEBHOOK_SHARDS)
+        if shard % settings.WEBHOOK_CONSUMER_COUNT == settings.WEBHOOK_CONSUMER_INDEX
+    ]
+
+
+def enqueue(db: Session, message: dict) -> WebhookInbox:
+    """Add a raw message to the inbox. The caller commits."""
+    sender = message.get("from", "")
+    row = WebhookInbox(
+        message_id=message["id"],
+        sender=sender,
+        shard=shard_for(sender),
+        payload=json.dumps(message, ensure_ascii=False),
+        received_at=datetime.utcnow(),
+    )
+    db.add(row)
+    return row
+
+
+def notify():
+    """Wake idle workers after new rows were committed."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def claim_batch(limit: int) -> list[tuple]:
+    """Claim up to ``limit`` rows with a single UPDATE ... RETURNING.
+
+    Claiming in one statement avoids a read-then-write lock upgrade, which
+    SQLite answers with "database is locked" when another writer is active.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.WEBHOOK_CLAIM_TIMEOUT)
+    claimable = (
+        select(WebhookInbox.id)
+        .where(CLAIMABLE, or_(
+            WebhookInbox.status == InboxStatus.pending,
+            WebhookInbox.claimed_at < stale,
+        ))
+    )
+    shards = owned_shards()
+    if shards is not None:
+        claimable = claimable.where(WebhookInbox.shard.in_(shards))
+    claimable = (
+        claimable
+        .order_by(WebhookInbox.received_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(WebhookInbox)
+        .where(WebhookInbox.id.in_(claimable.scalar_subquery()))
+        .values(
+            status=InboxStatus.processing,
+            claimed_at=now,
+            attempts=WebhookInbox.attempts + 1,
+        )
+        .returning(
+            WebhookInbox.id, WebhookInbox.shard, WebhookInbox.payload,
+            WebhookInbox.received_at, WebhookInbox.claimed_at,
+        )
+    )
+    with SessionLocal() as db:
+        rows = db.execute(stmt).all()
+        db.commit()
+    return sorted(rows, key=lambda row: row.received_at)
+
+
+def start_row(row) -> bool:
+    """Renew a queued row's claim as its worker starts it.
+
+    False if the claim went stale while the row waited and another claim
+    has taken it since; that claim processes it instead.
+    """
+    with SessionLocal() as db:
+        started = db.execute(
+            update(WebhookInbox)
+            .where(
+                WebhookInbox.id == row.id,
+                WebhookInbox.status == InboxStatus.processing,
+                WebhookInbox.claimed_at == row.claimed_at,
+            )
+            .values(claimed_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+    return bool(started)
+
+
+def _mark_done(db: Session, row_id):
+    db.execute(
+        update(WebhookInbox)
+        .where(WebhookInbox.id == row_id)
+        .values(status=InboxStatus.done, processed_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def _mark_failed(db: Session, row_id, error: str):
+    db.execute(
+        update(WebhookInbox)
+        .where(WebhookInbox.id == row_id)
+        .values(
+            last_error=error,
+            status=case(
+                (WebhookInbox.attempts >= settings.WEBHOOK_MAX_ATTEMPTS, InboxStatus.failed),
+                else_=InboxStatus.pending,
+            ),
+        )
+    )
+    db.commit()
+
+
+async def process_row(handler: Handler, row_id, payload: str):
+    db = SessionLocal()
+    try:
+        await handler(json.loads(payload), db)
+        db.commit()
+        _mark_done(db, row_id)
+    except Exception as e:
+        print(f"[INBOX ERROR] {row_id}: {e!r}")
+        db.rollback()
+        _mark_failed(db, row_id, repr(e))
+    finally:
+        db.close()
+
+
+async def _wait_for_work():
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout=settings.WEBHOOK_POLL_INTERVAL)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+async def _shard_worker(handler: Handler, queue: asyncio.Queue):
+    while True:
+        row = await queue.get()
+        try:
+            if await asyncio.to_thread(start_row, row):
+                await process_row(handler, row.id, row.payload)
+        finally:
+            queue.task_done()
+
+
+async def _claimer(queues: list[asyncio.Queue]):
+    while True:
+        batch = await asyncio.to_thread(claim_batch, settings.WEBHOOK_BATCH_SIZE)
+        if not batch:
+            await _wait_for_work()
+            continue
+
+        # Rows arrive in received order; a bounded queue per worker keeps a
+        # sender's messages in that order and pushes back on the claimer.
+        for row in batch:
+            await queues[row.shard % len(queues)].put(row)
+
+
+def start_workers(handler: Handler, count: int | None = None) -> list[asyncio.Task]:
+    global _wakeup
+    count = settings.WEBHOOK_WORKERS if count is None else count
+    if count <= 0:
+        return _tasks
+
+    _wakeup = asyncio.Event()
+    queues = [asyncio.Queue(maxsize=settings.WEBHOOK_WORKER_QUEUE_SIZE) for _ in range(count)]
+    for queue in queues:
+        _tasks.append(asyncio.create_task(_shard_worker(handler, queue)))
+    _tasks.append(asyncio.create_task(_claimer(queues)))
+    return _tasks
+
+
+async def stop_workers():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+async def _run_forever():
+    from app.api.whatsapp import process_webhook
+    from app.services import whatsapp as whatsapp_service
+
+    start_workers(process_webhook, max(settings.WEBHOOK_WORKERS, 1))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_workers()
+        await whatsapp_service.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_forever())
@@ -1,14 +1,60 @@
 import os
+import asyncio
 import httpx
 from app.core.config import settings
-import requests
 
-def send_whatsapp_message(phone_number: str, text: str):
-    url = f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
-    }
+# One long-lived client for every Graph API call: connections are pooled and
+# kept alive (HTTP/2 when available), so a message no longer pays for a new
+# TLS handshake, and nothing here blocks the event loop.
+_client: httpx.AsyncClient | None = None
+_send_slots: asyncio.Semaphore | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}",
+            http2=settings.WHATSAPP_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.WHATSAPP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(
+                settings.WHATSAPP_TIMEOUT,
+                connect=settings.WHATSAPP_CONNECT_TIMEOUT,
+            ),
+            headers={"Authorization": f"Bearer {settings.WHATSAPP_TOKEN}"},
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _send_slots
+    if _send_slots is None:
+        _send_slots = asyncio.Semaphore(settings.WHATSAPP_MAX_CONCURRENCY)
+    return _send_slots
+
+
+async def _post(path: str, **kwargs) -> httpx.Response:
+    async with _slots():
+        return await get_client().post(path, **kwargs)
+
+
+async def _send(payload: dict) -> dict:
+    response = await _post("/messages", json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+async def send_whatsapp_message(phone_number: str, text: str):
     payload = {
         "messaging_product": "whatsapp",
         "to": phone_number,
@@ -18,17 +64,9 @@ def send_whatsapp_message(phone_number: str, text: str):
         }
     }
     print(payload)
-    response = httpx.post(url, headers=headers, json=payload)
-    print(response.json())
-    response.raise_for_status()
-    return response.json()
-
-def send_exit_request_to_parent(parent_phone, student_name, bus_name, destination, otp_code, exit_method):
-    headers = {
-        "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    return await _send(payload)
 
+async def send_exit_request_to_parent(parent_phone, student_name, bus_name, destination, otp_code, exit_method):
     components = [
         {
             "type": "body",
@@ -60,44 +98,30 @@ def send_exit_request_to_parent(parent_phone, student_name, bus_name, destinatio
         }
     }
 
-    response = requests.post(
-        f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
-        headers=headers,
-        json=payload
-    )
-
-    if not response.ok:
+    response = await _post("/messages", json=payload)
+    if not response.is_success:
         print("❌ Failed to send WhatsApp template message:", response.text)
 
 async def upload_qr_to_whatsapp(file_path: str) -> str:
     """
     Uploads a QR PNG file to the WhatsApp Media API and returns the media ID.
     """
-    url = f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/media"
     mime_type = "image/png"
-    headers = {
-    "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-    }
-    
-    print(settings.WHATSAPP_TOKEN)
-    
+
     with open(file_path, "rb") as f:
         files = {
-            "file": (os.path.basename(file_path), f, mime_type),
-        }
-        data = {
-            "messaging_product": "whatsapp",
-            "type": mime_type,
+            "file": (os.path.basename(file_path), f.read(), mime_type),
         }
+    data = {
+        "messaging_product": "whatsapp",
+        "type": mime_type,
+    }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, files=files, data=data)
-            response.raise_for_status()
-            return response.json()["id"]
-        
-async def send_whatsapp_template_with_qr(phone_number: str, media_id: str, student_name: str):
-    url = f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+    response = await _post("/media", files=files, data=data)
+    response.raise_for_status()
+    return response.json()["id"]
 
+async def send_whatsapp_template_with_qr(phone_number: str, media_id: str, student_name: str):
     payload = {
         "messaging_product": "whatsapp",
         "to": phone_number,
@@ -125,18 +149,9 @@ async def send_whatsapp_template_with_qr(phone_number: str, media_id: str, stude
         }
     }
 
-    headers = {
-    "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-    "Content-Type": "application/json"  # 👈 Add this!
-}
-    
     print(payload)
+    return await _send(payload)
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(url, headers=headers, json=payload)
-        res.raise_for_status()
-        return res.json()
-    
 async def send_whatsapp_template_with_qr_link(phone_number: str, qr_url: str, student_name: str):
     payload = {
         "messaging_product": "whatsapp",
@@ -165,21 +180,9 @@ async def send_whatsapp_template_with_qr_link(phone_number: str, qr_url: str, st
         }
     }
 
-    headers = {
-        "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
     print(payload)
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
-    
+    return await _send(payload)
+
 async def send_check_notification(phone: str, student_name: str, check_type: str):
     template_name = "student_checkout_notification" if check_type == "out" else "student_checkin_notification"
 
@@ -201,20 +204,35 @@ async def send_check_notification(phone: str, student_name: str, check_type: str
         }
     }
 
-    headers = {
-        "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
+    await _send(payload)
+
+async def send_broadcast_template(phone: str, message: str):
+    """University announcement through the approved broadcast template.
+
+    Recipients are mostly outside the 24-hour customer-service window, where
+    Meta only accepts template messages. Template parameters may not contain
+    newlines or runs of spaces, so the message is folded onto one line.
+    """
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": phone,
+        "type": "template",
+        "template": {
+            "name": settings.WHATSAPP_BROADCAST_TEMPLATE,
+            "language": {"code": settings.WHATSAPP_BROADCAST_LANGUAGE},
+            "components": [
+                {
+                    "type": "body",
+                    "parameters": [
+                        {"type": "text", "text": " ".join(message.split())},
+                    ]
+                }
+            ]
+        }
     }
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
-            f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
-            headers=headers,
-            json=payload
-        )
-        
-        res.raise_for_status()
-        
+    return await _send(payload)
+
 async def send_approve_request(phone: str, student_name: str):
     payload = {
         "messaging_product": "whatsapp",
@@ -234,16 +252,4 @@ async def send_approve_request(phone: str, student_name: str):
         }
     }
 
-    headers = {
-        "Authorization": f"Bearer {settings.WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    async with httpx.AsyncClient() as client:
-        res = await client.post(
-            f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
-            headers=headers,
-            json=payload
-        )
-        res.raise_for_status()
-        return res.json()
\ No newline at end of file
+    return await _send(payload)
@@ -1,3 +1,24 @@
+# Arabic spelling variants that should compare equal: alef forms, taa
+# marbuta, alef maqsura and hamza seats fold to one letter; harakat,
+# superscript alef and tatweel are dropped; Arabic-Indic digits become ASCII.
+_ARABIC_FOLD = str.maketrans(
+    {
+        "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+        "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي",
+        **{chr(code): None for code in range(0x064B, 0x0653)},
+        "\u0670": None,
+        "\u0640": None,
+        **{chr(0x0660 + d): str(d) for d in range(10)},
+        **{chr(0x06F0 + d): str(d) for d in range(10)},
+    }
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold Arabic spelling variants and collapse whitespace."""
+    return " ".join(text.lower().translate(_ARABIC_FOLD).split())
+
+
 def detect_language(text: str) -> str:
     # Simple heuristic: check for Arabic Unicode range
     if any("\u0600" <= ch <= "\u06FF" for ch in text):
@@ -25,6 +46,8 @@ TRANSLATIONS = {
         "intro_list": "👋 Hello! This is the GatePass system.\n\nYou're currently linked to the following student(s):\n{students}\n\n✅ When any of them makes an exit request, you'll receive an approval message with a code.\n❌ Your message didn't match a valid approval code, and there are no pending requests right now.\nFeel free to reply again later!",
         "ask_relative_name": "Please enter the full name of the relative you’ll be leaving with:",
         "bus_full": "❌ This bus is already full. Please choose a different one.",
+        "status_none": "You have no exit requests yet. Send 'request exit' to start.",
+        "status_current": "Your latest exit request ({method}) is {status}.",
     },
     "ar": {
         "cancel_success": "✅ تم إلغاء طلبك.",
@@ -46,6 +69,8 @@ TRANSLATIONS = {
         "intro_list": "👋 مرحباً! هذا نظام GatePass.\n\nأنت مرتبط بالطلاب التاليين:\n{students}\n\n✅ عند تقديم أحدهم طلب خروج، ستتلقى رمز الموافقة.\n❌ لا توجد طلبات حالياً، والرسالة لم تطابق رمزاً صحيحاً.\nيمكنك المحاولة لاحقاً.",
         "ask_relative_name": "يرجى إدخال الاسم الكامل للقريب الذي ستخرج معه:",
         "bus_full": "❌ هذه الحافلة ممتلئة. يرجى اختيار حافلة أخرى.",
+        "status_none": "لا توجد لديك طلبات خروج بعد. أرسل 'طلب خروج' للبدء.",
+        "status_current": "حالة آخر طلب خروج ({method}): {status}.",
     },
 }
 
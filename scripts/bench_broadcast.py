@@ -0,0 +1,53 @@
+"""Throughput of the broadcast pipeline against a local stub provider.
+
+    python -m scripts.bench_broadcast [--recipients 20000] [--latency 0.05]
+        [--concurrency 50] [--rate 0]
+
+The stub answers every send after ``--latency`` seconds, standing in for the
+WhatsApp or SMS API; ``--rate`` applies a token bucket of that many messages
+per second (0 for none). Recipients are produced in chunks of
+``BROADCAST_CHUNK_SIZE`` like the database reader.
+"""
+import argparse
+import asyncio
+from app.core.config import settings
+from app.services.pipeline import Progress, run_pipeline
+from app.services.rate_limit import RateLimiter, TokenBucket
+
+
+async def stub_chunks(count: int, chunk_size: int):
+    for start in range(0, count, chunk_size):
+        yield [f"968{n:08d}" for n in range(start, min(start + chunk_size, count))]
+
+
+async def bench(args) -> Progress:
+    async def stub_send(phone: str):
+        await asyncio.sleep(args.latency)
+
+    limiter = RateLimiter(TokenBucket(args.rate, args.rate)) if args.rate else None
+    return await run_pipeline(
+        stub_chunks(args.recipients, settings.BROADCAST_CHUNK_SIZE),
+        stub_send,
+        concurrency=args.concurrency,
+        progress=Progress(),
+        limiter=limiter,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=settings.BROADCAST_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=0)
+    args = parser.parse_args()
+
+    progress = asyncio.run(bench(args))
+    elapsed = progress.finished - progress.started
+    print(f"sent {progress.succeeded}, failed {progress.failed} in {elapsed:.2f}s")
+    print(f"{progress.rate:,.0f} messages/second "
+          f"(ceiling {args.concurrency / args.latency:,.0f} at this latency and concurrency)")
+
+
+if __name__ == "__main__":
+    main()
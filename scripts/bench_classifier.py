@@ -0,0 +1,50 @@
+"""Microbenchmark for the chatbot intent classifier.
+
+    python -m scripts.bench_classifier [--iterations 200000]
+
+Reports the mean time per message for ``normalize_text`` and for
+classification over a mix of English, Arabic, menu and OTP replies.
+"""
+import argparse
+import timeit
+from app.services.message_classifier import classifier
+from app.utils.language import normalize_text
+
+SAMPLES = [
+    "request exit",
+    "Hi, can I go out tonight?",
+    "أريدُ الخـروج مع أخي",
+    "ابي اطلع البيت",
+    "2",
+    "٣",
+    "cancel",
+    "إلغاء",
+    "what is my request status",
+    "my request exit please",
+    "approve 4821",
+    "Mohammed Al Balushi",
+    "السلام عليكم",
+]
+
+
+def per_message(fn, iterations: int) -> float:
+    def run():
+        for sample in SAMPLES:
+            fn(sample)
+    best = min(timeit.repeat(run, number=iterations // len(SAMPLES), repeat=5))
+    return best / (iterations // len(SAMPLES) * len(SAMPLES)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"normalize_text:  {per_message(normalize_text, args.iterations):7.0f} ns/message")
+    print(f"classify:        {per_message(classifier.classify, args.iterations):7.0f} ns/message")
+    for sample in SAMPLES:
+        print(f"  {classifier.classify(sample)!s:8} {sample}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Memory, time to first byte and throughput of the exit-request export.
+
+    DATABASE_URL=sqlite:////tmp/export.db python -m scripts.bench_export [--rows 1000000] [--format csv]
+
+Point DATABASE_URL at a scratch database. Exit requests are seeded until
+the table holds ``--rows`` rows, then the whole table is exported through
+``stream_export``. tracemalloc tracks peak Python memory during the export.
+``--compare`` also runs the export as one ``.all()`` list, as the API did
+before streaming, for reference.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import func, insert, select
+from app.db.database import SessionLocal, init_db
+from app.models import Accommodation, Bus, ExitRequest, University, User
+from app.services.exit_export import ExportFilters, _csv_chunk, export_query, stream_export
+
+
+def new_id():
+    # SQLite gives UUID columns numeric affinity, so a hex id that parses as a
+    # float ("1234...e5...") would be stored as REAL. Rare, but not at this scale.
+    while True:
+        value = uuid4()
+        try:
+            float(value.hex)
+        except ValueError:
+            return value
+
+
+def seed(rows: int):
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(ExitRequest))
+        if existing >= rows:
+            return
+        rng = random.Random(3)
+        university = {"id": uuid4(), "name": f"Export University {uuid4().hex[:6]}"}
+        accommodation = {"id": uuid4(), "university_id": university["id"], "name": "Hall A"}
+        bus = {"id": uuid4(), "university_id": university["id"], "accommodation_id": accommodation["id"],
+               "name": "Bus 1", "destination_district": "Muscat", "capacity": 40, "seats_taken": 0}
+        students = [
+            {"id": new_id(), "name": f"طالب {n}", "phone_number": f"9681{uuid4().int % 10**9:09d}", "role": "student",
+             "university_id": university["id"], "accommodation_id": accommodation["id"]}
+            for n in range(2000)
+        ]
+        db.execute(insert(University), [university])
+        db.execute(insert(Accommodation), [accommodation])
+        db.execute(insert(Bus), [bus])
+        db.execute(insert(User), students)
+        now = datetime.utcnow()
+        for start in range(existing, rows, 50_000):
+            db.execute(insert(ExitRequest), [
+                {"id": new_id(), "student_id": rng.choice(students)["id"],
+                 "exit_method": rng.choice(["self", "relative", "bus"]), "bus_id": bus["id"],
+                 "status": rng.choice(["returned", "rejected", "completed"]),
+                 "requested_at": now - timedelta(minutes=n), "relative_name": None}
+                for n in range(start, min(start + 50_000, rows))
+            ])
+            db.commit()
+
+
+def streamed(fmt: str):
+    started = time.perf_counter()
+    first_byte = first_rows = None
+    size = chunks = 0
+    for chunk in stream_export(ExportFilters(), fmt):
+        now = time.perf_counter()
+        first_byte = first_byte or now
+        if chunks == (1 if fmt == "csv" else 0):
+            first_rows = now
+        size += len(chunk.encode())
+        chunks += 1
+    return started, first_byte, first_rows, time.perf_counter(), size
+
+
+def buffered():
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        body = _csv_chunk(db.execute(export_query(ExportFilters())).all())
+    now = time.perf_counter()
+    return started, now, now, now, len(body.encode())
+
+
+def report(label: str, run):
+    tracemalloc.start()
+    started, first_byte, first_rows, finished, size = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:9} first byte {(first_byte - started) * 1000:7.1f} ms, "
+          f"first rows {(first_rows - started) * 1000:7.1f} ms, "
+          f"total {finished - started:6.1f}s, {size / 1e6:7.1f} MB out, peak Python memory {peak / 1e6:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    seed(args.rows)
+    report("streamed", lambda: streamed(args.format))
+    if args.compare:
+        report(".all()", buffered)
+
+
+if __name__ == "__main__":
+    main()
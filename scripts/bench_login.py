@@ -0,0 +1,91 @@
+"""Login throughput and event-loop lag under concurrent logins.
+
+    DATABASE_URL=sqlite:////tmp/login.db python -m scripts.bench_login \
+        [--logins 64] [--concurrency 16] [--rounds 12] [--inline]
+
+Point DATABASE_URL at a scratch database. A staff account is created with
+a hash of cost ``--rounds``, then ``--logins`` requests hit ``/auth/token``
+in-process, ``--concurrency`` at a time. A probe task sleeps 10 ms in a
+loop, and its overshoot is the event-loop lag, i.e. how long other
+requests would wait. ``--inline`` verifies on the request thread instead
+of the bcrypt pool, for comparison.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from uuid import uuid4
+import httpx
+from app.core import passwords
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.main import app
+from app.models.user import User, UserRole
+
+PHONE = "96800001234"
+PASSWORD = "bench-password"
+
+
+def ensure_user(rounds: int):
+    settings.BCRYPT_ROUNDS = rounds
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.phone_number == PHONE).first()
+        if user is None:
+            user = User(id=uuid4(), name="Bench Staff", phone_number=PHONE, role=UserRole.staff)
+            db.add(user)
+        user.hashed_password = passwords.hash_password(PASSWORD)
+        db.commit()
+
+
+async def probe(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+
+async def bench(args):
+    if args.inline:
+        passwords.verify_password = passwords._verify
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        slots = asyncio.Semaphore(args.concurrency)
+        statuses = []
+
+        async def login():
+            async with slots:
+                response = await client.post("/auth/token", data={"username": PHONE, "password": PASSWORD})
+                statuses.append(response.status_code)
+
+        lags: list[float] = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    ok = statuses.count(200)
+    lags.sort()
+    print(f"{'inline' if args.inline else 'executor'} (workers {settings.PASSWORD_HASH_WORKERS}, "
+          f"cost {args.rounds}): {ok}/{len(statuses)} logins in {elapsed:.2f}s, {ok / elapsed:.1f}/s")
+    print(f"event-loop lag: median {statistics.median(lags):.1f} ms, "
+          f"p99 {lags[int(len(lags) * 0.99)]:.1f} ms, max {lags[-1]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+
+    ensure_user(args.rounds)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
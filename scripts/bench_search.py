@@ -0,0 +1,93 @@
+"""Latency of the student search index on a synthetic university.
+
+    python -m scripts.bench_search [--students 100000] [--queries 20000] [--limit 20]
+
+Builds one university's index from generated English and Arabic names,
+then replays what the admin search box sends: every prefix of a name as it
+is typed, phone number fragments, parent names, and Arabic spellings that
+differ from the stored ones in alef form, taa marbuta or harakat. Reports
+build time and per-query p50/p99/max.
+"""
+import argparse
+import random
+import statistics
+import time
+from uuid import uuid4
+from app.services.student_search import _Shard, make_hit, normalize_query
+
+FIRST = [
+    "Mohammed", "Ahmed", "Ali", "Salim", "Khalid", "Said", "Hamad", "Yousuf", "Abdullah", "Saif",
+    "Fatma", "Aisha", "Maryam", "Zainab", "Huda", "Noor", "Amal", "Shamsa", "Muna", "Khadija",
+    "محمد", "أحمد", "علي", "سالم", "خالد", "سعيد", "إبراهيم", "يوسف", "عبدالله", "سيف",
+    "فاطمة", "عائشة", "مريم", "زينب", "هدى", "نور", "أمل", "شمسة", "منى", "خديجة",
+]
+FAMILY = [
+    "Al Balushi", "Al Hinai", "Al Harthy", "Al Siyabi", "Al Rawahi", "Al Maskari", "Al Busaidi",
+    "Al Kindi", "Al Amri", "Al Shukaili", "Al Farsi", "Al Lawati",
+    "البلوشي", "الهنائي", "الحارثي", "السيابي", "الرواحي", "المسكري", "البوسعيدي",
+    "الكندي", "العامري", "الشكيلي", "الفارسي", "اللواتي",
+]
+VARIANTS = [("أ", "ا"), ("إ", "ا"), ("ة", "ه"), ("ي", "ى"), ("محمد", "مُحَمَّد")]
+
+
+def make_students(count: int, rng: random.Random):
+    students = []
+    for n in range(count):
+        name = f"{rng.choice(FIRST)} {rng.choice(FIRST)} {rng.choice(FAMILY)}"
+        parent = f"{rng.choice(FIRST)} {rng.choice(FAMILY)}"
+        students.append(make_hit(uuid4(), name, f"968{90000000 + n}", [parent]))
+    return students
+
+
+def make_queries(students, count: int, rng: random.Random) -> list[str]:
+    queries = []
+    while len(queries) < count:
+        student = rng.choice(students)
+        kind = rng.random()
+        if kind < 0.6:
+            typed = student.name if rng.random() < 0.5 else student.name.split(" ", 1)[1]
+            queries += [typed[:end] for end in range(1, len(typed) + 1)]
+        elif kind < 0.75:
+            start = rng.randrange(3, 8)
+            queries += [student.phone_number[start:end] for end in range(start + 3, len(student.phone_number) + 1)]
+        elif kind < 0.9:
+            queries += [student.parent_name[:end] for end in range(1, len(student.parent_name) + 1)]
+        else:
+            typed = student.name
+            for plain, variant in VARIANTS:
+                typed = typed.replace(plain, variant)
+            queries += [typed[:end] for end in range(2, len(typed) + 1)]
+    return [q for q in queries[:count] if q.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    students = make_students(args.students, rng)
+    started = time.perf_counter()
+    shard = _Shard(students)
+    print(f"built {args.students:,} students, {len(shard.postings):,} keys "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    queries = make_queries(students, args.queries, rng)
+    timings = []
+    empty = 0
+    for query in queries:
+        started = time.perf_counter()
+        hits = shard.search(normalize_query(query), args.limit)
+        timings.append((time.perf_counter() - started) * 1000)
+        empty += not hits
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{len(queries):,} queries, {empty} without results")
+    print(f"p50 {statistics.median(timings):.2f} ms, p99 {p99:.2f} ms, max {timings[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
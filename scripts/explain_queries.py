@@ -0,0 +1,241 @@
+"""EXPLAIN every query the routers and workers issue, and fail on full scans.
+
+    DATABASE_URL=postgresql://.../gatepass_explain python -m scripts.explain_queries \
+        [--students 20000] [--large-rows 1000]
+
+Point DATABASE_URL at a scratch database. The script applies the schema and
+migrations, seeds it when the user table is empty, runs ANALYZE, then drives
+each route and background job while recording the SQL it sends. Every
+recorded SELECT, UPDATE and DELETE is explained (``EXPLAIN (FORMAT JSON)``
+on PostgreSQL, ``EXPLAIN QUERY PLAN`` on SQLite), and the script exits 1 if
+any plan reads a table of at least ``--large-rows`` rows sequentially.
+Outbound WhatsApp calls are replaced with no-ops.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import event, func, insert, select, text
+from app.core.config import settings
+
+# Scans that no index can remove, with the reason.
+ALLOWED_SCANS: dict[tuple[str, str], str] = {}
+
+_captured: list[tuple[str, str, object]] = []
+_scenario: str | None = None
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if _scenario and not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+        _captured.append((_scenario, statement, parameters))
+
+
+def seed(db, students: int):
+    from app.models import (
+        Accommodation, Bus, ExitRequest, NotificationOutbox, OTP, ParentStudentLink,
+        ProcessedWebhook, ScanEvent, University, User, WebhookInbox,
+    )
+
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    universities = [{"id": uuid4(), "name": f"University {i}"} for i in range(20)]
+    accommodations = [
+        {"id": uuid4(), "university_id": u["id"], "name": f"Hall {i}"}
+        for u in universities for i in range(3)
+    ]
+    buses = [
+        {"id": uuid4(), "university_id": a["university_id"], "accommodation_id": a["id"],
+         "name": f"Bus {i}", "destination_district": "Muscat", "capacity": 40, "seats_taken": 0}
+        for a in accommodations for i in range(2)
+    ]
+    users, links, requests, otps = [], [], [], []
+    for n in range(students):
+        accommodation = rng.choice(accommodations)
+        student = {"id": uuid4(), "name": f"Student {n}", "phone_number": f"9689{n:07d}", "role": "student",
+                   "university_id": accommodation["university_id"], "accommodation_id": accommodation["id"]}
+        parent = {"id": uuid4(), "name": f"Parent {n}", "phone_number": f"9687{n:07d}", "role": "parent",
+                  "university_id": None, "accommodation_id": None}
+        users += [student, parent]
+        links.append({"id": uuid4(), "parent_id": parent["id"], "student_id": student["id"]})
+        for k in range(3):
+            requests.append({
+                "id": uuid4(), "student_id": student["id"], "exit_method": "self",
+                "status": rng.choice(["returned", "returned", "rejected", "approved", "completed", "pending"]),
+                "requested_at": now - timedelta(days=k, minutes=rng.randint(0, 600)), "bus_id": None,
+            })
+        otps.append({"id": uuid4(), "user_id": parent["id"], "otp_code": f"{n % 10000:04d}",
+                     "expires_at": now - timedelta(days=1), "is_verified": True})
+
+    admin = {"id": uuid4(), "name": "Admin", "phone_number": "96800000000", "role": "university_admin",
+             "university_id": universities[0]["id"], "accommodation_id": None}
+    db.execute(insert(University), universities)
+    db.execute(insert(Accommodation), accommodations)
+    db.execute(insert(Bus), buses)
+    db.execute(insert(User), users + [admin])
+    db.execute(insert(ParentStudentLink), links)
+    db.execute(insert(ExitRequest), requests)
+    db.execute(insert(OTP), otps)
+    db.execute(insert(ProcessedWebhook), [{"id": f"wamid.{n}", "processed_at": now} for n in range(students)])
+    db.execute(insert(WebhookInbox), [
+        {"id": uuid4(), "message_id": f"wamid.{n}", "sender": "968", "shard": n % 64, "payload": "{}",
+         "status": "done", "attempts": 1, "received_at": now, "processed_at": now}
+        for n in range(students)
+    ])
+    db.execute(insert(NotificationOutbox), [
+        {"id": uuid4(), "kind": "whatsapp.text", "recipient": "968", "payload": "{}", "status": "sent",
+         "attempts": 0, "created_at": now, "next_attempt_at": now, "sent_at": now}
+        for _ in range(students)
+    ])
+    db.execute(insert(ScanEvent), [
+        {"id": f"scan-{n}", "action": "checkout", "result": "applied", "recorded_at": now} for n in range(students)
+    ])
+    db.commit()
+
+
+def scenarios(client, db):
+    """Name -> callable exercising one route or job."""
+    from app.api import whatsapp as chatbot
+    from app.db.database import SessionLocal
+    from app.models import ExitRequest, User
+    from app.services import outbox, seats, webhook_dedupe, webhook_inbox
+    from app.services.gate_index import gate_index
+    from app.services.relationships import relationships
+    from app.core.principals import Principal
+    from app.core.security import create_access_token
+
+    admin = db.scalar(select(User).where(User.role == "university_admin"))
+    principal = Principal(admin.id, admin.role, admin.university_id, admin.token_version)
+    headers = {"Authorization": "Bearer " + create_access_token(principal.claims())}
+    student = db.scalar(select(User).where(User.role == "student", User.university_id == admin.university_id))
+    approved = db.scalar(select(ExitRequest.student_id).where(ExitRequest.status == "approved").limit(1))
+    parent_phone = db.scalar(select(User.phone_number).where(User.role == "parent"))
+
+    def chat(phone, body):
+        with SessionLocal() as session:
+            asyncio.run(chatbot.process_webhook({"from": phone, "text": {"body": body}}, session))
+            session.commit()
+
+    def next_page(url, **kwargs):
+        first = client.get(url, **kwargs)
+        return client.get(url, params={"cursor": first.headers["X-Next-Cursor"]}, **kwargs)
+
+    def fresh(fn):
+        def run():
+            relationships.clear()
+            gate_index.clear()
+            fn()
+        return run
+
+    return {
+        "students.verify": fresh(lambda: client.get(f"/students/verify/{student.id}")),
+        "students.search": lambda: client.get("/students/search", params={"query": "ent 12"}, headers=headers),
+        "students.university": lambda: next_page("/students/university", headers=headers),
+        "students.latest_request": lambda: client.get(f"/students/{student.id}/latest-request"),
+        "students.activity_log": lambda: client.get(f"/students/{student.id}/activity-log"),
+        "admin.students": lambda: next_page(f"/admin/universities/{admin.university_id}/students"),
+        "admin.staff": lambda: client.get(f"/admin/universities/{admin.university_id}/staff"),
+        "admin.universities": lambda: client.get("/admin/universities"),
+        "students.details": fresh(lambda: client.get(f"/students/{student.id}/details")),
+        "students.check_out": fresh(lambda: client.post(f"/students/{approved}/check-out")),
+        "students.check_in": fresh(lambda: client.post(f"/students/{approved}/check-in")),
+        "university.buses": lambda: client.get("/university/buses", headers=headers),
+        "university.broadcasts": lambda: client.get("/university/broadcasts", headers=headers),
+        "university.export": lambda: client.get("/university/exit-requests/export", headers=headers, params={
+            "format": "ndjson", "start": (datetime.utcnow() - timedelta(days=1)).isoformat(),
+        }),
+        "chatbot.student_status": fresh(lambda: chat(student.phone_number, "status")),
+        "chatbot.parent_otp": fresh(lambda: chat(parent_phone, "approve 0001")),
+        "seats.available_buses": lambda: seats.available_buses(db, admin.university_id),
+        "seats.recount": lambda: seats.recount_seats(db, admin.university_id),
+        "relationships.lookup": fresh(lambda: relationships.parents_of(db, student.id)),
+        "outbox.claim": lambda: outbox.claim_due(settings.OUTBOX_BATCH_SIZE),
+        "inbox.claim": lambda: webhook_inbox.claim_batch(settings.WEBHOOK_BATCH_SIZE),
+        "dedupe.prune": webhook_dedupe.prune_once,
+    }
+
+
+def seq_scans(conn, statement: str, parameters) -> set[str]:
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        found, stack = set(), [node["Plan"] for node in plan]
+        while stack:
+            node = stack.pop()
+            if node.get("Node Type") == "Seq Scan":
+                found.add(node["Relation Name"])
+            stack.extend(node.get("Plans", []))
+        return found
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    # "SCAN user" is a full table scan; "SCAN user USING INDEX ..." and "SEARCH" are not.
+    return {
+        re.sub(r"_\d+$", "", match.group(1))
+        for *_, detail in rows
+        if (match := re.match(r"SCAN (\w+)(?! USING)", detail)) and "USING" not in detail
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--large-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from app.api import whatsapp as chatbot
+    from app.db.database import SessionLocal, engine, init_db
+    from app.models import User
+    from app.models.base import Base
+
+    async def no_send(*args, **kwargs):
+        return {}
+    chatbot.send_whatsapp_message = no_send
+
+    init_db()
+    with SessionLocal() as db:
+        if not db.scalar(select(func.count()).select_from(User)):
+            print(f"Seeding {args.students} students...")
+            seed(db, args.students)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    from app.main import app
+    global _scenario
+    event.listen(engine, "before_cursor_execute", _capture)
+    client = TestClient(app)
+    with SessionLocal() as db:
+        for name, run in scenarios(client, db).items():
+            _scenario = name
+            try:
+                run()
+            finally:
+                _scenario = None
+                db.rollback()
+    event.remove(engine, "before_cursor_execute", _capture)
+
+    with engine.connect() as conn:
+        sizes = {
+            table.name: conn.scalar(select(func.count()).select_from(table))
+            for table in Base.metadata.sorted_tables
+        }
+        failures = 0
+        for name, statement, parameters in _captured:
+            scans = seq_scans(conn, statement, parameters)
+            large = sorted(t for t in scans if sizes.get(t, 0) >= args.large_rows)
+            allowed = [t for t in large if (name, t) in ALLOWED_SCANS]
+            bad = [t for t in large if (name, t) not in ALLOWED_SCANS]
+            status = "FAIL" if bad else ("allow" if allowed else "ok")
+            failures += bool(bad)
+            summary = " ".join(statement.split())[:110]
+            print(f"{status:5}  {name:26} {','.join(large) or '-':22} {summary}")
+        conn.rollback()
+
+    print(f"\n{len(_captured)} queries explained, {failures} with sequential scans on large tables")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
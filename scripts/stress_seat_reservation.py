@@ -0,0 +1,90 @@
+"""Concurrency stress test for bus seat reservation.
+
+Many threads book the same bus at once, each on its own session, the way the
+inbox workers do during the evening rush. The run fails if the bus ends up
+with more approved bookings than seats or if seats_taken drifts from the
+real count.
+
+    python -m scripts.stress_seat_reservation --students 200 --capacity 40
+    python -m scripts.stress_seat_reservation --database-url postgresql://...
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Accommodation, Base, Bus, ExitRequest, University, User
+from app.services.seats import reserve_seat, seat_counts
+
+
+def seed(Session, students: int, capacity: int):
+    with Session() as db:
+        uni = University(id=uuid4(), name=f"Stress {uuid4().hex[:8]}")
+        acc = Accommodation(id=uuid4(), name="Stress hall", university_id=uni.id)
+        bus = Bus(
+            id=uuid4(), name="Stress bus", destination_district="Muscat",
+            accommodation_id=acc.id, university_id=uni.id, capacity=capacity,
+        )
+        users = [
+            User(id=uuid4(), name=f"Student {i}", phone_number=f"stress-{uuid4().hex}", role="student",
+                 university_id=uni.id, accommodation_id=acc.id)
+            for i in range(students)
+        ]
+        db.add_all([uni, acc, bus, *users])
+        db.commit()
+        return bus.id, [u.id for u in users]
+
+
+def book(Session, bus_id, student_id) -> bool:
+    with Session() as db:
+        if not reserve_seat(db, bus_id):
+            db.rollback()
+            return False
+        db.add(ExitRequest(
+            id=uuid4(), student_id=student_id, bus_id=bus_id, exit_method="bus",
+            status="approved", approved_at=datetime.utcnow(), requested_at=datetime.utcnow(),
+        ))
+        db.commit()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite file")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+    connect_args = {"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=args.threads, max_overflow=0)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    bus_id, students = seed(Session, args.students, args.capacity)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda student_id: book(Session, bus_id, student_id), students))
+    elapsed = time.perf_counter() - started
+
+    with Session() as db:
+        taken = db.get(Bus, bus_id).seats_taken
+        approved = seat_counts(db)[bus_id]
+
+    booked = sum(results)
+    print(f"{len(students)} bookings in {elapsed:.2f}s ({len(students) / elapsed:.0f}/s): "
+          f"{booked} booked, {len(students) - booked} bus full")
+    print(f"capacity={args.capacity} seats_taken={taken} approved={approved}")
+    expected = min(args.capacity, len(students))
+    if not booked == taken == approved == expected:
+        raise SystemExit("FAIL: seat count mismatch")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,11 @@ from app.models.accommodation import Accommodation
 from app.models.bus import Bus
 from app.models.user import User, ParentStudentLink
 from app.models.base import Base
-from passlib.context import CryptContext
+from app.core.passwords import hash_password
 from sqlalchemy.orm import Session
 from uuid import uuid4
 
 Base.metadata.create_all(bind=engine)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def seed_data():
     db = Session(bind=engine)
@@ -21,7 +20,7 @@ def seed_data():
         name="Main Admin",
         phone_number="96899900000",
         role="admin",
-        hashed_password=pwd_context.hash("admin123")
+        hashed_password=hash_password("admin123")
     )
     db.add(admin)
 
@@ -40,7 +39,7 @@ def seed_data():
             name=f"UniAdmin {chr(65 + u_index)}",
             phone_number=f"968{phone_counter}",
             role="university_admin",
-            hashed_password=pwd_context.hash("admin123"),
+            hashed_password=hash_password("admin123"),
             university_id=university.id
         )
         phone_counter += 1
@@ -63,7 +62,7 @@ def seed_data():
                     name=f"Staff {university.name}",
                     phone_number=f"968{phone_counter}",
                     role="staff",
-                    hashed_password=pwd_context.hash("staff123"),
+                    hashed_password=hash_password("staff123"),
                     accommodation_id=accommodation.id,
                     university_id=university.id
                 )
@@ -89,7 +88,6 @@ def seed_data():
                         name=f"Student {u_index}-{a_index}-{b_index}-{s_index}",
                         phone_number=f"968{phone_counter}",
                         role="student",
-                        hashed_password=pwd_context.hash("1234"),
                         accommodation_id=accommodation.id,
                         university_id=university.id
                     )
@@ -102,8 +100,7 @@ def seed_data():
                         id=uuid4(),
                         name=f"Parent {u_index}-{a_index}-{b_index}-{s_index}",
                         phone_number=f"968{phone_counter}",
-                        role="parent",
-                        hashed_password=pwd_context.hash("1234")
+                        role="parent"
                     )
                     phone_counter += 1
                     db.add(parent)
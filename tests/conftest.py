@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+# Before any app import: settings are read once, at import time.
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+from uuid import uuid4
+import pytest
+from fastapi.testclient import TestClient
+from app.core.principals import Principal
+from app.core.security import create_access_token
+from app.db.database import SessionLocal
+from app.main import app
+from app.models.university import University
+from app.models.user import ParentStudentLink, User, UserRole
+
+
+def phone() -> str:
+    return f"968{uuid4().int % 10**8:08d}"
+
+
+def bearer(user: User) -> dict:
+    principal = Principal(user.id, user.role, user.university_id, user.token_version)
+    return {"Authorization": "Bearer " + create_access_token(principal.claims())}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def university(db):
+    university = University(id=uuid4(), name=f"University {uuid4().hex[:6]}")
+    db.add(university)
+    db.commit()
+    return university
+
+
+@pytest.fixture
+def make_user(db, university):
+    def make(role: UserRole, **values) -> User:
+        values = {"university_id": university.id, **values}
+        user = User(id=uuid4(), name=f"{role.value} {uuid4().hex[:4]}", phone_number=phone(), role=role, **values)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def link(db):
+    def link(parent: User, student: User):
+        db.add(ParentStudentLink(id=uuid4(), parent_id=parent.id, student_id=student.id))
+        db.commit()
+    return link
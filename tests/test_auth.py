@@ -0,0 +1,16 @@
+from app.core import passwords
+from app.core.config import settings
+from app.models.user import User, UserRole
+
+
+def test_login_verifies_and_upgrades_the_hash(client, db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 4)
+    user = make_user(UserRole.staff, hashed_password=passwords._hash("secret", 5))
+
+    wrong = client.post("/auth/token", data={"username": user.phone_number, "password": "nope"})
+    assert wrong.status_code == 401
+    response = client.post("/auth/token", data={"username": user.phone_number, "password": "secret"})
+    assert response.status_code == 200 and response.json()["token_type"] == "bearer"
+
+    db.expire_all()
+    assert passwords.hash_rounds(db.get(User, user.id).hashed_password) == 4
@@ -0,0 +1,40 @@
+import time
+from app.models.user import UserRole
+from app.services import broadcast
+from tests.conftest import bearer
+
+
+def test_post_broadcast_sends_to_parents(client, make_user, link, monkeypatch):
+    sent = []
+
+    async def send(phone, message):
+        sent.append((phone, message))
+
+    monkeypatch.setitem(broadcast.CHANNELS, "whatsapp", send)
+    admin = make_user(UserRole.university_admin)
+    students = [make_user(UserRole.student) for _ in range(3)]
+    parents = [make_user(UserRole.parent, university_id=None) for _ in students]
+    for parent, student in zip(parents, students):
+        link(parent, student)
+
+    response = client.post(
+        "/university/broadcasts", headers=bearer(admin),
+        json={"message": "Buses leave at 4pm", "channel": "whatsapp", "audience": "parents"},
+    )
+    assert response.status_code == 202, response.text
+    job = response.json()
+
+    deadline = time.monotonic() + 5
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/university/broadcasts/{job['id']}", headers=bearer(admin)).json()
+
+    assert job["status"] == "completed"
+    assert (job["total"], job["sent"], job["failed"]) == (3, 3, 0)
+    assert sorted(sent) == sorted((parent.phone_number, "Buses leave at 4pm") for parent in parents)
+
+
+def test_broadcast_requires_a_university_admin(client, make_user):
+    staff = make_user(UserRole.staff)
+    response = client.post("/university/broadcasts", headers=bearer(staff), json={"message": "hi"})
+    assert response.status_code == 403
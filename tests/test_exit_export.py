@@ -0,0 +1,9 @@
+import csv
+import io
+from app.services.exit_export import _csv_chunk
+
+
+def test_csv_cells_cannot_start_a_formula():
+    row = ["=HYPERLINK(\"http://x\")", "+96812345678", "-1", "@SUM(A1)", "\tx", "\rx", "Ahmed", None, 3]
+    cells = next(csv.reader(io.StringIO(_csv_chunk([row]), newline="")))
+    assert cells == ["'" + cell for cell in row[:6]] + ["Ahmed", "", "3"]
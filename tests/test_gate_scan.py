@@ -0,0 +1,127 @@
+from datetime import timedelta
+from uuid import uuid4
+import pytest
+from sqlalchemy import text
+from app.api.security import ScanEventIn
+from app.core.principals import Principal
+from app.models.exit_request import ExitRequest, ExitStatus
+from app.models.scan_event import ScanEvent
+from app.models.user import UserRole
+from app.services.gate_scans import apply_scans
+from app.services.pass_tokens import issue_pass, mint
+from tests.conftest import bearer
+
+
+@pytest.fixture
+def approved_pass(db, make_user):
+    student = make_user(UserRole.student)
+    request = ExitRequest(id=uuid4(), student_id=student.id, exit_method="walk", status=ExitStatus.approved)
+    db.add(request)
+    db.flush()
+    token = issue_pass(db, student.id, request.id)
+    db.commit()
+    return student, token
+
+
+def test_scan_requires_gate_staff(client, make_user, approved_pass):
+    student, token = approved_pass
+    scan = {"token": token, "action": "checkout"}
+    assert client.post("/security/scan", json=scan).status_code == 422  # no Authorization header
+    assert client.post("/security/scan", json=scan, headers=bearer(student)).status_code == 403
+
+
+def test_scan_refuses_another_university(client, make_user, approved_pass):
+    _, token = approved_pass
+    staff = make_user(UserRole.staff, university_id=None)
+    response = client.post("/security/scan", json={"token": token, "action": "checkout"}, headers=bearer(staff))
+    assert response.status_code == 404
+
+
+def test_double_checkout_is_refused(client, make_user, approved_pass):
+    _, token = approved_pass
+    headers = bearer(make_user(UserRole.staff))
+    scan = {"token": token, "action": "checkout"}
+    assert client.post("/security/scan", json=scan, headers=headers).status_code == 200
+    assert client.post("/security/scan", json=scan, headers=headers).status_code == 409
+
+
+def test_scanner_routes_accept_a_pass(client, make_user, approved_pass):
+    student, token = approved_pass
+    assert client.post(f"/students/{token}/check-out").status_code == 422
+    assert client.post(f"/students/{token}/check-out", headers=bearer(student)).status_code == 403
+
+    headers = bearer(make_user(UserRole.staff))
+    response = client.post(f"/students/{token}/check-out", headers=headers)
+    assert response.status_code == 200, response.text
+    assert client.get(f"/students/verify/{token}").json()["name"] == student.name
+    assert client.post("/students/not-a-pass/check-in", headers=headers).status_code == 401
+
+
+def test_batch_keys_are_per_user(client, make_user, approved_pass):
+    _, token = approved_pass
+    batch = {"events": [{"key": "1", "action": "checkout", "token": token}]}
+    first, second = bearer(make_user(UserRole.staff)), bearer(make_user(UserRole.staff))
+
+    assert client.post("/security/scans/batch", json=batch).status_code == 422
+    assert client.post("/security/scans/batch", json=batch, headers=first).json()["results"][0]["result"] == "applied"
+    replay = client.post("/security/scans/batch", json=batch, headers=first).json()["results"][0]
+    assert replay["duplicate"] and replay["result"] == "applied" and replay["key"] == "1"
+
+    # The same device key from another user is a new scan, not a replay of the first.
+    other = client.post("/security/scans/batch", json=batch, headers=second).json()["results"][0]
+    assert not other["duplicate"] and other["result"] == "rejected"
+
+
+def test_batch_ignores_other_universities(client, make_user, approved_pass):
+    _, token = approved_pass
+    staff = make_user(UserRole.staff, university_id=None)
+    batch = {"events": [{"key": "1", "action": "checkout", "token": token}]}
+    result = client.post("/security/scans/batch", json=batch, headers=bearer(staff)).json()["results"][0]
+    assert result["result"] == "rejected"
+
+
+def test_batch_records_unknown_ids_with_foreign_keys_on(db, make_user, approved_pass):
+    student, token = approved_pass
+    staff = make_user(UserRole.staff)
+    principal = Principal(staff.id, staff.role, staff.university_id, staff.token_version)
+    request = db.query(ExitRequest).filter_by(student_id=student.id).one()
+    events = [
+        ScanEventIn(key="unknown-student", action="checkout", student_id=uuid4()),
+        ScanEventIn(key="deleted-request", action="checkout", token=mint(student.id, uuid4(), ExitStatus.approved, request.requested_at + timedelta(days=1))),
+        ScanEventIn(key="bad-token", action="checkout", token="not-a-pass"),
+        ScanEventIn(key="applied", action="checkout", token=token),
+    ]
+    db.execute(text("PRAGMA foreign_keys=ON"))
+    try:
+        results = apply_scans(db, principal, events)
+        db.commit()
+    finally:
+        db.execute(text("PRAGMA foreign_keys=OFF"))
+    assert [result["result"] for result in results] == ["rejected", "rejected", "invalid", "applied"]
+    stored = db.query(ScanEvent).filter(ScanEvent.id.like(f"{staff.id}:%")).all()
+    assert {row.id.split(":", 1)[1]: row.exit_request_id for row in stored} == {
+        "unknown-student": None, "deleted-request": None, "bad-token": None, "applied": request.id,
+    }
+
+
+@pytest.mark.parametrize("path", ["scan", "batch", "students"])
+def test_every_check_in_path_writes_the_same_columns(client, db, make_user, approved_pass, path):
+    student, token = approved_pass
+    headers = bearer(make_user(UserRole.staff))
+    request = db.query(ExitRequest).filter_by(student_id=student.id).one()
+    request.status = ExitStatus.completed
+    db.commit()
+
+    if path == "scan":
+        response = client.post("/security/scan", json={"token": token, "action": "checkin"}, headers=headers)
+    elif path == "batch":
+        batch = {"events": [{"key": "in", "action": "checkin", "token": token}]}
+        response = client.post("/security/scans/batch", json=batch, headers=headers)
+        assert response.json()["results"][0]["result"] == "applied"
+    else:
+        response = client.post(f"/students/{token}/check-in", headers=headers)
+    assert response.status_code == 200, response.text
+
+    db.refresh(request)
+    assert request.status == ExitStatus.returned
+    assert request.approved_at is not None
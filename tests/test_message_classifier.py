@@ -0,0 +1,21 @@
+import pytest
+from app.services.message_classifier import classifier
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("request exit", "exit"),
+    ("أريدُ الخـروج مع أخي", "exit"),
+    ("what is my request status", "status"),
+    ("وين طلبي", "status"),
+    ("cancel", "cancel"),
+    ("approve 4821", "approve"),
+    ("Mohammed Al Balushi", None),
+    # "my request" is a status phrase, but the exit phrase outranks it.
+    ("my request exit please", "exit"),
+])
+def test_classify(text, intent):
+    assert classifier.classify(text) == intent
+
+
+def test_strip_leaves_the_otp():
+    assert classifier.strip("approve ٤٨٢١", "approve") == "4821"
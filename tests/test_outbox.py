@@ -0,0 +1,49 @@
+import asyncio
+from sqlalchemy import update
+from app.models.notification_outbox import NotificationOutbox, OutboxStatus
+from app.services import outbox
+from tests.conftest import phone
+
+
+def _queue(db, *messages: tuple[str, str]):
+    # Earlier tests may have left rows behind; only this test's rows are due.
+    db.execute(update(NotificationOutbox).where(NotificationOutbox.status == OutboxStatus.pending).values(status=OutboxStatus.dead))
+    for recipient, text in messages:
+        outbox.enqueue(db, "whatsapp.text", recipient, message=text)
+    db.commit()
+
+
+def _fake_sender(monkeypatch, sent: list, fail: set = frozenset()):
+    async def send(recipient, message):
+        # Earlier messages take longer, so concurrent delivery would reorder them.
+        await asyncio.sleep(0.03 if message.endswith("1") else 0.001)
+        if message in fail:
+            return False
+        sent.append((recipient, message))
+    monkeypatch.setitem(outbox.SENDERS, "whatsapp.text", send)
+
+
+def test_one_recipient_gets_replies_in_order(db, monkeypatch):
+    student, other = phone(), phone()
+    _queue(db, (student, "a1"), (other, "b1"), (student, "a2"), (student, "a3"))
+    sent = []
+    _fake_sender(monkeypatch, sent)
+
+    asyncio.run(outbox.deliver_batch(outbox.claim_due(10)))
+    assert [text for recipient, text in sent if recipient == student] == ["a1", "a2", "a3"]
+    assert (other, "b1") in sent
+
+
+def test_later_replies_wait_behind_a_failed_one(db, monkeypatch):
+    student = phone()
+    _queue(db, (student, "a1"), (student, "a2"))
+    sent = []
+    _fake_sender(monkeypatch, sent, fail={"a1"})
+
+    asyncio.run(outbox.deliver_batch(outbox.claim_due(10)))
+    assert sent == []
+    db.expire_all()
+    rows = db.query(NotificationOutbox).filter_by(recipient=student).order_by(NotificationOutbox.created_at).all()
+    assert [row.status for row in rows] == [OutboxStatus.pending, OutboxStatus.pending]
+    assert [row.attempts for row in rows] == [1, 0]
+    assert rows[0].next_attempt_at == rows[1].next_attempt_at
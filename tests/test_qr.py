@@ -0,0 +1,27 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from app.services import qr
+
+
+def test_concurrent_renders_of_one_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(qr, "QR_DIR", str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        urls = set(pool.map(lambda _: qr.generate_qr_image("same pass", "png1"), range(32)))
+
+    assert len(urls) == 1
+    files = os.listdir(tmp_path)
+    assert files == [qr.qr_filename("same pass", "png1")]
+    with Image.open(tmp_path / files[0]) as image:
+        image.verify()
+
+
+def test_whatsapp_images_are_never_svg(tmp_path, monkeypatch):
+    monkeypatch.setattr(qr, "QR_DIR", str(tmp_path))
+    monkeypatch.setattr(qr.settings, "QR_FORMAT", "svg")
+
+    url = asyncio.run(qr.render_whatsapp_qr("student"))
+    assert url.endswith(".png")
+    assert os.listdir(tmp_path) == [qr.qr_filename("student", "png1")]
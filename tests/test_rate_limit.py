@@ -0,0 +1,14 @@
+from app.services.rate_limit import RateLimiter, TokenBucket
+
+
+def test_bulk_leaves_the_reserved_share_to_the_outbox():
+    outbox = RateLimiter(TokenBucket(rate=1, capacity=100))
+    bulk = outbox.bulk(0.25)
+
+    taken = 0
+    while bulk.take() == 0:
+        taken += 1
+
+    assert taken == 75
+    assert all(outbox.take() == 0 for _ in range(25))
+    assert outbox.take() > 0
@@ -0,0 +1,11 @@
+from app.services.student_import import validate_rows
+
+
+def test_numeric_phones_are_accepted():
+    rows = [
+        {"student_name": "Salim", "student_phone": 96891234567, "parent_name": "Khalid", "parent_phone": 96899887766.0},
+        {"student_name": "Aisha", "student_phone": True, "parent_name": "Mona", "parent_phone": "96811112222"},
+    ]
+    valid, errors = validate_rows(rows)
+    assert [(number, row.student_phone, row.parent_phone) for number, row in valid] == [(1, "96891234567", "96899887766")]
+    assert [error["row"] for error in errors] == [2]
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import update
+from app.models.webhook_inbox import InboxStatus, WebhookInbox
+from app.services import webhook_inbox
+
+
+def _queue_message(db) -> str:
+    message_id = f"wamid.{uuid4().hex}"
+    webhook_inbox.enqueue(db, {"id": message_id, "from": "96890000000"})
+    db.commit()
+    return message_id
+
+
+def _claim(db, message_id: str):
+    row_id = db.query(WebhookInbox.id).filter_by(message_id=message_id).scalar()
+    return next(row for row in webhook_inbox.claim_batch(1000) if row.id == row_id)
+
+
+def test_a_row_reclaimed_while_queued_runs_once(db):
+    message_id = _queue_message(db)
+    queued = _claim(db, message_id)
+
+    # The shard's backlog outlasts the claim timeout before a worker reaches the row.
+    db.execute(
+        update(WebhookInbox).where(WebhookInbox.id == queued.id)
+        .values(claimed_at=datetime.utcnow() - timedelta(hours=1))
+    )
+    db.commit()
+    reclaimed = _claim(db, message_id)
+
+    assert not webhook_inbox.start_row(queued)
+    assert webhook_inbox.start_row(reclaimed)
+
+
+def test_starting_a_row_renews_its_claim(db):
+    queued = _claim(db, _queue_message(db))
+    assert webhook_inbox.start_row(queued)
+
+    db.expire_all()
+    assert db.get(WebhookInbox, queued.id).claimed_at > queued.claimed_at
+    assert db.get(WebhookInbox, queued.id).status == InboxStatus.processing